@@ -1,10 +1,25 @@
-from flask import Flask, request, render_template
+from flask import Flask, Response, request, render_template, jsonify
+from src import instrumentation
+from src.exception import CustomException
+from src.instrumentation import profile, span
+from src.logger import logging
 from src.pipeline.predict import CustomData, PredictPipeline
+from src.pipeline.batcher import MicroBatcher, MicroBatcherConfig
+
+import os
 
 
 application = Flask(__name__)
 app =application
 
+batcher = MicroBatcher(
+    PredictPipeline().predict_batch,
+    MicroBatcherConfig(
+        max_batch_size=int(os.environ.get("BATCH_MAX_SIZE", 64)),
+        max_wait_ms=float(os.environ.get("BATCH_MAX_WAIT_MS", 2.0))
+    )
+)
+
 @app.route('/')
 def home():
     return render_template("index.html")
@@ -12,23 +27,57 @@ def home():
 @app.route('/predict',methods=['POST', 'GET'])
 def predict():
     if request.method == 'POST':
-        data = CustomData(
-            gender=request.form.get('gender'),
-            race_ethnicity=request.form.get('ethnicity'),
-            parental_level_of_education=request.form.get('parental_level_of_education'),
-            lunch=request.form.get('lunch'),
-            test_preparation_course=request.form.get('test_preparation_course'),
-            reading_score=float(request.form.get('writing_score')),
-            writing_score=float(request.form.get('reading_score'))
-        )
-        df = data.get_data_df()
-
-        predict_pipeline = PredictPipeline()
-        prediction = predict_pipeline.predict(df)
-        return render_template("home.html", results=prediction)
+        with profile("predict"), span("predict.request"):
+            try:
+                with span("predict.parse_form"):
+                    data = CustomData.from_form(request.form)
+            except ValueError as e:
+                return render_template("home.html", error=str(e)), 400
+
+            predict_pipeline = PredictPipeline()
+            prediction = predict_pipeline.predict_record(data)
+            with span("predict.render"):
+                return render_template("home.html", results=prediction)
     else:
         return render_template("home.html")
 
 
+@app.route('/v1/predict', methods=['POST'])
+def predict_v1():
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and "records" in payload:
+        payload = payload["records"]
+    records = payload if isinstance(payload, list) else [payload]
+
+    with profile("predict_v1"), span("predict_v1.request"):
+        try:
+            categories = PredictPipeline().cache.get().categories
+            with span("predict_v1.parse"):
+                data = [CustomData.from_record(record, categories) for record in records]
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except CustomException as e:
+            logging.info(f"Prediction failed: {e}")
+            return jsonify({"error": "Model unavailable"}), 503
+
+        try:
+            with span("predict_v1.batch_wait"):
+                predictions = batcher.predict(data)
+        except CustomException as e:
+            logging.info(f"Prediction failed: {e}")
+            return jsonify({"error": "Prediction failed"}), 500
+        return jsonify({"predictions": [float(prediction) for prediction in predictions]})
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(instrumentation.export("prometheus"), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/metrics.json')
+def metrics_json():
+    return Response(instrumentation.export("json"), mimetype="application/json")
+
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0')
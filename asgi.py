@@ -0,0 +1,267 @@
+from jinja2 import Environment, FileSystemLoader
+from src import instrumentation
+from src.exception import CustomException
+from src.instrumentation import profile, span
+from src.logger import logging
+from src.pipeline.lookup_table import LookupTable
+from src.pipeline.executor import InferenceExecutor, InferenceExecutorConfig, Overloaded
+from src.pipeline.model_cache import get_model_cache
+from src.pipeline.prediction_cache import get_prediction_cache
+from src.pipeline.predict import CustomData, PredictPipeline
+from urllib.parse import parse_qsl
+
+import asyncio
+import json
+import os
+import numpy as np
+
+
+BODY_TIMEOUT = float(os.environ.get("BODY_TIMEOUT", 5.0))
+MAX_BODY_BYTES = int(os.environ.get("MAX_BODY_BYTES", 1 << 20))
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", 30.0))
+
+executor = InferenceExecutor(InferenceExecutorConfig(
+    kind=os.environ.get("INFERENCE_POOL", "thread"),
+    max_workers=int(os.environ.get("INFERENCE_WORKERS", os.cpu_count() or 1)),
+    max_queue_depth=int(os.environ.get("INFERENCE_QUEUE_DEPTH", 64)),
+    request_timeout=float(os.environ.get("INFERENCE_TIMEOUT", 5.0))
+))
+
+# Serve from a table exported by src.components.model_export when LOOKUP_TABLE points to one. Records it does not
+# cover go to the model. The table is only used while the model version it was exported from is the one served:
+# after a retrain without a re-export the model answers everything. A registry's promotions would not reach the
+# table, so it is not used with MODEL_REGISTRY.
+LOOKUP_TABLE = os.environ.get("LOOKUP_TABLE")
+lookup_table = None
+_table_checked_version = None
+if LOOKUP_TABLE and get_model_cache().config.registry_root:
+    logging.info("LOOKUP_TABLE ignored: models are served from the registry in MODEL_REGISTRY")
+elif LOOKUP_TABLE:
+    lookup_table = LookupTable(LOOKUP_TABLE)
+
+templates = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")), autoescape=True
+)
+templates.globals["url_for"] = lambda endpoint: f"/{endpoint}"
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def predict_records(data: list) -> list:
+    """
+    Runs the predictions on a pool worker. Module level so a process pool can pickle it.
+
+    The request coroutine is suspended meanwhile, so per-request profiling (PROFILE_SAMPLE_RATE) happens here,
+    on the thread doing the work. With a process pool the spans are recorded in the worker processes.
+    """
+    with profile("predict_records"):
+        return _predict_records(data)
+
+
+def predict_json_records(records: list) -> list:
+    """
+    Validates JSON records against the categories of the loaded model and predicts them, on a pool worker: getting
+    the snapshot may reload the model, which must not block the event loop.
+
+    Raises:
+        ValueError: If a record is invalid.
+    """
+    with profile("predict_json_records"):
+        categories = PredictPipeline().cache.get().categories
+        with span("predict_v1.parse"):
+            data = [CustomData.from_record(record, categories) for record in records]
+        return _predict_records(data)
+
+
+def _matching_table(version: str):
+    """
+    Returns the lookup table if it was exported from the model version being served, None otherwise. A table that
+    does not match is read again once per served version, in case it was re-exported since.
+    """
+    global lookup_table, _table_checked_version
+    if lookup_table is None or lookup_table.meta.get("model_version") == version:
+        return lookup_table
+    if _table_checked_version != version:
+        _table_checked_version = version
+        try:
+            table = LookupTable(LOOKUP_TABLE)
+        except (OSError, ValueError) as e:
+            logging.info(f"Cannot read the lookup table {LOOKUP_TABLE}: {e}")
+            return None
+        if table.meta.get("model_version") == version:
+            lookup_table = table
+            logging.info(f"Lookup table {LOOKUP_TABLE} reloaded for model version {version}")
+            return table
+        logging.info(
+            f"Lookup table {LOOKUP_TABLE} was exported from model version {table.meta.get('model_version')}, "
+            f"serving {version}: predicting with the model until it is re-exported"
+        )
+    return None
+
+
+def _predict_records(data: list) -> list:
+    pipeline = PredictPipeline()
+    table = _matching_table(pipeline.cache.get().version) if lookup_table is not None else None
+    if table is None:
+        return [float(prediction) for prediction in pipeline.predict_batch(data)]
+
+    predictions = table.predict([item.get_data_dict() for item in data])
+    missing = np.flatnonzero(np.isnan(predictions))
+    if len(missing):
+        predictions[missing] = pipeline.predict_batch([data[i] for i in missing])
+    return predictions.tolist()
+
+
+def warm_up():
+    PredictPipeline().cache.get()
+
+
+async def read_body(receive) -> bytes:
+    """
+    Reads the request body. The whole read is bounded by BODY_TIMEOUT, so a client trickling its body in
+    only holds on to its own coroutine, never a pool worker, and only for that long.
+    """
+    async def read():
+        body = bytearray()
+        more = True
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(400, "Client disconnected")
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                raise HTTPError(413, "Request body too large")
+            more = message.get("more_body", False)
+        return bytes(body)
+
+    try:
+        return await asyncio.wait_for(read(), timeout=BODY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPError(408, "Timed out reading the request body")
+
+
+async def run_predictions(data: list, fn=predict_records) -> list:
+    try:
+        return await executor.run(fn, data)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    except Overloaded as e:
+        raise HTTPError(503, str(e))
+    except asyncio.TimeoutError:
+        raise HTTPError(504, "Prediction timed out")
+    except CustomException as e:
+        logging.info(f"Prediction failed: {e}")
+        raise HTTPError(500, "Prediction failed")
+
+
+async def home(scope, receive):
+    return 200, "text/html", templates.get_template("index.html").render()
+
+
+async def predict(scope, receive):
+    if scope["method"] != "POST":
+        return 200, "text/html", templates.get_template("home.html").render()
+
+    body = await read_body(receive)
+    try:
+        with span("predict.parse_form"):
+            data = CustomData.from_form(dict(parse_qsl(body.decode())))
+    except ValueError as e:
+        return 400, "text/html", templates.get_template("home.html").render(error=str(e))
+    with span("predict.executor"):
+        predictions = await run_predictions([data])
+    with span("predict.render"):
+        return 200, "text/html", templates.get_template("home.html").render(results=predictions[0])
+
+
+async def predict_v1(scope, receive):
+    try:
+        payload = json.loads(await read_body(receive) or b"null")
+    except ValueError:
+        raise HTTPError(400, "Body must be JSON")
+    if isinstance(payload, dict) and "records" in payload:
+        payload = payload["records"]
+    records = payload if isinstance(payload, list) else [payload]
+
+    with span("predict_v1.executor"):
+        predictions = await run_predictions(records, predict_json_records)
+    return 200, "application/json", json.dumps({"predictions": predictions})
+
+
+async def metrics(scope, receive):
+    return 200, "text/plain; version=0.0.4", instrumentation.export("prometheus")
+
+
+async def metrics_json(scope, receive):
+    return 200, "application/json", instrumentation.export("json")
+
+
+async def healthz(scope, receive):
+    return 200, "application/json", json.dumps({
+        "executor": executor.stats(), "prediction_cache": get_prediction_cache().stats()
+    })
+
+
+ROUTES = {
+    "/": (home, {"GET"}),
+    "/predict": (predict, {"GET", "POST"}),
+    "/v1/predict": (predict_v1, {"POST"}),
+    "/healthz": (healthz, {"GET"}),
+    "/metrics": (metrics, {"GET"}),
+    "/metrics.json": (metrics_json, {"GET"}),
+}
+
+
+async def send_response(send, status: int, content_type: str, body: str):
+    body = body.encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, warm_up)
+            except Exception as e:
+                # The model may not be trained yet; the first request will load it.
+                logging.info(f"Skipping model warm up: {e}")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown, DRAIN_TIMEOUT)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    ASGI entry point serving the same routes as application.py, e.g. `uvicorn asgi:app`.
+
+    Requests are parsed on the event loop and the predictions run on the bounded InferenceExecutor: a full
+    executor answers 503, a prediction exceeding INFERENCE_TIMEOUT answers 504 and a body not received within
+    BODY_TIMEOUT answers 408. On shutdown no new predictions are admitted and the in-flight ones are drained.
+    """
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    handler, methods = ROUTES.get(scope["path"], (None, ()))
+    try:
+        if handler is None:
+            raise HTTPError(404, "Not found")
+        if scope["method"] not in methods:
+            raise HTTPError(405, "Method not allowed")
+        status, content_type, body = await handler(scope, receive)
+    except HTTPError as e:
+        status, content_type, body = e.status, "application/json", json.dumps({"error": str(e)})
+    await send_response(send, status, content_type, body)
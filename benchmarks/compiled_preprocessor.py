@@ -0,0 +1,97 @@
+"""
+Parity check and latency benchmark of CompiledPreprocessor against the fitted sklearn preprocessor.
+
+Usage:
+    python -m benchmarks.compiled_preprocessor [--preprocessor artifacts/preprocessor] [--data artifacts/test.csv]
+
+Every row of the dataset, every category combination and rows with missing values are transformed both ways and
+must produce the same bytes. Exits with status 1 on any mismatch. A preprocessor pickled by another scikit-learn
+version may not transform with the installed one; a preprocessor refitted on the data is benchmarked instead.
+The parity itself is tested in tests/test_compiled_preprocessor.py.
+"""
+from src.components.data_transform import DataTransformation, DataTransformationConfig
+from src.exception import CustomException
+from src.pipeline.compiled_preprocessor import CompiledPreprocessor
+from src.utils import load_object
+
+import argparse
+import itertools
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+
+def parity_cases(preprocessor, data: pd.DataFrame) -> pd.DataFrame:
+    columns = list(preprocessor.feature_names_in_)
+    cases = [data[columns]]
+
+    categorical = {}
+    for _, transformer, transformer_columns in preprocessor.transformers_:
+        if hasattr(transformer, "named_steps") and "onehot" in transformer.named_steps:
+            for column, categories in zip(transformer_columns, transformer.named_steps["onehot"].categories_):
+                categorical[column] = list(categories)
+
+    base = data[columns].iloc[0].to_dict()
+    combinations = [
+        dict(base, **dict(zip(categorical, values))) for values in itertools.product(*categorical.values())
+    ]
+    cases.append(pd.DataFrame(combinations, columns=columns))
+
+    missing = data[columns].head(len(columns)).copy()
+    for index, column in enumerate(columns):
+        missing.iloc[index, missing.columns.get_loc(column)] = np.nan
+    cases.append(missing)
+    return pd.concat(cases, ignore_index=True)
+
+
+def time_call(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1e6
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preprocessor", default=os.path.join("artifacts", "preprocessor"))
+    parser.add_argument("--data", default=os.path.join("artifacts", "test.csv"))
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    preprocessor = load_object(args.preprocessor)
+    compiled = CompiledPreprocessor(preprocessor)
+    data = pd.read_csv(args.data)
+
+    cases = parity_cases(preprocessor, data)
+    try:
+        mismatches = compiled.verify(preprocessor, cases)
+    except CustomException as e:
+        print(f"{args.preprocessor}: {e}")
+        print(f"benchmarking a preprocessor refitted on {args.data} instead")
+        preprocessor = DataTransformation(DataTransformationConfig()).get_preprocessor()
+        preprocessor.fit(data.drop(columns=["math_score"]))
+        compiled = CompiledPreprocessor(preprocessor)
+        cases = parity_cases(preprocessor, data)
+        mismatches = compiled.verify(preprocessor, cases)
+    print(f"parity: {len(cases)} records, {mismatches} mismatches")
+
+    record = data[compiled.columns].iloc[0].to_dict()
+    sklearn_p50, sklearn_p99 = time_call(
+        lambda: preprocessor.transform(pd.DataFrame({column: [value] for column, value in record.items()})),
+        args.repeat
+    )
+    compiled_p50, compiled_p99 = time_call(lambda: compiled.transform_record(record), args.repeat)
+    print(f"sklearn  single record: p50 {sklearn_p50:9.1f} us  p99 {sklearn_p99:9.1f} us")
+    print(f"compiled single record: p50 {compiled_p50:9.1f} us  p99 {compiled_p99:9.1f} us")
+    print(f"speedup (p50): {sklearn_p50 / compiled_p50:.0f}x")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
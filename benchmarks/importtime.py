@@ -0,0 +1,91 @@
+"""
+Import-time budget check of the serving entry points.
+
+Usage:
+    python -m benchmarks.importtime [--module application --module asgi ...] [--budget-ms 500] [--output out.json]
+
+Each module is imported in a fresh `python -X importtime` interpreter, --repeat times, and the fastest run is
+kept (the first one also pays for cold disk caches). A module fails the check when its cumulative import time is
+over --budget-ms, or when it imports one of the heavy libraries that serving loads lazily (sklearn, pandas,
+scipy, xgboost, catboost, ...) at import time rather than when a model needs them. The slowest imports by
+self time are listed to show what to defer next. Exits with status 1 if any module fails.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+
+SERVING_MODULES = ["application", "asgi", "src.pipeline.predict"]
+HEAVY_MODULES = ["sklearn", "pandas", "scipy", "xgboost", "catboost", "dill", "joblib", "pyarrow"]
+
+
+def import_profile(module: str) -> list:
+    """
+    Returns (self us, cumulative us, depth, name) for every module imported by `import module`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True
+    )
+    if result.returncode:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return entries
+
+
+def check(module: str, repeat: int, budget_ms: float, top: int) -> dict:
+    runs = [import_profile(module) for _ in range(repeat)]
+    entries = min(runs, key=lambda run: run[-1][1])
+    imported = {name for _, _, _, name in entries}
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+    total_ms = entries[-1][1] / 1000
+    return {
+        "module": module,
+        "import_ms": total_ms,
+        "budget_ms": budget_ms,
+        "modules_imported": len(entries),
+        "heavy_modules": heavy,
+        "slowest": [
+            {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+            for self_us, cumulative_us, _, name in sorted(entries, reverse=True)[:top]
+        ],
+        "ok": total_ms <= budget_ms and not heavy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="module to check, repeatable (default: the serving entry points)")
+    parser.add_argument("--budget-ms", type=float, default=500.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="number of slowest imports to list")
+    parser.add_argument("--output", help="write the results to this file as JSON")
+    args = parser.parse_args()
+
+    results = [check(module, args.repeat, args.budget_ms, args.top) for module in args.module or SERVING_MODULES]
+    for result in results:
+        status = "ok" if result["ok"] else "FAIL"
+        print(
+            f"{status:<4} {result['module']:<28} {result['import_ms']:8.1f} ms (budget {result['budget_ms']:.0f} ms), "
+            f"{result['modules_imported']} modules"
+        )
+        if result["heavy_modules"]:
+            print(f"     imports {', '.join(result['heavy_modules'])} eagerly")
+        for item in result["slowest"]:
+            print(f"     {item['self_ms']:8.1f} ms self {item['cumulative_ms']:8.1f} ms cumulative  {item['module']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""
+Load test of the prediction endpoints, against a local server it starts or one already running.
+
+Usage:
+    python -m benchmarks.loadtest [--server flask|gunicorn|asgi|URL] [--server-workers 2]
+                                  [--mode closed --concurrency 16 | --mode open --rate 50,100,200]
+                                  [--duration 30] [--warmup 3] [--mix form=1,batch=1] [--batch-size 16]
+                                  [--output results.json] [--baseline baseline.json] [--tolerance 0.25]
+
+--server picks what is load tested:
+
+- flask: application.py on the Flask development server (threaded)
+- gunicorn: application.py under gunicorn with gunicorn.conf.py (preloaded model, forked workers)
+- asgi: asgi.py under gunicorn with uvicorn workers
+- a base URL such as http://127.0.0.1:8000: a server started separately, left running
+
+The local servers listen on a free port of 127.0.0.1 and are stopped at the end; their output goes to
+--workdir/server.log. They serve the model in artifacts/ (or MODEL_REGISTRY), as in production.
+
+Requests are drawn from --mix: "form" posts one student to /predict as the HTML form does, "batch" posts
+--batch-size students to /v1/predict as JSON. The students are sampled with replacement from --data, so the
+categories and scores follow the real distribution (and the prediction cache hit rate is realistic).
+
+In closed-loop mode --concurrency clients each send a request as soon as the previous one is answered: it
+measures the throughput the server sustains and the latency at that concurrency. In open-loop mode requests are
+sent at a fixed --rate per second whatever the server's speed (exponential gaps with --poisson), as real traffic
+arrives. Latency is counted from when a request was due, so a server falling behind shows in the percentiles
+instead of slowing the load down. A comma separated list of rates runs one stage per rate, which finds the rate
+at which latency or errors take off.
+
+Each stage reports, per request kind and overall, the requests completed per second, latency percentiles, and
+errors by HTTP status or exception. Requests due in the first --warmup seconds are not counted. Results are
+written as JSON. With --baseline, a stage whose throughput dropped or whose p99 latency grew by more than
+--tolerance, or whose error rate is over --max-error-rate, is reported and the exit status is 1. So is a stage
+that cannot be compared because the baseline does not have it (e.g. different --rate stages) or vice versa.
+"""
+from src.pipeline.predict import FEATURE_COLUMNS
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import numpy as np
+import pandas as pd
+
+
+GUNICORN_CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+KINDS = ("form", "batch")
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def form_fields(record: dict) -> dict:
+    """
+    Returns the fields the HTML form in templates/home.html posts for a student.
+    """
+    return {
+        "gender": record["gender"],
+        "ethnicity": record["race_ethnicity"],
+        "parental_level_of_education": record["parental_level_of_education"],
+        "lunch": record["lunch"],
+        "test_preparation_course": record["test_preparation_course"],
+        # CustomData.from_form swaps the two scores back, see there.
+        "writing_score": record["reading_score"],
+        "reading_score": record["writing_score"],
+    }
+
+
+def build_requests(data_path: str, mix: dict, batch_size: int, count: int, seed: int) -> list:
+    """
+    Returns `count` encoded requests, (kind, method, path, body, headers), drawn from the mix.
+    """
+    records = pd.read_csv(data_path)[FEATURE_COLUMNS].to_dict("records")
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    requests = []
+    for kind in rng.choices(kinds, weights, k=count):
+        if kind == "form":
+            body = urllib.parse.urlencode(form_fields(rng.choice(records))).encode()
+            requests.append((kind, "POST", "/predict", body, {"Content-Type": "application/x-www-form-urlencoded"}))
+        else:
+            body = json.dumps({"records": rng.choices(records, k=batch_size)}).encode()
+            requests.append((kind, "POST", "/v1/predict", body, {"Content-Type": "application/json"}))
+    return requests
+
+
+class Client:
+    """
+    One HTTP/1.1 connection, reopened whenever the server closes it.
+    """
+    def __init__(self, host: str, port: int, timeout: float):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def send(self, method: str, path: str, body: bytes, headers: dict):
+        """
+        Returns the HTTP status of the request, or the name of the exception it failed with.
+        """
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            response.read()
+            if response.will_close:
+                self.connection.close()
+            return response.status
+        except (OSError, http.client.HTTPException) as e:
+            self.connection.close()
+            return type(e).__name__
+
+
+def run_closed(target: tuple, requests: list, concurrency: int, duration: float, timeout: float) -> list:
+    """
+    Runs `concurrency` clients back to back for `duration` seconds. Returns (kind, due, latency, status) per
+    request, with `due` in seconds since the start.
+    """
+    start = time.perf_counter()
+    deadline = start + duration
+    results = []
+
+    def client(offset):
+        connection = Client(*target, timeout)
+        own = []
+        for index in itertools.count(offset * 7919):
+            sent = time.perf_counter()
+            if sent >= deadline:
+                break
+            kind, method, path, body, headers = requests[index % len(requests)]
+            status = connection.send(method, path, body, headers)
+            own.append((kind, sent - start, time.perf_counter() - sent, status))
+        results.extend(own)
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run_open(target: tuple, requests: list, rate: float, duration: float, poisson: bool, max_in_flight: int,
+             timeout: float, seed: int) -> list:
+    """
+    Sends requests at `rate` per second for `duration` seconds from up to `max_in_flight` clients. Returns
+    (kind, due, latency, status) per request, the latency counted from when the request was due.
+    """
+    n = int(rate * duration)
+    if poisson:
+        gaps = np.random.RandomState(seed).exponential(1.0 / rate, n)
+        schedule = np.cumsum(gaps) - gaps[0]
+    else:
+        schedule = np.arange(n) / rate
+    start = time.perf_counter() + 0.1
+    claimed = itertools.count()
+    results = []
+
+    def client():
+        connection = Client(*target, timeout)
+        own = []
+        # Clients take the due times in order: when they are all busy, the requests due meanwhile wait and
+        # their wait counts in their latency, as it would for real clients.
+        for index in claimed:
+            if index >= n:
+                break
+            due = start + schedule[index]
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            kind, method, path, body, headers = requests[index % len(requests)]
+            status = connection.send(method, path, body, headers)
+            own.append((kind, due - start, time.perf_counter() - due, status))
+        results.extend(own)
+
+    threads = [threading.Thread(target=client) for _ in range(max_in_flight)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(results: list, warmup: float) -> dict:
+    """
+    Returns the throughput, latency percentiles and errors of the requests due after the warm up, overall and
+    per request kind. Throughput is over the time from the end of the warm up to the last answer, so a server
+    that falls behind an open-loop rate shows its own pace, not the offered rate.
+    """
+    counted = [result for result in results if result[1] >= warmup]
+    window = max(max((due + latency for _, due, latency, _ in counted), default=warmup) - warmup, 1e-9)
+
+    def stats(items):
+        latencies = np.array([latency for _, _, latency, _ in items]) * 1000
+        errors = {}
+        for _, _, _, status in items:
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+        summary = {
+            "requests": len(items),
+            "throughput": (len(items) - sum(errors.values())) / window,
+            "error_rate": sum(errors.values()) / max(len(items), 1),
+            "errors": errors,
+        }
+        if len(items):
+            summary.update({f"p{q:g}_ms": float(np.percentile(latencies, q)) for q in PERCENTILES})
+            summary.update({"mean_ms": float(latencies.mean()), "max_ms": float(latencies.max())})
+        return summary
+
+    report = {"all": stats(counted)}
+    for kind in sorted({result[0] for result in counted}):
+        report[kind] = stats([result for result in counted if result[0] == kind])
+    return report
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind: str, workers: int, log_path: str) -> tuple:
+    """
+    Starts a local server of the given kind. Returns the process and its (host, port).
+    """
+    port = free_port()
+    env = dict(os.environ, GUNICORN_BIND=f"127.0.0.1:{port}", GUNICORN_WORKERS=str(workers))
+    if kind == "flask":
+        command = [
+            sys.executable, "-c",
+            f"from application import app; app.run(host='127.0.0.1', port={port}, threaded=True)"
+        ]
+    elif kind == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", GUNICORN_CONF]
+    elif kind == "asgi":
+        env.update(GUNICORN_APP="asgi:app", GUNICORN_WORKER_CLASS="uvicorn.workers.UvicornWorker")
+        command = [sys.executable, "-m", "gunicorn", "-c", GUNICORN_CONF]
+    else:
+        raise ValueError(f"Unknown server {kind!r}, expected flask, gunicorn, asgi or a URL")
+
+    os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, ("127.0.0.1", port)
+
+
+def wait_ready(target: tuple, process, timeout: float, log_path: str = None):
+    """
+    Waits until the server answers GET /, for at most `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    client = Client(*target, timeout=2.0)
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}, see {log_path}")
+        if client.send("GET", "/", None, {}) == 200:
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def compare(stages: list, baseline: dict, tolerance: float, max_error_rate: float) -> list:
+    """
+    Returns a description of every stage that regressed against its baseline stage or has too many errors, and
+    of every stage that cannot be compared: a stage missing from the baseline or from this run, or one without
+    completed requests, would otherwise pass unchecked.
+    """
+    previous = {stage["name"]: stage for stage in baseline["stages"]}
+    regressions = [
+        f"{name}: in the baseline but not run" for name in previous if name not in {stage["name"] for stage in stages}
+    ]
+    for stage in stages:
+        current = stage["report"]["all"]
+        if current["error_rate"] > max_error_rate:
+            regressions.append(f"{stage['name']}: error rate {current['error_rate']:.2%}, errors {current['errors']}")
+        before = previous.get(stage["name"], {}).get("report", {}).get("all")
+        if not before:
+            regressions.append(f"{stage['name']}: not in the baseline, nothing to compare with")
+            continue
+        if not before["requests"] or not current["requests"]:
+            where = "in the baseline" if not before["requests"] else "in this run"
+            regressions.append(f"{stage['name']}: no completed requests {where}, nothing to compare")
+            continue
+        if current["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{stage['name']}: throughput {before['throughput']:.1f} -> {current['throughput']:.1f} req/s")
+        # Ignore noise on sub-millisecond latencies.
+        if current["p99_ms"] > max(1.0, before["p99_ms"] * (1 + tolerance)):
+            regressions.append(f"{stage['name']}: p99 {before['p99_ms']:.2f} -> {current['p99_ms']:.2f} ms")
+    return regressions
+
+
+def print_stage(name: str, report: dict):
+    for kind, summary in report.items():
+        latency = (
+            "  ".join(f"p{q:g} {summary[f'p{q:g}_ms']:8.2f}" for q in PERCENTILES) if summary["requests"] else ""
+        )
+        print(
+            f"{name:<24} {kind:<6} {summary['requests']:7d} req  {summary['throughput']:8.1f} req/s  "
+            f"errors {summary['error_rate']:6.2%}  {latency} ms",
+            flush=True
+        )
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"Unknown request kind {kind!r}, expected one of {KINDS}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="gunicorn", help="flask, gunicorn, asgi or the base URL of a running server")
+    parser.add_argument("--server-workers", type=int, default=2, help="worker processes of gunicorn and asgi")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients of the closed-loop mode")
+    parser.add_argument("--rate", default="50", help="requests per second of the open-loop mode, comma separated for several stages")
+    parser.add_argument("--poisson", action="store_true", help="exponential gaps between open-loop requests")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="clients of the open-loop mode")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per stage, warm up included")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds at the start of each stage not counted")
+    parser.add_argument("--mix", type=parse_mix, default="form=1,batch=1", help="weights of the request kinds")
+    parser.add_argument("--batch-size", type=int, default=16, help="students per /v1/predict request")
+    parser.add_argument("--data", default=os.path.join("artifacts", "test.csv"))
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--workdir", default=os.path.join("artifacts", "benchmarks", "loadtest"))
+    parser.add_argument("--output", default=os.path.join("artifacts", "benchmarks", "loadtest", "results.json"))
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--save-baseline", help="also write the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative throughput drop and p99 growth")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    requests = build_requests(args.data, args.mix, args.batch_size, 10_000, args.seed)
+    process = None
+    log_path = os.path.join(args.workdir, "server.log")
+    if "://" in args.server:
+        url = urllib.parse.urlsplit(args.server)
+        target = (url.hostname, url.port or 80)
+    else:
+        process, target = start_server(args.server, args.server_workers, log_path)
+
+    stages = []
+    try:
+        wait_ready(target, process, timeout=120.0, log_path=log_path)
+        # Servers that load the model on first use would otherwise count its load in the first stage.
+        warm = Client(*target, timeout=120.0)
+        for kind in args.mix:
+            _, method, path, body, headers = next(request for request in requests if request[0] == kind)
+            warm.send(method, path, body, headers)
+        if args.mode == "closed":
+            plan = [(f"closed c={args.concurrency}", None)]
+        else:
+            plan = [(f"open {float(rate):g}/s", float(rate)) for rate in args.rate.split(",")]
+        for name, rate in plan:
+            if rate is None:
+                results = run_closed(target, requests, args.concurrency, args.duration, args.timeout)
+            else:
+                results = run_open(
+                    target, requests, rate, args.duration, args.poisson, args.max_in_flight, args.timeout, args.seed
+                )
+            report = summarize(results, args.warmup)
+            if rate is not None:
+                report["all"]["offered_rate"] = rate
+            print_stage(name, report)
+            stages.append({"name": name, "report": report})
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    results = {
+        "server": args.server,
+        "server_workers": args.server_workers,
+        "mode": args.mode,
+        "mix": args.mix,
+        "batch_size": args.batch_size,
+        "duration": args.duration,
+        "cpus": os.cpu_count(),
+        "created": time.time(),
+        "stages": stages,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(stages, json.load(f), args.tolerance, args.max_error_rate)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Load time and size of the versioned artifact format against the dill files it replaces.
+
+Usage:
+    python -m benchmarks.serialization [--train artifacts/train.csv] [--repeat 20]
+
+The serving preprocessor and a representative set of models (the serving model plus RandomForest, XGBoost and
+CatBoost fitted on the training data, the models that are slow to unpickle) are each written as a dill file, an
+uncompressed artifact (memory-mapped on load) and a compressed artifact, then loaded `--repeat` times.
+"""
+from src.components.data_transform import DataTransformation, DataTransformationConfig
+from src.serialization import load_artifact, save_artifact
+from src.utils import load_object
+
+from catboost import CatBoostRegressor
+from sklearn.ensemble import RandomForestRegressor
+from xgboost import XGBRegressor
+
+import argparse
+import os
+import tempfile
+import time
+import dill
+import numpy as np
+
+
+def size_of(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def time_load(load, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def load_dill(path: str):
+    with open(path, "rb") as f:
+        return dill.load(f)
+
+
+def candidates(train_path: str, test_path: str) -> dict:
+    config = DataTransformationConfig()
+    config.preprocessor_path = os.path.join(tempfile.mkdtemp(), "preprocessor")
+    train_X, train_y, _, _, preprocessor_path = DataTransformation(config).data_transform(train_path, test_path)
+
+    # Loaded into memory: dill cannot pickle memory-mapped arrays.
+    objects = {"preprocessor": load_artifact(preprocessor_path, mmap=False)}
+    serving_model = os.path.join("artifacts", "model")
+    if os.path.isdir(serving_model):
+        objects["serving model"] = load_artifact(serving_model, mmap=False)
+    elif os.path.exists(serving_model + ".pkl"):
+        objects["serving model"] = load_object(serving_model)
+    objects["random forest"] = RandomForestRegressor(n_estimators=100, random_state=17).fit(train_X, train_y)
+    objects["xgboost"] = XGBRegressor(n_estimators=300).fit(train_X.toarray(), train_y)
+    objects["catboost"] = CatBoostRegressor(iterations=300, verbose=False).fit(train_X, train_y)
+    return objects
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train", default=os.path.join("artifacts", "train.csv"))
+    parser.add_argument("--test", default=os.path.join("artifacts", "test.csv"))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'object':<16}{'format':<22}{'size KiB':>10}{'load ms':>10}")
+    for name, obj in candidates(args.train, args.test).items():
+        stem = os.path.join(workdir, name.replace(" ", "_"))
+
+        with open(stem + ".pkl", "wb") as f:
+            dill.dump(obj, f)
+        save_artifact(stem + "-raw", obj, compress=0)
+        save_artifact(stem + "-z3", obj, compress=3)
+
+        rows = [
+            ("dill", stem + ".pkl", lambda: load_dill(stem + ".pkl")),
+            ("artifact", stem + "-raw", lambda: load_artifact(stem + "-raw", mmap=False)),
+            ("artifact (mmap)", stem + "-raw", lambda: load_artifact(stem + "-raw")),
+            ("artifact (compress 3)", stem + "-z3", lambda: load_artifact(stem + "-z3")),
+        ]
+        for label, path, load in rows:
+            print(f"{name:<16}{label:<22}{size_of(path) / 1024:>10.1f}{time_load(load, args.repeat):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Latency, throughput and memory benchmarks of the training and serving paths, with regression checks.
+
+Usage:
+    python -m benchmarks.suite [--scales 1,100,10000] [--output results.json] [--baseline baseline.json]
+                               [--save-baseline baseline.json] [--tolerance 0.25]
+
+Synthetic datasets are built by resampling notebook/data/stud.csv to 1x, 100x and 10,000x its size (scores
+jittered by a few points so rows are not all duplicates) and cached under --workdir. For each scale this times:
+
+- DataIngestion, in memory (up to --max-memory-scale, as reading 10M rows at once takes several GB) and streaming
+- DataTransformation of the streamed split
+- each regressor of ModelTrainer through evaluate_models (up to --max-train-scale)
+
+and, with the models fitted at the smallest scale, load_object of every artifact and PredictPipeline.predict on
+single records and on batches.
+
+Each case runs once untimed under tracemalloc, which records its peak traced allocation (NumPy and pandas
+buffers included), then --repeat times (more for the millisecond serving cases) for the latency percentiles.
+Results are written as JSON. With --baseline, every case whose p50 latency or peak memory grew by more than
+--tolerance over the baseline is reported, and the exit status is 1.
+"""
+from src.components.data_ingestion import DataIngestion, DataIngestionConfig
+from src.components.data_transform import DataTransformation, DataTransformationConfig
+from src.components.model_trainer import get_models
+from src.pipeline.model_cache import ModelCache, ModelCacheConfig
+from src.pipeline.prediction_cache import PredictionCache, PredictionCacheConfig
+from src.pipeline.predict import CustomData, FEATURE_COLUMNS, PredictPipeline
+from src.utils import evaluate_models, load_object, peak_rss_mb, save_object
+from sklearn.base import clone
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+
+SOURCE = os.path.join("notebook", "data", "stud.csv")
+SCORES = ["math_score", "reading_score", "writing_score"]
+GENERATE_CHUNK_ROWS = 1_000_000
+
+
+def synthetic_dataset(workdir: str, scale: int, seed: int = 17) -> str:
+    """
+    Returns the path of a CSV with `scale` times the rows of the source data, generating it on first use.
+    """
+    path = os.path.join(workdir, "data", f"stud_x{scale}.csv")
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    source = pd.read_csv(SOURCE)
+    rng = np.random.RandomState(seed)
+    remaining = len(source) * scale
+    staging = path + ".tmp"
+    header = True
+    while remaining:
+        rows = min(remaining, GENERATE_CHUNK_ROWS)
+        chunk = source.iloc[rng.randint(0, len(source), rows)].reset_index(drop=True)
+        if scale > 1:
+            for column in SCORES:
+                chunk[column] = np.clip(chunk[column] + rng.randint(-3, 4, rows), 0, 100)
+        chunk.to_csv(staging, mode="w" if header else "a", header=header, index=False)
+        header = False
+        remaining -= rows
+    os.replace(staging, path)
+    return path
+
+
+def measure(name: str, fn, repeat: int, rows: int = None, scale: int = None) -> tuple:
+    """
+    Runs `fn` once under tracemalloc, then `repeat` timed times. Returns the result dict and the last return value.
+    """
+    tracemalloc.start()
+    value = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+
+    result = {
+        "name": name,
+        "scale": scale,
+        "rows": rows,
+        "repeat": repeat,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "mean_ms": float(timings.mean()),
+        "peak_traced_mb": peak / (1 << 20),
+    }
+    if rows:
+        result["rows_per_sec"] = rows / (result["p50_ms"] / 1000)
+    print(
+        f"{name:<48} {'' if scale is None else f'{scale}x':>7}  p50 {result['p50_ms']:10.3f} ms  "
+        f"p99 {result['p99_ms']:10.3f} ms  peak {result['peak_traced_mb']:8.1f} MB",
+        flush=True
+    )
+    return result, value
+
+
+def training_cases(args, scale: int, results: list):
+    """
+    Benchmarks ingestion, transformation and model fitting at one scale. Returns the fitted models and the
+    preprocessor path of the run.
+    """
+    raw_path = synthetic_dataset(args.workdir, scale)
+    with open(raw_path) as f:
+        rows = sum(1 for _ in f) - 1
+    run_dir = os.path.join(args.workdir, "runs", f"x{scale}")
+
+    if scale <= args.max_memory_scale:
+        config = DataIngestionConfig(
+            train_data_path=os.path.join(run_dir, "memory", "train.csv"),
+            test_data_path=os.path.join(run_dir, "memory", "test.csv"),
+            raw_data_path=raw_path
+        )
+        results.append(measure("ingestion", DataIngestion(config).initiate_data_ingestion, args.repeat, rows, scale)[0])
+
+    config = DataIngestionConfig(
+        train_data_path=os.path.join(run_dir, "train.parquet"),
+        test_data_path=os.path.join(run_dir, "test.parquet"),
+        raw_data_path=raw_path,
+        chunk_size=args.chunk_size,
+        artifact_format="parquet"
+    )
+    result, (train_path, test_path) = measure(
+        "ingestion (streaming)", DataIngestion(config).initiate_data_ingestion, args.repeat, rows, scale
+    )
+    results.append(result)
+
+    config = DataTransformationConfig()
+    config.preprocessor_path = os.path.join(run_dir, "preprocessor")
+    result, (train_X, train_y, test_X, test_y, preprocessor_path) = measure(
+        "transformation", lambda: DataTransformation(config).data_transform(train_path, test_path),
+        args.repeat, rows, scale
+    )
+    results.append(result)
+
+    if scale > args.max_train_scale:
+        return None, preprocessor_path
+
+    def fit(name, template):
+        # A fresh copy per run: CatBoost refuses to refit a fitted model.
+        models = {name: clone(template)}
+        evaluate_models(train_X, train_y, test_X, test_y, models, n_jobs=1)
+        return models[name]
+
+    fitted = {}
+    for name, template in get_models().items():
+        result, fitted[name] = measure(
+            f"evaluate_models: {name}", lambda: fit(name, template), args.repeat, train_X.shape[0], scale
+        )
+        results.append(result)
+    return fitted, preprocessor_path
+
+
+def serving_cases(args, fitted: dict, preprocessor_path: str, results: list):
+    """
+    Benchmarks loading every fitted model and the preprocessor, and predicting with each model.
+    """
+    model_dir = os.path.join(args.workdir, "models")
+    records = pd.read_csv(SOURCE)[FEATURE_COLUMNS]
+    batch = records.sample(args.batch_size, replace=True, random_state=17).reset_index(drop=True)
+    single = records.head(1)
+    record = CustomData(**single.iloc[0].to_dict())
+
+    results.append(measure("load_object: preprocessor", lambda: load_object(preprocessor_path), args.serving_repeat)[0])
+    for name, model in fitted.items():
+        model_path = os.path.join(model_dir, name.lower().replace(" ", "_").replace("-", "_"))
+        save_object(model_path, model)
+        results.append(measure(f"load_object: {name}", lambda: load_object(model_path), args.serving_repeat)[0])
+
+        pipeline = PredictPipeline(
+            cache=ModelCache(ModelCacheConfig(model_path=model_path, preprocessor_path=preprocessor_path)),
+            prediction_cache=PredictionCache(PredictionCacheConfig(enabled=False))
+        )
+        results.append(measure(f"predict single: {name}", lambda: pipeline.predict(single), args.serving_repeat, 1)[0])
+        results.append(measure(f"predict_record: {name}", lambda: pipeline.predict_record(record), args.serving_repeat, 1)[0])
+        results.append(measure(
+            f"predict batch {args.batch_size}: {name}", lambda: pipeline.predict(batch),
+            max(1, args.serving_repeat // 10), args.batch_size
+        )[0])
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    Returns a description of every case slower or bigger than its baseline by more than `tolerance`.
+    """
+    previous = {(item["name"], item["scale"]): item for item in baseline["results"]}
+    regressions = []
+    for item in results:
+        before = previous.get((item["name"], item["scale"]))
+        if before is None:
+            continue
+        for metric in ("p50_ms", "peak_traced_mb"):
+            # Ignore noise on tiny values: sub-millisecond timings and sub-megabyte allocations.
+            if before[metric] > 1e-3 and item[metric] > max(1.0, before[metric] * (1 + tolerance)):
+                label = item["name"] if item["scale"] is None else f"{item['name']} ({item['scale']}x)"
+                regressions.append(
+                    f"{label}: {metric} {before[metric]:.3f} -> {item[metric]:.3f} "
+                    f"(+{(item[metric] / before[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "created": time.time(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1,100,10000", help="comma separated multiples of the source data")
+    parser.add_argument("--max-memory-scale", type=int, default=100, help="largest scale for in-memory ingestion")
+    parser.add_argument("--max-train-scale", type=int, default=100, help="largest scale to fit the models at")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="rows per chunk of streaming ingestion")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of the training cases")
+    parser.add_argument("--serving-repeat", type=int, default=200, help="timed runs of the serving cases")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workdir", default=os.path.join("artifacts", "benchmarks"))
+    parser.add_argument("--output", default=os.path.join("artifacts", "benchmarks", "results.json"))
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--save-baseline", help="also write the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth over the baseline")
+    args = parser.parse_args()
+
+    scales = sorted(int(scale) for scale in args.scales.split(","))
+    results = []
+    serving = None
+    for scale in scales:
+        fitted, preprocessor_path = training_cases(args, scale, results)
+        if serving is None and fitted:
+            serving = fitted, preprocessor_path
+    if serving is not None:
+        serving_cases(args, *serving, results)
+
+    report = {"environment": environment(), "max_rss_mb": peak_rss_mb(), "results": results}
+    for path in filter(None, [args.output, args.save_baseline]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+Serving launcher: `gunicorn` (run from the project root, this file is picked up automatically).
+
+The app is imported and the model loaded once in the master, then shared copy-on-write by the forked workers, see
+src/pipeline/prefork.py. Settings from the environment:
+
+- GUNICORN_APP: "application:app" (Flask, default) or "asgi:app" (with GUNICORN_WORKER_CLASS
+  "uvicorn.workers.UvicornWorker")
+- GUNICORN_BIND (default 0.0.0.0:8000), GUNICORN_WORKERS (default 2 per CPU), GUNICORN_THREADS (default 1)
+- GUNICORN_GRACEFUL_TIMEOUT: seconds old workers get to finish their requests on a model reload (default 30)
+
+Swap the model with `kill -HUP <master pid>`, or let the workers notice the new artifacts and ask for it.
+"""
+from src.pipeline import prefork
+
+import os
+
+
+wsgi_app = os.environ.get("GUNICORN_APP", "application:app")
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2 * (os.cpu_count() or 1)))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+preload_app = True
+
+
+def when_ready(server):
+    prefork.load_in_master()
+
+
+def on_reload(server):
+    prefork.reload_in_master()
+
+
+def post_fork(server, worker):
+    prefork.init_worker()
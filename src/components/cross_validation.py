@@ -0,0 +1,255 @@
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.logger import logging
+from src.utils import as_model_input, set_thread_budget
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+# joblib, scipy and sklearn are imported by the functions running the folds, like in model_tuner.
+
+
+@dataclass
+class CrossValidationConfig:
+    n_splits: int = 5
+    random_state: int = 17
+    n_jobs: int = -1
+    cache_dir: str = os.path.join("artifacts", "cv")
+
+
+THREAD_PARAMS = {"n_jobs", "nthread", "thread_count"}
+# Copy-on-write: the pages are shared until written, and extensions declaring writable buffers (CatBoost, some
+# sklearn Cython code) accept the arrays, which they reject when mapped read-only.
+MMAP_MODE = "c"
+# Part of the fold data key: bumped when the files or layout.json change shape, so older caches are not read.
+LAYOUT_VERSION = 2
+
+
+def _array_digest(digest, array):
+    if hasattr(array, "tocsr"):
+        array = array.tocsr()
+        for part in (array.data, array.indices, array.indptr, np.asarray(array.shape)):
+            digest.update(np.ascontiguousarray(part).tobytes())
+    else:
+        digest.update(np.ascontiguousarray(array).tobytes())
+
+
+def _save_matrix(directory: str, name: str, X) -> dict:
+    """
+    Writes a dense array or the parts of a CSR matrix as .npy files and returns how to read them back.
+    """
+    if hasattr(X, "tocsr"):
+        X = X.tocsr()
+        for part in ("data", "indices", "indptr"):
+            np.save(os.path.join(directory, f"{name}.{part}.npy"), getattr(X, part))
+        return {"sparse": True, "shape": list(X.shape)}
+    np.save(os.path.join(directory, f"{name}.npy"), np.asarray(X))
+    return {"sparse": False, "shape": list(np.shape(X))}
+
+
+def _load_matrix(directory: str, name: str, layout: dict):
+    """
+    Memory-maps a matrix written by `_save_matrix`.
+    """
+    if not layout["sparse"]:
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=MMAP_MODE)
+
+    from scipy import sparse
+    data, indices, indptr = (
+        np.load(os.path.join(directory, f"{name}.{part}.npy"), mmap_mode=MMAP_MODE) for part in ("data", "indices", "indptr")
+    )
+    return sparse.csr_matrix((data, indices, indptr), shape=tuple(layout["shape"]), copy=False)
+
+
+def _fit_fold(name, model, fold_dir, layout, fold, prediction_path):
+    """
+    Fits the model on one fold, scores it on the held out rows and saves its predictions of them to
+    `prediction_path`. Runs in a worker, which maps the fold data rather than receiving a copy of it.
+    """
+    from sklearn.base import clone
+    from sklearn.metrics import r2_score
+
+    directory = os.path.join(fold_dir, f"fold-{fold}")
+    train_X = _load_matrix(directory, "train_X", layout["folds"][fold]["train_X"])
+    val_X = _load_matrix(directory, "val_X", layout["folds"][fold]["val_X"])
+    train_y = np.load(os.path.join(directory, "train_y.npy"), mmap_mode=MMAP_MODE)
+    val_y = np.load(os.path.join(directory, "val_y.npy"), mmap_mode=MMAP_MODE)
+
+    start = time.perf_counter()
+    model = clone(model)
+    model.fit(as_model_input(model, train_X), train_y)
+    predictions = np.ravel(model.predict(as_model_input(model, val_X)))
+    np.save(prediction_path, predictions.astype(np.float64))
+    return name, fold, float(r2_score(val_y, predictions)), time.perf_counter() - start
+
+
+class CrossValidator:
+    """
+    K-fold cross-validation of the candidate models on shared, cached fold data.
+
+    The fold indices are drawn once and each fold's training and held out rows are sliced out of the transformed
+    training data once, then written as .npy files (the parts of CSR matrices for sparse features). Every
+    (model, fold) fit runs in a worker process that memory-maps these files, so the folds are neither recomputed
+    nor copied per model and all workers share one copy of the data in the page cache.
+
+    The fold data is stored under a key hashing the training data and the split settings, and each model's fold
+    scores (and held out predictions) under a key hashing the fold data key, the model's class and parameters and the fitting code. Only
+    the (model, fold) pairs without a stored score are fitted: adding a candidate, or changing one's parameters,
+    fits just that candidate.
+
+    Args:
+        config (CrossValidationConfig): Number of folds, parallelism and cache location.
+
+    Attributes:
+        config (CrossValidationConfig): Number of folds, parallelism and cache location.
+
+    Methods:
+        evaluate(train_X, train_y, models, out_of_fold): Returns the fold scores of every model.
+    """
+    def __init__(self, config: CrossValidationConfig):
+        """
+        Initializes the CrossValidator with the provided configuration.
+
+        Args:
+            config (CrossValidationConfig): Number of folds, parallelism and cache location.
+        """
+        self.config = config
+
+    def _prepare_folds(self, train_X, train_y) -> tuple:
+        """
+        Returns the directory and the matrix layouts of the fold data of (train_X, train_y), writing it if needed.
+        """
+        from sklearn.model_selection import KFold
+
+        digest = hashlib.sha256()
+        digest.update(f"{LAYOUT_VERSION}:{self.config.n_splits}:{self.config.random_state}".encode())
+        _array_digest(digest, train_X)
+        _array_digest(digest, np.asarray(train_y))
+        fold_dir = os.path.join(self.config.cache_dir, digest.hexdigest()[:16])
+        layout_path = os.path.join(fold_dir, "layout.json")
+        if os.path.exists(layout_path):
+            with open(layout_path) as f:
+                return fold_dir, json.load(f)
+
+        os.makedirs(self.config.cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.config.cache_dir, prefix=".tmp-")
+        train_X = train_X.tocsr() if hasattr(train_X, "tocsr") else np.asarray(train_X)
+        train_y = np.asarray(train_y)
+        # Per fold: when the rows don't divide evenly, the first folds hold out one row more than the others.
+        layout = {"folds": []}
+        splits = KFold(self.config.n_splits, shuffle=True, random_state=self.config.random_state).split(train_y)
+        for fold, (train_index, val_index) in enumerate(splits):
+            directory = os.path.join(staging, f"fold-{fold}")
+            os.makedirs(directory)
+            layout["folds"].append({
+                "train_X": _save_matrix(directory, "train_X", train_X[train_index]),
+                "val_X": _save_matrix(directory, "val_X", train_X[val_index]),
+            })
+            np.save(os.path.join(directory, "train_y.npy"), train_y[train_index])
+            np.save(os.path.join(directory, "val_y.npy"), train_y[val_index])
+        with open(os.path.join(staging, "layout.json"), "w") as f:
+            json.dump(layout, f)
+
+        try:
+            os.rename(staging, fold_dir)
+        except OSError:
+            # Written concurrently by another run: keep theirs.
+            shutil.rmtree(staging, ignore_errors=True)
+        logging.info(f"Wrote {self.config.n_splits} folds of {train_y.shape[0]} rows to {fold_dir}")
+        return fold_dir, layout
+
+    def _result_path(self, fold_dir: str, model) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{type(model).__module__}.{type(model).__qualname__}".encode())
+        # Thread counts are set per run and don't change the scores.
+        params = {key: value for key, value in model.get_params().items() if key not in THREAD_PARAMS}
+        digest.update(repr(sorted(params.items())).encode())
+        digest.update(inspect.getsource(sys.modules[__name__]).encode())
+        return os.path.join(fold_dir, "results", f"{digest.hexdigest()[:16]}.json")
+
+    def _prediction_path(self, result_path: str, fold: int) -> str:
+        return f"{result_path[:-len('.json')]}.fold-{fold}.npy"
+
+    def _out_of_fold(self, result_path: str, train_y) -> np.ndarray:
+        """
+        Returns the held out predictions of every fold, in the order of the training rows.
+        """
+        from sklearn.model_selection import KFold
+
+        predictions = np.empty(len(train_y), dtype=np.float64)
+        # The same seeded split as _prepare_folds, so the indices need not be stored.
+        splits = KFold(self.config.n_splits, shuffle=True, random_state=self.config.random_state).split(train_y)
+        for fold, (_, val_index) in enumerate(splits):
+            predictions[val_index] = np.load(self._prediction_path(result_path, fold))
+        return predictions
+
+    def evaluate(self, train_X, train_y, models: dict, out_of_fold: bool = False) -> dict:
+        """
+        Returns the fold scores of every model, fitting only the (model, fold) pairs not scored before.
+
+        Args:
+            train_X (array-like or sparse matrix): The transformed training features.
+            train_y (array-like): The training target.
+            models (dict): Model name to an unfitted estimator. The models themselves are not fitted.
+            out_of_fold (bool): Whether to also return the predictions of every training row by the model fitted
+                on the folds that held it out, e.g. to fit an ensemble on.
+
+        Returns:
+            dict: Model name to a dict with the R2 `scores` of the folds, their `mean` and `std`, whether they
+            were all `cached`, and with `out_of_fold` the `oof` predictions.
+
+        Raises:
+            CustomException: If an exception occurs during the evaluation.
+        """
+        try:
+            from joblib import Parallel, delayed, effective_n_jobs
+
+            fold_dir, layout = self._prepare_folds(train_X, train_y)
+            os.makedirs(os.path.join(fold_dir, "results"), exist_ok=True)
+            results, tasks = {}, []
+            for name, model in models.items():
+                path = self._result_path(fold_dir, model)
+                cached = {}
+                if os.path.exists(path):
+                    with open(path) as f:
+                        cached = {int(fold): score for fold, score in json.load(f)["scores"].items()}
+                results[name] = (path, cached, len(cached) == self.config.n_splits)
+                tasks.extend((name, model, fold) for fold in range(self.config.n_splits) if fold not in cached)
+
+            if tasks:
+                workers = max(1, min(effective_n_jobs(self.config.n_jobs), len(tasks)))
+                threads = max(1, (os.cpu_count() or 1) // workers)
+                logging.info(f"Cross-validating {len(tasks)} (model, fold) pairs on {workers} workers")
+                fitted = Parallel(n_jobs=workers)(
+                    delayed(_fit_fold)(
+                        name, set_thread_budget(model, threads), fold_dir, layout, fold,
+                        self._prediction_path(results[name][0], fold)
+                    )
+                    for name, model, fold in tasks
+                )
+                for name, fold, score, fit_time in fitted:
+                    results[name][1][fold] = score
+                    logging.info(f"{name} fold {fold}: R2 {score:.4f}, fitted in {fit_time:.2f}s")
+
+            report = {}
+            for name, (path, scores, cached) in results.items():
+                if not cached:
+                    with open(path + ".tmp", "w") as f:
+                        json.dump({"model": name, "scores": scores}, f)
+                    os.replace(path + ".tmp", path)
+                values = np.array([scores[fold] for fold in range(self.config.n_splits)])
+                report[name] = {"scores": values.tolist(), "mean": float(values.mean()), "std": float(values.std()), "cached": cached}
+                if out_of_fold:
+                    report[name]["oof"] = self._out_of_fold(path, np.asarray(train_y))
+                logging.info(f"{name}: CV R2 {values.mean():.4f} +/- {values.std():.4f}{' (cached)' if cached else ''}")
+            return report
+        except Exception as e:
+            raise CustomException(str(e), sys)
@@ -1,10 +1,14 @@
 from src.exception import CustomException
 from src.logger import logging
+from src.storage import TableWriter, table_path, write_table
+from src.utils import peak_rss_mb
 from sklearn.model_selection import train_test_split
 from dataclasses import dataclass
 
 import os
 import sys
+import time
+import numpy as np
 import pandas as pd
 
 
@@ -13,6 +17,10 @@ class DataIngestionConfig:
     train_data_path: str = os.path.join("artifacts", "train.csv")
     test_data_path: str = os.path.join("artifacts", "test.csv")
     raw_data_path: str = os.path.join("artifacts", "data.csv")
+    test_size: float = 0.2
+    random_state: int = 17
+    chunk_size: int = None
+    artifact_format: str = "csv"
 
 
 class DataIngestion:
@@ -27,6 +35,7 @@ class DataIngestion:
 
     Methods:
         initiate_data_ingestion(self): Initiates the data ingestion process.
+        is_test_row(self, positions): Returns which rows of the raw data belong to the test split in streaming mode.
     """
     def __init__(self, config: DataIngestionConfig) -> None:
         """
@@ -44,6 +53,10 @@ class DataIngestion:
         """
         Initiates the data ingestion process.
 
+        When `config.chunk_size` is set the raw data is streamed in chunks of that many rows instead of being read
+        at once, see `_stream_data_ingestion`. The train and test data are written in `config.artifact_format`
+        ("csv", "parquet" or "feather"), with the extension of their paths changed to match.
+
         Args:
             None
 
@@ -56,15 +69,98 @@ class DataIngestion:
         """
         try:
             logging.info("Starting data ingestion")
+            train_path = table_path(self.config.train_data_path, self.config.artifact_format)
+            test_path = table_path(self.config.test_data_path, self.config.artifact_format)
+            os.makedirs(os.path.dirname(train_path), exist_ok=True)
+            if self.config.chunk_size:
+                return self._stream_data_ingestion(train_path, test_path)
+
             df = pd.read_csv(self.config.raw_data_path)
             logging.info(f"Read the data from {self.config.raw_data_path} as dataframe")
 
-            os.makedirs(os.path.dirname(self.config.train_data_path), exist_ok=True)
             logging.info("Train Test Split Initiated")
-            train, test = train_test_split(df, test_size=0.2, random_state=17)
-            train.to_csv(self.config.train_data_path, index=False)
-            test.to_csv(self.config.test_data_path, index=False)
+            train, test = train_test_split(df, test_size=self.config.test_size, random_state=self.config.random_state)
+            write_table(train, train_path, self.config.artifact_format)
+            write_table(test, test_path, self.config.artifact_format)
             logging.info(f"Splitted the data into train and test")
-            return self.config.train_data_path, self.config.test_data_path
+            return train_path, test_path
         except Exception as e:
             raise CustomException(str(e), sys)
+
+    def is_test_row(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Returns which rows of the raw data belong to the test split in streaming mode.
+
+        A row's split only depends on its position in the raw file and on `config.random_state`: the position is
+        hashed with a key derived from the random state and the row goes to the test split when the hash falls in
+        the lowest `config.test_size` fraction. The split is therefore reproducible, independent of the chunk size,
+        and rows appended to the raw file later don't move existing rows between splits.
+
+        Args:
+            positions (np.ndarray): 0-based positions of the rows in the raw data file.
+
+        Returns:
+            np.ndarray: Boolean mask, True for the rows of the test split.
+        """
+        hash_key = f"{self.config.random_state:016d}"[-16:]
+        hashes = pd.util.hash_array(positions.astype(np.uint64), hash_key=hash_key)
+        return (hashes % np.uint64(1_000_000)) < np.uint64(round(self.config.test_size * 1_000_000))
+
+    def test_mask(self, n_rows: int) -> np.ndarray:
+        """
+        Returns which rows of a raw data file of `n_rows` rows `initiate_data_ingestion` puts in the test split.
+
+        Args:
+            n_rows (int): Number of rows of the raw data file.
+
+        Returns:
+            np.ndarray: Boolean mask, True for the rows of the test split.
+        """
+        positions = np.arange(n_rows)
+        if self.config.chunk_size:
+            return self.is_test_row(positions)
+        # train_test_split's shuffle only depends on the number of rows, so splitting the positions gives the
+        # same split as splitting the DataFrame.
+        _, test_positions = train_test_split(positions, test_size=self.config.test_size, random_state=self.config.random_state)
+        mask = np.zeros(n_rows, dtype=bool)
+        mask[test_positions] = True
+        return mask
+
+    def _stream_data_ingestion(self, train_path: str, test_path: str):
+        """
+        Splits the raw data into train and test files chunk by chunk, so peak memory is bounded by the chunk size.
+
+        Args:
+            train_path (str): The path of the train data to write.
+            test_path (str): The path of the test data to write.
+
+        Returns:
+            tuple: Tuple containing paths of train and test data.
+
+        Raises:
+            ValueError: If the raw data has no rows, as train_test_split does when it is read at once.
+        """
+        start = time.perf_counter()
+        rows = train_rows = 0
+        fmt = self.config.artifact_format
+        with TableWriter(train_path, fmt) as train_writer, TableWriter(test_path, fmt) as test_writer:
+            for chunk in pd.read_csv(self.config.raw_data_path, chunksize=self.config.chunk_size):
+                positions = np.arange(rows, rows + len(chunk))
+                test_mask = self.is_test_row(positions)
+                train_writer.write(chunk[~test_mask])
+                test_writer.write(chunk[test_mask])
+                rows += len(chunk)
+                train_rows += int((~test_mask).sum())
+        if rows == 0:
+            # Fail like the in-memory split: the writers never open when the reader yields no chunk, which would
+            # leave the train and test files of a previous run in place.
+            raise ValueError(f"No rows in {self.config.raw_data_path}")
+
+        elapsed = time.perf_counter() - start
+        peak = peak_rss_mb()
+        logging.info(
+            f"Streamed {rows} rows ({train_rows} train, {rows - train_rows} test) from {self.config.raw_data_path} "
+            f"in {elapsed:.2f}s: {rows / max(elapsed, 1e-9):.0f} rows/sec, process peak RSS so far "
+            f"{f'{peak:.1f} MB' if peak is not None else 'unavailable'}"
+        )
+        return train_path, test_path
@@ -5,17 +5,20 @@ from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from src.exception import CustomException
 from src.logger import logging
+from src.storage import read_table
 from src.utils import save_object
 
 import sys
 import os
 import numpy as np
-import pandas as pd
 
 
 @dataclass
 class DataTransformationConfig:
-    preprocessor_path = os.path.join("artifacts", "preprocessor.pkl")
+    preprocessor_path = os.path.join("artifacts", "preprocessor")
+    artifact_format: str = None
+    memory_map: bool = True
+    sparse_output: bool = True
 
 
 class DataTransformation:
@@ -23,7 +26,7 @@ class DataTransformation:
     DataTransformation class is responsible for transforming the data.
 
     Args:
-        config (DataTransformationConfig): An instance of the DataTransformationConfig class containing the path to the preprocessor.pkl file.
+        config (DataTransformationConfig): An instance of the DataTransformationConfig class containing the path to the preprocessor artifact.
 
     Attributes:
         config (DataTransformationConfig): The instance of the DataTransformationConfig class.
@@ -36,7 +39,7 @@ class DataTransformation:
         Initializes the DataTransformation class with the provided DataTransformationConfig instance.
 
         Args:
-            config (DataTransformationConfig): An instance of the DataTransformationConfig class containing the path to the preprocessor.pkl file.
+            config (DataTransformationConfig): An instance of the DataTransformationConfig class containing the path to the preprocessor artifact.
 
         Attributes:
             config (DataTransformationConfig): The instance of the DataTransformationConfig class.
@@ -58,6 +61,8 @@ class DataTransformation:
         - The transformer pipeline
         - A list of the columns to be transformed by the given transformer
 
+        With `config.sparse_output` set, the preprocessor always returns a CSR matrix so the one-hot features are never densified, otherwise it always returns a dense array.
+
         Raises:
             CustomException: If an error occurs during preprocessor creation.
 
@@ -95,7 +100,8 @@ class DataTransformation:
                 transformers=[
                     ("num", numeric_transformer, numerical_columns),
                     ("cat", categorical_transformer, categorical_columns)
-                ]
+                ],
+                sparse_threshold=1.0 if self.config.sparse_output else 0.0
             )
             return preprocessor
         except Exception as e:
@@ -106,11 +112,11 @@ class DataTransformation:
         This method reads the training and testing datasets, applies the preprocessing steps, and saves the preprocessor.
 
         Args:
-            train_path (str): The path to the training dataset.
-            test_path (str): The path to the testing dataset.
+            train_path (str): The path to the training dataset, in the format given by `config.artifact_format` or by its extension.
+            test_path (str): The path to the testing dataset, in the same format.
 
         Returns:
-            Tuple[np.ndarray, np.ndarray, str]: A tuple containing the transformed training and testing datasets and the path to the saved preprocessor.
+            Tuple: The transformed training features, training target, transformed testing features, testing target and the path to the saved preprocessor. The features are CSR matrices when `config.sparse_output` is set, dense arrays otherwise; the targets are 1-d arrays.
 
         Raises:
             CustomException: If an error occurs during data transformation.
@@ -120,13 +126,12 @@ class DataTransformation:
             2. Get the preprocessor using the `get_preprocessor` method.
             3. Extract the numerical and target columns from the training dataset.
             4. Apply the preprocessing steps to the training and testing datasets.
-            5. Combine the transformed features with the target variable in the training dataset.
-            6. Save the preprocessor to the specified path.
-            7. Return the transformed training and testing datasets and the path to the saved preprocessor.
+            5. Save the preprocessor to the specified path.
+            6. Return the transformed features and the targets separately, and the path to the saved preprocessor.
         """
         try:
-            train_df = pd.read_csv(train_path)
-            test_df = pd.read_csv(test_path)
+            train_df = read_table(train_path, self.config.artifact_format, self.config.memory_map)
+            test_df = read_table(test_path, self.config.artifact_format, self.config.memory_map)
             logging.info("Data read successfully")
 
             preprocessor = self.get_preprocessor()
@@ -145,12 +150,13 @@ class DataTransformation:
             train_X_transformed = preprocessor.fit_transform(train_X)
             test_X_transformed = preprocessor.transform(test_X)
 
-            train = np.c_[train_X_transformed, np.array(train_y)]
-            test = np.c_[test_X_transformed, np.array(test_y)]
             logging.info("Preprocessing done")
 
             save_object(file_path=self.config.preprocessor_path, obj=preprocessor)
             logging.info(f"Preprocessor saved to {self.config.preprocessor_path}")
-            return train, test, self.config.preprocessor_path
+            return (
+                train_X_transformed, np.asarray(train_y), test_X_transformed, np.asarray(test_y),
+                self.config.preprocessor_path
+            )
         except Exception as e:
             raise CustomException(str(e), sys)
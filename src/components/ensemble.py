@@ -0,0 +1,217 @@
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.logger import logging
+from src.utils import as_model_input
+
+import os
+import sys
+import threading
+import numpy as np
+
+# scipy and sklearn are imported by fit_weights: serving an ensemble only needs its members' libraries.
+
+
+@dataclass
+class EnsembleConfig:
+    size: int = 3
+    method: str = "blend"
+    stack_alpha: float = 1.0
+    n_jobs: int = 4
+    parallel_min_rows: int = 256
+
+
+METHODS = ("blend", "stack")
+
+
+def fit_weights(predictions: np.ndarray, y, method: str = "blend", alpha: float = 1.0) -> tuple:
+    """
+    Fits how the members' predictions are combined, on out-of-fold predictions so the weights reward what each
+    member gets right on rows it was not fitted on rather than how well it memorized them.
+
+    Args:
+        predictions (np.ndarray): (n_rows, n_members) out-of-fold predictions.
+        y (array-like): The target.
+        method (str): "blend" for non-negative weights summing to one, fitted by non-negative least squares;
+            "stack" for a ridge regression on the predictions, with an intercept.
+        alpha (float): Regularization of the "stack" ridge regression.
+
+    Returns:
+        tuple: (weights, intercept).
+
+    Raises:
+        ValueError: If the method is unknown.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    if method == "blend":
+        from scipy.optimize import nnls
+
+        weights, _ = nnls(predictions, y)
+        if weights.sum() <= 0:
+            weights = np.ones(predictions.shape[1])
+        return weights / weights.sum(), 0.0
+    if method == "stack":
+        from sklearn.linear_model import Ridge
+
+        meta = Ridge(alpha=alpha).fit(predictions, y)
+        return np.asarray(meta.coef_, dtype=np.float64), float(meta.intercept_)
+    raise ValueError(f"Unknown ensemble method {method!r}, expected one of {METHODS}")
+
+
+class EnsembleRegressor:
+    """
+    A weighted combination of fitted regressors, saved and served as a single model.
+
+    The prediction is `intercept + sum(weight * member prediction)`. Members with a zero weight are dropped when
+    the ensemble is built. Batches of at least `parallel_min_rows` rows are predicted by the members in parallel
+    on a pool of `n_jobs` threads: XGBoost, CatBoost and the sklearn tree and linear algebra code release the GIL,
+    so the latency is about that of the slowest member rather than the sum of all of them. Smaller batches are
+    predicted sequentially, as handing them to threads costs more than it saves. Tree members can be replaced by
+    their CompiledTrees for prediction, see `compile_members`.
+
+    Args:
+        names (list): Names of the members.
+        members (list): The fitted members.
+        weights (array-like): Weight of each member.
+        intercept (float): Added to the weighted sum.
+        n_jobs (int): Threads predicting the members.
+        parallel_min_rows (int): Smallest batch predicted in parallel.
+
+    Attributes:
+        names_ (list): Names of the members.
+        members_ (list): The fitted members.
+        weights_ (np.ndarray): Weight of each member.
+        intercept_ (float): Added to the weighted sum.
+        n_jobs (int): Threads predicting the members.
+        parallel_min_rows (int): Smallest batch predicted in parallel.
+
+    Methods:
+        predict(X): Returns the ensemble's predictions.
+        compile_members(compile): Replaces members by compiled versions for prediction.
+        get_params(), set_params(**params): The thread settings, for set_thread_budget.
+    """
+    def __init__(self, names: list, members: list, weights, intercept: float = 0.0, n_jobs: int = 4, parallel_min_rows: int = 256):
+        """
+        Builds the ensemble from fitted members, dropping those with a zero weight.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        keep = [index for index, weight in enumerate(weights) if weight != 0.0]
+        self.names_ = [names[index] for index in keep]
+        self.members_ = [members[index] for index in keep]
+        self.weights_ = weights[keep]
+        self.intercept_ = float(intercept)
+        self.n_jobs = n_jobs
+        self.parallel_min_rows = parallel_min_rows
+        self.n_features_in_ = getattr(self.members_[0], "n_features_in_", None) if self.members_ else None
+        self._compiled = {}
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Neither the thread pool nor the compiled members are saved: the pool is process-local, and the compiled
+        # members are rebuilt and verified by whoever loads the ensemble.
+        state = self.__dict__.copy()
+        for name in ("_compiled", "_pool", "_pool_pid", "_lock"):
+            state.pop(name)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compiled = {}
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        members = ", ".join(f"{name}: {weight:.3f}" for name, weight in zip(self.names_, self.weights_))
+        return f"EnsembleRegressor({members}, intercept={self.intercept_:.3f})"
+
+    def get_params(self, deep: bool = False) -> dict:
+        return {"n_jobs": self.n_jobs, "parallel_min_rows": self.parallel_min_rows}
+
+    def set_params(self, **params):
+        for name, value in params.items():
+            if name not in ("n_jobs", "parallel_min_rows"):
+                raise ValueError(f"Invalid parameter {name!r} for EnsembleRegressor")
+            setattr(self, name, value)
+        return self
+
+    def compile_members(self, compile):
+        """
+        Predicts with compiled versions of the members from now on.
+
+        Args:
+            compile (callable): Called with each member, returns an object with the member's `predict` (e.g. a
+                verified CompiledTrees) or None to keep the member. Members whose input is densified for the
+                member keep getting it.
+        """
+        compiled = {}
+        for index, member in enumerate(self.members_):
+            replacement = compile(member)
+            if replacement is not None:
+                compiled[index] = replacement
+        self._compiled = compiled
+
+    def _executor(self):
+        # Created lazily, and again in a forked worker, which does not inherit the master's threads.
+        if self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool_pid != os.getpid():
+                    from concurrent.futures import ThreadPoolExecutor
+
+                    self._pool = ThreadPoolExecutor(max_workers=self.n_jobs, thread_name_prefix="ensemble")
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def _predict_member(self, index: int, X) -> np.ndarray:
+        member = self.members_[index]
+        predictor = self._compiled.get(index, member)
+        return np.ravel(predictor.predict(as_model_input(member, X))).astype(np.float64, copy=False)
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Returns the weighted combination of the members' predictions.
+
+        Args:
+            X (array-like or sparse matrix): The transformed features.
+
+        Returns:
+            np.ndarray: One prediction per row.
+        """
+        try:
+            indices = range(len(self.members_))
+            if self.n_jobs > 1 and len(self.members_) > 1 and X.shape[0] >= self.parallel_min_rows:
+                predictions = list(self._executor().map(lambda index: self._predict_member(index, X), indices))
+            else:
+                predictions = [self._predict_member(index, X) for index in indices]
+            return self.intercept_ + np.column_stack(predictions) @ self.weights_
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+
+def build_ensemble(config: EnsembleConfig, cv_report: dict, train_y) -> tuple:
+    """
+    Picks the `config.size` best models by cross-validation and fits their weights on their out-of-fold
+    predictions.
+
+    Args:
+        config (EnsembleConfig): Size, method and serving settings of the ensemble.
+        cv_report (dict): CrossValidator.evaluate report made with `out_of_fold`.
+        train_y (array-like): The training target.
+
+    Returns:
+        tuple: (names of the members, their weights, the intercept, the R2 of the combined out-of-fold
+        predictions).
+    """
+    from sklearn.metrics import r2_score
+
+    names = sorted(cv_report, key=lambda name: cv_report[name]["mean"], reverse=True)[:config.size]
+    predictions = np.column_stack([cv_report[name]["oof"] for name in names])
+    weights, intercept = fit_weights(predictions, train_y, config.method, config.stack_alpha)
+    score = r2_score(train_y, intercept + predictions @ weights)
+    logging.info(
+        f"Ensemble of {', '.join(f'{name} ({weight:.3f})' for name, weight in zip(names, weights))}: out-of-fold R2 "
+        f"{score:.4f}, best member CV R2 {cv_report[names[0]]['mean']:.4f}"
+    )
+    return names, weights, intercept, score
@@ -0,0 +1,446 @@
+from dataclasses import dataclass, field
+
+from src.components.data_ingestion import DataIngestion, DataIngestionConfig
+from src.exception import CustomException
+from src.logger import logging
+from src.utils import as_model_input, load_object, save_object
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+
+TARGET_COLUMN = "math_score"
+
+
+@dataclass
+class IncrementalTrainerConfig:
+    # The raw data, and the split the full runs make of it.
+    ingestion: DataIngestionConfig = field(default_factory=DataIngestionConfig)
+    # Untracked copy of the raw data the new records are appended to, made on the first update.
+    data_path: str = os.path.join("artifacts", "incremental_data.csv")
+    model_path: str = os.path.join("artifacts", "model")
+    preprocessor_path: str = os.path.join("artifacts", "preprocessor")
+    state_path: str = os.path.join("artifacts", "incremental_state.json")
+    boost_rounds: int = 50
+    min_drift_rows: int = 100
+    drift_threshold: float = 0.2
+    max_score_drop: float = 0.05
+    max_statistic_change: float = 0.1
+    max_delta_fraction: float = 0.5
+    chunk_size: int = 100_000
+
+
+def _preprocessor_columns(preprocessor) -> tuple:
+    """
+    Returns the numeric columns and the categorical columns with their fitted vocabularies of the preprocessor.
+    """
+    numeric, categorical = [], {}
+    for _, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        encoders = [step for _, step in getattr(transformer, "steps", []) if hasattr(step, "categories_")]
+        if encoders:
+            categorical.update(
+                (column, {str(category) for category in categories})
+                for column, categories in zip(columns, encoders[0].categories_)
+            )
+        else:
+            numeric.extend(columns)
+    return numeric, categorical
+
+
+class FeatureStatistics:
+    """
+    Exact value counts of the raw feature columns, updated from new rows only.
+
+    The scores are integers in a small range and the categorical columns have a handful of values, so counting
+    every distinct value is cheap and gives the exact statistics the preprocessor is fitted with (median,
+    standard deviation, most frequent value) for the whole history without reading it again.
+
+    Args:
+        numeric (list): Names of the numeric columns.
+        categorical (list): Names of the categorical columns.
+
+    Attributes:
+        rows (int): Number of rows counted.
+        counts (dict): Column name to a {value: count} dict of its non-missing values.
+        missing (dict): Column name to its number of missing values.
+    """
+    def __init__(self, numeric: list, categorical: list):
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        self.rows = 0
+        self.counts = {column: {} for column in self.numeric + self.categorical}
+        self.missing = {column: 0 for column in self.numeric + self.categorical}
+
+    def update(self, df: pd.DataFrame):
+        """
+        Adds the rows of `df` to the counts.
+        """
+        self.rows += len(df)
+        for column in self.numeric + self.categorical:
+            counts = self.counts[column]
+            cast = float if column in self.numeric else str
+            for value, count in df[column].value_counts(dropna=True).items():
+                counts[cast(value)] = counts.get(cast(value), 0) + int(count)
+            self.missing[column] += int(df[column].isna().sum())
+
+    def _sorted(self, column: str) -> tuple:
+        values = np.array(sorted(self.counts[column]), dtype=np.float64)
+        return values, np.array([self.counts[column][value] for value in values], dtype=np.float64)
+
+    def median(self, column: str) -> float:
+        """
+        Returns the median of the non-missing values of a numeric column, as SimpleImputer computes it.
+        """
+        values, counts = self._sorted(column)
+        total = counts.sum()
+        cumulative = np.cumsum(counts)
+        low = values[np.searchsorted(cumulative, (total - 1) // 2 + 1)]
+        high = values[np.searchsorted(cumulative, total // 2 + 1)]
+        return float((low + high) / 2)
+
+    def scale(self, column: str) -> float:
+        """
+        Returns the standard deviation of a numeric column after imputing its missing values with the median,
+        the `scale_` StandardScaler fits on it.
+        """
+        values, counts = self._sorted(column)
+        values = np.append(values, self.median(column))
+        counts = np.append(counts, self.missing[column])
+        mean = np.average(values, weights=counts)
+        return float(np.sqrt(np.average((values - mean) ** 2, weights=counts)))
+
+    def distribution(self, column: str, df: pd.DataFrame, bins: int = 10) -> tuple:
+        """
+        Returns the share of the counted rows and of the rows of `df` in each bin of a column: deciles of the
+        counted values for numeric columns, the values themselves for categorical ones.
+        """
+        if column in self.numeric:
+            values, counts = self._sorted(column)
+            edges = np.unique(values[np.searchsorted(np.cumsum(counts) / counts.sum(), np.arange(1, bins) / bins)])
+            expected = np.bincount(np.searchsorted(edges, values, side="right"), counts, len(edges) + 1)
+            actual = np.bincount(
+                np.searchsorted(edges, df[column].dropna().to_numpy(dtype=np.float64), side="right"),
+                minlength=len(edges) + 1
+            )
+        else:
+            categories = sorted(set(self.counts[column]) | set(df[column].dropna().astype(str)))
+            expected = np.array([self.counts[column].get(category, 0) for category in categories], dtype=np.float64)
+            observed = df[column].dropna().astype(str).value_counts()
+            actual = np.array([observed.get(category, 0) for category in categories], dtype=np.float64)
+        return expected / max(expected.sum(), 1), actual / max(actual.sum(), 1)
+
+    def psi(self, column: str, df: pd.DataFrame) -> float:
+        """
+        Returns the population stability index of a column between the counted rows and the rows of `df`.
+        """
+        expected, actual = (np.maximum(share, 1e-4) for share in self.distribution(column, df))
+        return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+    def to_dict(self) -> dict:
+        return {
+            "numeric": self.numeric,
+            "categorical": self.categorical,
+            "rows": self.rows,
+            "counts": {column: [[value, count] for value, count in counts.items()] for column, counts in self.counts.items()},
+            "missing": self.missing,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FeatureStatistics":
+        statistics = cls(data["numeric"], data["categorical"])
+        statistics.rows = data["rows"]
+        statistics.counts = {column: {value: count for value, count in counts} for column, counts in data["counts"].items()}
+        statistics.missing = data["missing"]
+        return statistics
+
+
+def _is_linear(model) -> bool:
+    from sklearn.linear_model import LinearRegression, Ridge
+    return type(model) in (LinearRegression, Ridge)
+
+
+def _normal_equations(X, y) -> dict:
+    """
+    Returns the sufficient statistics of least squares on (X, y): the row count and the sums of x, y, x x^T and x y.
+    """
+    X = X.toarray() if hasattr(X, "toarray") else np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return {
+        "n": len(y),
+        "sum_x": X.sum(axis=0).tolist(),
+        "sum_y": float(y.sum()),
+        "xtx": (X.T @ X).tolist(),
+        "xty": (X.T @ y).tolist(),
+    }
+
+
+class IncrementalTrainer:
+    """
+    Updates the trained model with newly arrived records instead of retraining it on the whole history.
+
+    The preprocessor stays as it was fitted: the model's coefficients and split thresholds are expressed in its
+    units, so changing its statistics under a trained model would shift every prediction. Its statistics are
+    instead kept up to date exactly (FeatureStatistics) and a full retrain is requested once they moved by more
+    than `max_statistic_change`. The model is updated from the new rows only:
+
+    - XGBoost and CatBoost continue boosting, adding `boost_rounds` trees fitted to the new rows
+    - LinearRegression and Ridge are refitted exactly: their normal equations are sums over rows, kept in the state
+
+    A full retrain is requested instead when the model supports none of these, when the new rows contain a
+    category the preprocessor has not seen (the one-hot vocabulary, and so the model's inputs, would grow), when
+    their distribution drifted (population stability index over `drift_threshold`) or the current model scores
+    more than `max_score_drop` R2 below its test score on them, and after `max_delta_fraction` of the history was
+    added incrementally. The new rows are appended to `config.data_path` either way, a copy of the raw data made
+    on the first update that the full runs then read (see `raw_data_path`), so a full retrain includes them and the
+    raw data itself is never written. A failed update removes the rows it appended.
+
+    Args:
+        config (IncrementalTrainerConfig): Paths of the data, artifacts and state, and the retrain thresholds.
+
+    Attributes:
+        config (IncrementalTrainerConfig): Paths of the data, artifacts and state, and the retrain thresholds.
+
+    Methods:
+        reset(model, name, score, train_X, train_y): Records the state of a fully retrained model.
+        raw_data_path(config): Returns the raw data the full runs should read.
+        update(new_df): Appends new records and updates the model with them, or asks for a full retrain.
+    """
+    def __init__(self, config: IncrementalTrainerConfig):
+        """
+        Initializes the IncrementalTrainer with the provided configuration.
+
+        Args:
+            config (IncrementalTrainerConfig): Paths of the data, artifacts and state, and the retrain thresholds.
+        """
+        self.config = config
+
+    @staticmethod
+    def raw_data_path(config: IncrementalTrainerConfig) -> str:
+        """
+        Returns the raw data the full runs should read: the copy with the appended records once an update made it,
+        else the raw data of `config.ingestion`.
+
+        Args:
+            config (IncrementalTrainerConfig): The configuration of the incremental updates.
+
+        Returns:
+            str: Path of the raw data.
+        """
+        return config.data_path if os.path.exists(config.data_path) else config.ingestion.raw_data_path
+
+    def _read_state(self):
+        if not os.path.exists(self.config.state_path):
+            return None
+        with open(self.config.state_path) as f:
+            return json.load(f)
+
+    def _write_state(self, state: dict):
+        directory = os.path.dirname(os.path.abspath(self.config.state_path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as f:
+            json.dump(state, f)
+        os.replace(f.name, self.config.state_path)
+
+    def reset(self, model, name: str, score: float, train_X, train_y):
+        """
+        Records the state of a fully retrained model: the statistics of the whole raw data, read once in chunks,
+        and the normal equations of linear models.
+
+        Args:
+            model (estimator): The retrained model.
+            name (str): Name of the model.
+            score (float): Its test R2 score.
+            train_X (array-like or sparse matrix): The transformed training features it was fitted on.
+            train_y (array-like): The training target.
+
+        Raises:
+            CustomException: If the state cannot be written.
+        """
+        try:
+            numeric, categorical = _preprocessor_columns(load_object(self.config.preprocessor_path))
+            statistics = FeatureStatistics(numeric, list(categorical))
+            for chunk in pd.read_csv(self.raw_data_path(self.config), chunksize=self.config.chunk_size):
+                statistics.update(chunk)
+
+            self._write_state({
+                "model_name": name,
+                "test_score": score,
+                "rows": statistics.rows,
+                "rows_since_full": 0,
+                "updates": 0,
+                "trained_at": time.time(),
+                "statistics": statistics.to_dict(),
+                "normal_equations": _normal_equations(train_X, train_y) if _is_linear(model) else None,
+            })
+            logging.info(f"Incremental training state reset on {statistics.rows} rows for {name}")
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    def _working_copy(self) -> str:
+        """
+        Returns `config.data_path`, copying the raw data there first if no update made it yet.
+        """
+        if not os.path.exists(self.config.data_path):
+            directory = os.path.dirname(os.path.abspath(self.config.data_path))
+            os.makedirs(directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            os.close(descriptor)
+            shutil.copyfile(self.config.ingestion.raw_data_path, temp_path)
+            os.replace(temp_path, self.config.data_path)
+            logging.info(f"Copied {self.config.ingestion.raw_data_path} to {self.config.data_path}")
+        return self.config.data_path
+
+    def _append_raw(self, new_df: pd.DataFrame, rows: int) -> np.ndarray:
+        """
+        Appends the new records to `config.data_path` and returns their test split mask: the split the next full
+        run's ingestion, with `config.ingestion`, gives the rows at those positions.
+        """
+        columns = list(pd.read_csv(self.config.data_path, nrows=0).columns)
+        new_df[columns].to_csv(self.config.data_path, mode="a", header=False, index=False)
+        return DataIngestion(self.config.ingestion).test_mask(rows + len(new_df))[rows:]
+
+    def _full_retrain_reason(self, state: dict, statistics: FeatureStatistics, preprocessor, model, new_df: pd.DataFrame):
+        numeric, categorical = _preprocessor_columns(preprocessor)
+        for column, vocabulary in categorical.items():
+            unseen = set(new_df[column].dropna().astype(str)) - vocabulary
+            if unseen:
+                return f"new categories {sorted(unseen)} in {column}"
+
+        if not (type(model).__module__.startswith(("xgboost", "catboost")) or _is_linear(model)):
+            return f"{type(model).__name__} cannot be updated incrementally"
+        if _is_linear(model) and state["normal_equations"] is None:
+            return "no normal equations recorded for the linear model"
+
+        if state["rows_since_full"] + len(new_df) > self.config.max_delta_fraction * state["rows"]:
+            return f"{state['rows_since_full'] + len(new_df)} rows added since the last full retrain"
+
+        if len(new_df) >= self.config.min_drift_rows:
+            for column in statistics.numeric + statistics.categorical:
+                psi = statistics.psi(column, new_df)
+                if psi > self.config.drift_threshold:
+                    return f"{column} drifted (PSI {psi:.3f})"
+
+            from sklearn.metrics import r2_score
+            features = new_df.drop(columns=[TARGET_COLUMN])
+            score = r2_score(new_df[TARGET_COLUMN], model.predict(as_model_input(model, preprocessor.transform(features))))
+            if state["test_score"] - score > self.config.max_score_drop:
+                return f"R2 on the new rows is {score:.4f}, trained model scored {state['test_score']:.4f}"
+
+        imputer, scaler = (preprocessor.named_transformers_["num"].named_steps[step] for step in ("imputer", "scaler"))
+        updated = FeatureStatistics.from_dict(state["statistics"])
+        updated.update(new_df)
+        for index, column in enumerate(numeric):
+            for label, fitted, exact in (
+                ("median", imputer.statistics_[index], updated.median(column)),
+                ("scale", scaler.scale_[index], updated.scale(column)),
+            ):
+                if abs(exact - fitted) > self.config.max_statistic_change * max(abs(fitted), 1e-12):
+                    return f"{label} of {column} moved from {fitted:.4g} to {exact:.4g}"
+        return None
+
+    def _fit(self, model, state: dict, X, y):
+        """
+        Returns the model updated with (X, y) and the updated normal equations of linear models.
+        """
+        module = type(model).__module__
+        if module.startswith("xgboost"):
+            updated = type(model)(**{**model.get_params(), "n_estimators": self.config.boost_rounds})
+            updated.fit(as_model_input(model, X), y, xgb_model=model.get_booster())
+            return updated, None
+        if module.startswith("catboost"):
+            updated = type(model)(**{**model.get_params(), "iterations": self.config.boost_rounds})
+            updated.fit(X, y, init_model=model)
+            return updated, None
+
+        added = _normal_equations(X, y)
+        equations = state["normal_equations"]
+        n = equations["n"] + added["n"]
+        sum_x = np.add(equations["sum_x"], added["sum_x"])
+        sum_y = equations["sum_y"] + added["sum_y"]
+        xtx = np.add(equations["xtx"], added["xtx"])
+        xty = np.add(equations["xty"], added["xty"])
+
+        # Least squares on centered data, as LinearRegression and Ridge fit the intercept.
+        mean_x, mean_y = sum_x / n, sum_y / n
+        gram = xtx - n * np.outer(mean_x, mean_x) + getattr(model, "alpha", 0.0) * np.eye(len(mean_x))
+        model.coef_ = np.linalg.pinv(gram, hermitian=True) @ (xty - n * mean_x * mean_y)
+        model.intercept_ = float(mean_y - mean_x @ model.coef_)
+        return model, {"n": n, "sum_x": sum_x.tolist(), "sum_y": sum_y, "xtx": xtx.tolist(), "xty": xty.tolist()}
+
+    def update(self, new_df: pd.DataFrame) -> dict:
+        """
+        Appends new records to the raw data and updates the model with them, unless a full retrain is needed.
+
+        Only the new records are read, transformed and fitted on. If the update fails, the records are removed from
+        `config.data_path` again. The ones falling into the test split (by their
+        position in the raw data, see DataIngestion.is_test_row) are held out and the updated model is scored on
+        them.
+
+        Args:
+            new_df (pd.DataFrame): The new records, with the raw data columns.
+
+        Returns:
+            dict: The report: `mode` ("incremental" or "full", meaning a full retrain is needed), `reason` of a full
+            retrain, `rows` added and, for incremental updates, `model_name`, `score` on the held out new rows
+            (None if there are too few) and `seconds`.
+
+        Raises:
+            CustomException: If the records cannot be appended or the model cannot be updated.
+        """
+        appended_at = None
+        try:
+            start_time = time.perf_counter()
+            state = self._read_state()
+            appended_at = os.path.getsize(self._working_copy())
+            if state is None:
+                rows = sum(len(chunk) for chunk in pd.read_csv(self.config.data_path, chunksize=self.config.chunk_size))
+                self._append_raw(new_df, rows)
+                return {"mode": "full", "reason": "no incremental state", "rows": len(new_df)}
+
+            preprocessor = load_object(self.config.preprocessor_path)
+            model = load_object(self.config.model_path)
+            statistics = FeatureStatistics.from_dict(state["statistics"])
+            reason = self._full_retrain_reason(state, statistics, preprocessor, model, new_df)
+            test_mask = self._append_raw(new_df, statistics.rows)
+            if reason is not None:
+                logging.info(f"Full retrain needed: {reason}")
+                return {"mode": "full", "reason": reason, "rows": len(new_df)}
+
+            train_df, test_df = new_df[~test_mask], new_df[test_mask]
+            X = preprocessor.transform(train_df.drop(columns=[TARGET_COLUMN]))
+            model, equations = self._fit(model, state, X, train_df[TARGET_COLUMN].to_numpy())
+
+            score = None
+            if len(test_df) > 1:
+                from sklearn.metrics import r2_score
+                test_X = as_model_input(model, preprocessor.transform(test_df.drop(columns=[TARGET_COLUMN])))
+                score = float(r2_score(test_df[TARGET_COLUMN], model.predict(test_X)))
+
+            save_object(self.config.model_path, model)
+            statistics.update(new_df)
+            state.update(
+                rows_since_full=state["rows_since_full"] + len(new_df),
+                updates=state["updates"] + 1,
+                statistics=statistics.to_dict(),
+                normal_equations=equations if equations is not None else state["normal_equations"],
+            )
+            self._write_state(state)
+
+            report = {
+                "mode": "incremental", "reason": None, "rows": len(new_df), "model_name": state["model_name"],
+                "score": score, "seconds": time.perf_counter() - start_time,
+            }
+            logging.info(f"Incremental update: {report}")
+            return report
+        except Exception as e:
+            if appended_at is not None:
+                os.truncate(self.config.data_path, appended_at)
+            raise CustomException(str(e), sys)
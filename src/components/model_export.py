@@ -0,0 +1,201 @@
+from dataclasses import dataclass
+
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from src.exception import CustomException
+from src.logger import logging
+from src.pipeline.lookup_table import META_FILE, TABLE_FILE, LookupTable
+from src.serialization import new_version_dir, swap_in
+from src.utils import as_model_input
+
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class ModelExportConfig:
+    table_path: str = os.path.join("artifacts", "lookup_table")
+    score_range: tuple = (0, 100)
+    dtype: str = "float64"
+    batch_rows: int = 250_000
+    n_verify: int = 10_000
+    random_state: int = 17
+
+
+def _table_axes(preprocessor: ColumnTransformer):
+    """
+    Returns the categorical columns with their fitted vocabularies and the numeric columns of the preprocessor.
+    """
+    categorical, numeric = [], []
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        steps = transformer.steps if isinstance(transformer, Pipeline) else [(name, transformer)]
+        encoders = [step for _, step in steps if isinstance(step, OneHotEncoder)]
+        if encoders:
+            categorical.extend(
+                (column, [str(category) for category in categories])
+                for column, categories in zip(columns, encoders[0].categories_)
+            )
+        else:
+            numeric.extend(columns)
+    return categorical, numeric
+
+
+class ModelExporter:
+    """
+    Compiles a trained model into a LookupTable.
+
+    The categorical inputs only take a few hundred combinations and the scores are integers in `score_range`,
+    so the model can be evaluated once on every possible input. The predictions are stored as a dense array
+    with one axis per input, which serving memory-maps and indexes instead of running the preprocessor and
+    the model. A verification pass then recomputes a random sample of the grid, plus any given records, with
+    the real model and reports the largest absolute difference from the table.
+
+    Args:
+        config (ModelExportConfig): Output path, grid and verification settings.
+
+    Attributes:
+        config (ModelExportConfig): Output path, grid and verification settings.
+
+    Methods:
+        export(model, preprocessor, verify_df, model_version): Writes the lookup table and returns the export report.
+        verify(table, model, preprocessor, verify_df): Returns the largest absolute error of the table.
+    """
+    def __init__(self, config: ModelExportConfig):
+        """
+        Initializes the ModelExporter with the provided configuration.
+
+        Args:
+            config (ModelExportConfig): Output path, grid and verification settings.
+        """
+        self.config = config
+
+    def _predict(self, model, preprocessor, features: pd.DataFrame) -> np.ndarray:
+        return np.ravel(model.predict(as_model_input(model, preprocessor.transform(features))))
+
+    def _grid_rows(self, categorical, numeric, shape, indices) -> pd.DataFrame:
+        """
+        Returns the grid rows at the given flat positions of a table of the given shape.
+        """
+        codes = np.unravel_index(indices, shape)
+        columns = {}
+        for (column, categories), code in zip(categorical, codes):
+            columns[column] = np.asarray(categories, dtype=object)[code]
+        for column, code in zip(numeric, codes[len(categorical):]):
+            columns[column] = (code + self.config.score_range[0]).astype(np.float64)
+        return pd.DataFrame(columns)
+
+    @property
+    def _n_scores(self) -> int:
+        return self.config.score_range[1] - self.config.score_range[0] + 1
+
+    def export(self, model, preprocessor: ColumnTransformer, verify_df: pd.DataFrame = None, model_version: str = None) -> dict:
+        """
+        Evaluates the model on the whole input grid and writes the lookup table.
+
+        The table and its metadata are written to a new directory and `table_path`, a symlink, is swapped to it
+        with src.serialization.swap_in, so a reader never maps a partial table and `table_path` never goes
+        missing.
+
+        Args:
+            model (estimator): The trained model.
+            preprocessor (ColumnTransformer): The fitted preprocessor the model was trained with.
+            verify_df (pd.DataFrame): Records to include in the verification pass, e.g. the test split.
+            model_version (str): Version of the saved model/preprocessor pair, see
+                src.pipeline.model_cache.artifact_version. Stored in the metadata so serving only uses the table
+                with the model it was exported from.
+
+        Returns:
+            dict: The export report: `path`, `shape`, `bytes`, `seconds`, `max_abs_error` and `n_verified`.
+
+        Raises:
+            CustomException: If the model cannot be exported.
+        """
+        try:
+            start_time = time.perf_counter()
+            categorical, numeric = _table_axes(preprocessor)
+            shape = tuple(len(categories) for _, categories in categorical) + (self._n_scores,) * len(numeric)
+            size = int(np.prod(shape))
+            logging.info(f"Exporting lookup table of shape {shape} ({size} predictions)")
+
+            staging = new_version_dir(self.config.table_path)
+
+            table = np.lib.format.open_memmap(
+                os.path.join(staging, TABLE_FILE), mode="w+", dtype=self.config.dtype, shape=shape
+            )
+            flat = table.reshape(-1)
+            for start in range(0, size, self.config.batch_rows):
+                stop = min(start + self.config.batch_rows, size)
+                rows = self._grid_rows(categorical, numeric, shape, np.arange(start, stop))
+                flat[start:stop] = self._predict(model, preprocessor, rows)
+            table.flush()
+            del table, flat
+
+            meta = {
+                "categorical": categorical,
+                "scores": list(numeric),
+                "score_range": list(self.config.score_range),
+                "dtype": self.config.dtype,
+                "model_class": f"{type(model).__module__}.{type(model).__qualname__}",
+                "model_version": model_version,
+                "created": time.time(),
+            }
+            with open(os.path.join(staging, META_FILE), "w") as f:
+                json.dump(meta, f, indent=2)
+
+            max_abs_error, n_verified = self.verify(LookupTable(staging), model, preprocessor, verify_df)
+            meta.update(max_abs_error=max_abs_error, n_verified=n_verified)
+            with open(os.path.join(staging, META_FILE), "w") as f:
+                json.dump(meta, f, indent=2)
+
+            swap_in(self.config.table_path, staging)
+
+            report = {
+                "path": self.config.table_path,
+                "shape": list(shape),
+                "bytes": size * np.dtype(self.config.dtype).itemsize,
+                "seconds": time.perf_counter() - start_time,
+                "max_abs_error": max_abs_error,
+                "n_verified": n_verified,
+            }
+            logging.info(f"Lookup table exported: {report}")
+            return report
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    def verify(self, table: LookupTable, model, preprocessor: ColumnTransformer, verify_df: pd.DataFrame = None):
+        """
+        Compares the table with the real model on a random sample of the grid and on the given records.
+
+        Records of `verify_df` that fall outside the table (non-integer scores, unknown categories) are skipped.
+
+        Args:
+            table (LookupTable): The exported table.
+            model (estimator): The trained model.
+            preprocessor (ColumnTransformer): The fitted preprocessor the model was trained with.
+            verify_df (pd.DataFrame): Additional records to compare on.
+
+        Returns:
+            tuple: The largest absolute error and the number of records compared.
+        """
+        categorical, numeric = _table_axes(preprocessor)
+        size = table.table.size
+        rng = np.random.RandomState(self.config.random_state)
+        sample = np.sort(rng.choice(size, min(self.config.n_verify, size), replace=False))
+        records = self._grid_rows(categorical, numeric, table.table.shape, sample)
+
+        if verify_df is not None:
+            extra = verify_df[list(records.columns)]
+            inside = np.array([table.index(record) is not None for record in extra.to_dict("records")], dtype=bool)
+            records = pd.concat([records, extra[inside]], ignore_index=True)
+
+        expected = self._predict(model, preprocessor, records)
+        actual = table.predict(records.to_dict("records"))
+        return float(np.max(np.abs(actual - expected))) if len(records) else 0.0, len(records)
@@ -1,23 +1,77 @@
-from dataclasses import dataclass
-
-from catboost import CatBoostRegressor
-from sklearn.ensemble import AdaBoostRegressor, RandomForestRegressor
-from sklearn.linear_model import LinearRegression, Lasso, Ridge
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.tree import DecisionTreeRegressor
-from xgboost import XGBRegressor
+from dataclasses import dataclass, field
 
+from src.components.cross_validation import CrossValidator, CrossValidationConfig
+from src.components.ensemble import EnsembleConfig, EnsembleRegressor, build_ensemble
+from src.components.model_tuner import ModelTuner, ModelTunerConfig
 from src.exception import CustomException
 from src.logger import logging
-from src.utils import save_object, evaluate_models
+from src.utils import save_object, evaluate_models, set_thread_budget
 
+import importlib
 import os
 import sys
 
 
 @dataclass
 class ModelTrainerConfig:
-    model_path = os.path.join("artifacts", "model.pkl")
+    model_path = os.path.join("artifacts", "model")
+    n_jobs: int = -1
+    score_train: bool = False
+    tune: bool = False
+    tuner: ModelTunerConfig = field(default_factory=ModelTunerConfig)
+    models: list = None
+    cross_validate: bool = False
+    cv: CrossValidationConfig = field(default_factory=CrossValidationConfig)
+    ensemble: bool = False
+    ensembling: EnsembleConfig = field(default_factory=EnsembleConfig)
+
+
+# The candidate models by name: the class to import and the parameters it is created with. The libraries are only
+# imported when a model is created, so a process that trains three linear models never loads XGBoost or CatBoost.
+MODELS = {
+    "Linear Regression": ("sklearn.linear_model.LinearRegression", {}),
+    "Lasso": ("sklearn.linear_model.Lasso", {}),
+    "Ridge": ("sklearn.linear_model.Ridge", {}),
+    "K-Neighbors Regressor": ("sklearn.neighbors.KNeighborsRegressor", {}),
+    "Decision Tree": ("sklearn.tree.DecisionTreeRegressor", {}),
+    "Random Forest Regressor": ("sklearn.ensemble.RandomForestRegressor", {}),
+    "XGBRegressor": ("xgboost.XGBRegressor", {}),
+    "CatBoosting Regressor": ("catboost.CatBoostRegressor", {"verbose": False}),
+    "AdaBoost Regressor": ("sklearn.ensemble.AdaBoostRegressor", {})
+}
+
+
+def create_model(name: str):
+    """
+    Returns a fresh, unfitted instance of the named model, importing its library on first use.
+
+    Args:
+        name (str): A key of MODELS.
+
+    Returns:
+        estimator: The unfitted model.
+
+    Raises:
+        KeyError: If no model has that name.
+    """
+    if name not in MODELS:
+        raise KeyError(f"Unknown model {name!r}, expected one of {list(MODELS)}")
+    path, params = MODELS[name]
+    module_name, class_name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)(**params)
+
+
+def get_models(names=None) -> dict:
+    """
+    Returns the untrained candidate models, keyed by name.
+
+    Args:
+        names (iterable): Names of the models to create. Defaults to every model of MODELS.
+
+    Returns:
+        dict: Model name to a fresh, unfitted estimator.
+    """
+    return {name: create_model(name) for name in (names if names is not None else MODELS)}
 
 
 class ModelTrainer:
@@ -29,9 +83,11 @@ class ModelTrainer:
 
     Attributes:
         config (ModelTrainerConfig): An instance of ModelTrainerConfig class that holds the path to save the trained model.
+        trials (list): The hyperparameter search trials of the last training run, empty unless `config.tune` is set.
+        cv_report (dict): The cross-validation scores of the last training run, empty unless `config.cross_validate` or `config.ensemble` is set.
 
     Methods:
-        model_training(self, train, test): This method is responsible for training and evaluating all the models and saving the best performing model.
+        model_training(self, train_X, train_y, test_X, test_y): This method is responsible for training and evaluating all the models and saving the best performing model.
     """
     def __init__(self, config: ModelTrainerConfig):
         """
@@ -44,14 +100,18 @@ class ModelTrainer:
             config (ModelTrainerConfig): An instance of ModelTrainerConfig class that holds the path to save the trained model.
         """
         self.config = config
+        self.trials = []
+        self.cv_report = {}
     
-    def model_training(self, train, test):
+    def model_training(self, train_X, train_y, test_X, test_y):
         """
         This method is responsible for training and evaluating all the models and saving the best performing model.
 
         Args:
-            train (array-like): The training data.
-            test (array-like): The test data.
+            train_X (array-like or sparse matrix): The training features.
+            train_y (array-like): The training target.
+            test_X (array-like or sparse matrix): The test features.
+            test_y (array-like): The test target.
 
         Returns:
             None
@@ -59,25 +119,32 @@ class ModelTrainer:
         Raises:
             CustomException: If no model is upto the mark.
 
-        The method first acquires the training and test data, then trains and evaluates all the models. It then saves the best performing model to the specified path. If no model is upto the mark, it raises a CustomException.
+        The method first acquires the training and test data, then trains and evaluates all the models. With `config.tune` set, the hyperparameters of every model are first searched with successive halving on a validation split of the training data. With `config.cross_validate` set, the model is selected by its mean K-fold cross-validation score on the training data (see CrossValidator) instead of its score on the single test split, and only the selected model is fitted on the whole training data and scored on the test data. With `config.ensemble` set, the `config.ensembling.size` best models by cross-validation are combined with weights fitted on their out-of-fold predictions (see EnsembleRegressor); they are fitted on the whole training data and the ensemble is scored on the test data and saved as the model. It then saves the best performing model to the specified path. If no model is upto the mark, it raises a CustomException.
         """
         try:
-            logging.info("Train and Test aquiring")
-            train_X, train_y, test_X, test_y = train[:, :-1], train[:, -1], test[:, :-1], test[:, -1]
-
-            models = {
-                "Linear Regression": LinearRegression(),
-                "Lasso": Lasso(),
-                "Ridge": Ridge(),
-                "K-Neighbors Regressor": KNeighborsRegressor(),
-                "Decision Tree": DecisionTreeRegressor(),
-                "Random Forest Regressor": RandomForestRegressor(),
-                "XGBRegressor": XGBRegressor(), 
-                "CatBoosting Regressor": CatBoostRegressor(verbose=False),
-                "AdaBoost Regressor": AdaBoostRegressor()
-            }
-
-            reports: dict = evaluate_models(train_X, train_y, test_X, test_y, models)
+            models = get_models(self.config.models)
+
+            if self.config.tune:
+                tuner = ModelTuner(self.config.tuner)
+                for name, model in models.items():
+                    models[name] = model.set_params(**tuner.tune(name, model, train_X, train_y))
+                self.trials = tuner.report()
+                logging.info(f"Hyperparameter search done in {len(self.trials)} trials")
+
+            if self.config.ensemble:
+                self.cv_report = CrossValidator(self.config.cv).evaluate(train_X, train_y, models, out_of_fold=True)
+                return self._train_ensemble(models, train_X, train_y, test_X, test_y)
+
+            if self.config.cross_validate:
+                self.cv_report = CrossValidator(self.config.cv).evaluate(train_X, train_y, models)
+                selected = max(self.cv_report, key=lambda name: self.cv_report[name]["mean"])
+                logging.info(f"Selected {selected} by {self.config.cv.n_splits}-fold CV R2 {self.cv_report[selected]['mean']:.4f}")
+                models = {selected: models[selected]}
+
+            reports: dict = evaluate_models(
+                train_X, train_y, test_X, test_y, models,
+                n_jobs=self.config.n_jobs, score_train=self.config.score_train
+            )
             logging.info("Model Training Completed")
 
             best_model_score = max(sorted(reports.values()))
@@ -92,3 +159,30 @@ class ModelTrainer:
             return best_model, best_model_name, best_model_score
         except Exception as e:
             raise CustomException(str(e), sys)
+
+    def _train_ensemble(self, models: dict, train_X, train_y, test_X, test_y):
+        """
+        Fits the selected members on the whole training data and returns the saved ensemble, its name and test R2.
+        """
+        from sklearn.metrics import r2_score
+
+        config = self.config.ensembling
+        names, weights, intercept, _ = build_ensemble(config, self.cv_report, train_y)
+        members = {name: models[name] for name in names}
+        evaluate_models(train_X, train_y, test_X, test_y, members, n_jobs=self.config.n_jobs, score_train=self.config.score_train)
+
+        ensemble = EnsembleRegressor(
+            names, [members[name] for name in names], weights, intercept,
+            n_jobs=config.n_jobs, parallel_min_rows=config.parallel_min_rows
+        )
+        # Serving threads: the members predict side by side, each on one thread.
+        for member in ensemble.members_:
+            set_thread_budget(member, 1)
+        name = f"Ensemble ({', '.join(ensemble.names_)})"
+        score = r2_score(test_y, ensemble.predict(test_X))
+        logging.info(f"{name}: test R2 {score:.4f}")
+        if score < 0.6:
+            raise CustomException("No model is upto the mark", sys)
+
+        save_object(self.config.model_path, ensemble)
+        return ensemble, name, score
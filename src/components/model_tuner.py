@@ -0,0 +1,248 @@
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.logger import logging
+from src.utils import as_model_input, set_thread_budget
+
+import itertools
+import math
+import os
+import random
+import sys
+import time
+import numpy as np
+
+# joblib and sklearn are imported by the functions running the search, so that importing ModelTunerConfig (which
+# model_trainer does for its own config) stays cheap when no search is run.
+
+
+SEARCH_SPACES = {
+    "Linear Regression": {},
+    "Lasso": {"alpha": [0.001, 0.01, 0.03, 0.1, 0.3, 1.0, 3.0]},
+    "Ridge": {"alpha": [0.01, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0]},
+    "K-Neighbors Regressor": {
+        "n_neighbors": [3, 5, 7, 9, 15, 25],
+        "weights": ["uniform", "distance"]
+    },
+    "Decision Tree": {
+        "max_depth": [3, 4, 5, 6, 8, 10, None],
+        "min_samples_leaf": [1, 2, 5, 10, 20]
+    },
+    "Random Forest Regressor": {
+        "n_estimators": [50, 100, 200],
+        "max_depth": [None, 5, 8, 12],
+        "min_samples_leaf": [1, 2, 5],
+        "max_features": [1.0, 0.5, "sqrt"]
+    },
+    "XGBRegressor": {
+        "n_estimators": [1000],
+        "learning_rate": [0.01, 0.03, 0.1, 0.3],
+        "max_depth": [2, 3, 4, 6],
+        "subsample": [0.6, 0.8, 1.0],
+        "colsample_bytree": [0.6, 0.8, 1.0]
+    },
+    "CatBoosting Regressor": {
+        "iterations": [1000],
+        "learning_rate": [0.01, 0.03, 0.1, 0.3],
+        "depth": [4, 6, 8],
+        "l2_leaf_reg": [1, 3, 5, 9]
+    },
+    "AdaBoost Regressor": {
+        "n_estimators": [50, 100, 200],
+        "learning_rate": [0.01, 0.1, 0.5, 1.0],
+        "loss": ["linear", "square", "exponential"]
+    }
+}
+
+
+@dataclass
+class ModelTunerConfig:
+    n_candidates: int = 16
+    eta: int = 3
+    min_resource: int = 100
+    validation_size: float = 0.2
+    early_stopping_rounds: int = 50
+    n_jobs: int = -1
+    random_state: int = 17
+
+
+@dataclass
+class Trial:
+    """
+    One fit of one candidate during the search.
+
+    Attributes:
+        model_name (str): Name of the model being tuned.
+        params (dict): Hyperparameters of the candidate.
+        rung (int): Successive halving round, 0 being the one with the smallest budget.
+        resource (int): Number of training rows the candidate was fitted on.
+        score (float): R2 score on the validation split.
+        fit_time (float): Seconds spent fitting and scoring.
+        best_iteration (int): Boosting round picked by early stopping, None for other models.
+    """
+    model_name: str
+    params: dict
+    rung: int
+    resource: int
+    score: float
+    fit_time: float
+    best_iteration: int = None
+
+
+def _early_stopping_kind(model):
+    module = type(model).__module__
+    if module.startswith("xgboost"):
+        return "xgboost"
+    if module.startswith("catboost"):
+        return "catboost"
+    return None
+
+
+def _fit_candidate(model, params, fit_X, fit_y, val_X, val_y, early_stopping_rounds):
+    from sklearn.base import clone
+    from sklearn.metrics import r2_score
+
+    start = time.perf_counter()
+    candidate = clone(model).set_params(**params)
+    kind = _early_stopping_kind(candidate)
+    best_iteration = None
+    fit_X, val_X = as_model_input(candidate, fit_X), as_model_input(candidate, val_X)
+
+    if kind == "xgboost":
+        candidate.set_params(early_stopping_rounds=early_stopping_rounds)
+        candidate.fit(fit_X, fit_y, eval_set=[(val_X, val_y)], verbose=False)
+        best_iteration = int(candidate.best_iteration)
+    elif kind == "catboost":
+        candidate.fit(fit_X, fit_y, eval_set=(val_X, val_y), early_stopping_rounds=early_stopping_rounds)
+        best_iteration = int(candidate.get_best_iteration())
+    else:
+        candidate.fit(fit_X, fit_y)
+
+    score = r2_score(val_y, candidate.predict(val_X))
+    return score, time.perf_counter() - start, best_iteration
+
+
+class ModelTuner:
+    """
+    Hyperparameter search with successive halving.
+
+    For each model, up to `n_candidates` configurations are drawn from its search space and all of them are fitted
+    on a small subset (`min_resource` rows) of the training data. Only the best `1 / eta` of them move on to the next
+    round, which gets `eta` times more rows, until the survivors are fitted on the whole fitting split. Clearly
+    losing candidates are therefore dropped after a cheap fit, and the total cost grows with the number of rounds
+    rather than the size of the grid. XGBoost and CatBoost candidates additionally stop boosting once the score on
+    the validation split stops improving, and the number of rounds they reached is kept in the tuned parameters.
+
+    Args:
+        config (ModelTunerConfig): Search budget and validation settings.
+
+    Attributes:
+        config (ModelTunerConfig): Search budget and validation settings.
+        trials (list): Every Trial run so far.
+
+    Methods:
+        tune(name, model, train_X, train_y): Returns the best hyperparameters found for the model.
+        report(): Returns the trials as a list of dicts.
+    """
+    def __init__(self, config: ModelTunerConfig):
+        """
+        Initializes the ModelTuner class with the provided ModelTunerConfig instance.
+
+        Args:
+            config (ModelTunerConfig): Search budget and validation settings.
+        """
+        self.config = config
+        self.trials = []
+
+    def _candidates(self, space: dict, rng: random.Random) -> list:
+        names = list(space)
+        grid = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+        if len(grid) <= self.config.n_candidates:
+            return grid
+        return rng.sample(grid, self.config.n_candidates)
+
+    def _rungs(self, n_rows: int) -> list:
+        resources = []
+        resource = min(self.config.min_resource, n_rows)
+        while resource < n_rows:
+            resources.append(resource)
+            resource *= self.config.eta
+        resources.append(n_rows)
+        return resources
+
+    def tune(self, name: str, model, train_X, train_y) -> dict:
+        """
+        Returns the best hyperparameters found for the model.
+
+        Args:
+            name (str): Name of the model, used to look up its search space in SEARCH_SPACES.
+            model (estimator): The untuned model, used as the template for the candidates.
+            train_X (array-like): The training data. A `validation_size` fraction is held out to score candidates.
+            train_y (array-like): The target of the training data.
+
+        Returns:
+            dict: The hyperparameters of the best candidate, with the boosting rounds found by early stopping.
+
+        Raises:
+            CustomException: If an exception occurs during the search.
+        """
+        try:
+            from joblib import Parallel, delayed, effective_n_jobs
+            from sklearn.base import clone
+            from sklearn.model_selection import train_test_split
+
+            rng = random.Random(self.config.random_state)
+            candidates = self._candidates(SEARCH_SPACES.get(name, {}), rng)
+            if len(candidates) == 1 and _early_stopping_kind(model) is None:
+                logging.info(f"{name}: nothing to tune")
+                return candidates[0]
+
+            fit_X, val_X, fit_y, val_y = train_test_split(
+                train_X, train_y, test_size=self.config.validation_size, random_state=self.config.random_state
+            )
+            order = np.random.RandomState(self.config.random_state).permutation(fit_X.shape[0])
+            workers = max(1, min(effective_n_jobs(self.config.n_jobs), len(candidates)))
+            template = set_thread_budget(clone(model), max(1, (os.cpu_count() or 1) // workers))
+
+            scored = []
+            for rung, resource in enumerate(self._rungs(fit_X.shape[0])):
+                subset = order[:resource]
+                results = Parallel(n_jobs=workers)(
+                    delayed(_fit_candidate)(
+                        template, params, fit_X[subset], np.asarray(fit_y)[subset], val_X, val_y,
+                        self.config.early_stopping_rounds
+                    )
+                    for params in candidates
+                )
+
+                scored = []
+                for params, (score, fit_time, best_iteration) in zip(candidates, results):
+                    trial = Trial(name, params, rung, resource, score, fit_time, best_iteration)
+                    self.trials.append(trial)
+                    scored.append((score, trial))
+                    logging.info(
+                        f"{name} rung {rung} ({resource} rows): R2 {score:.4f} in {fit_time:.2f}s with {params}"
+                    )
+
+                scored.sort(key=lambda item: item[0], reverse=True)
+                keep = max(1, math.ceil(len(scored) / self.config.eta))
+                candidates = [trial.params for _, trial in scored[:keep]]
+
+            best = scored[0][1]
+            params = dict(best.params)
+            if best.best_iteration is not None:
+                key = "iterations" if _early_stopping_kind(model) == "catboost" else "n_estimators"
+                params[key] = best.best_iteration + 1
+            logging.info(f"{name}: best validation R2 {best.score:.4f} with {params}")
+            return params
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    def report(self) -> list:
+        """
+        Returns the trials as a list of dicts, in the order they were run.
+
+        Returns:
+            list: One dict per Trial.
+        """
+        return [trial.__dict__.copy() for trial in self.trials]
@@ -0,0 +1,347 @@
+from contextlib import contextmanager
+from functools import wraps
+
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+
+NAMESPACE = "mlproject"
+# Span duration buckets in seconds, from 50us (a cached prediction) to 5 minutes (a training stage).
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0, 30.0, 60.0, 300.0
+)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram of observed values, in the Prometheus layout.
+
+    Attributes:
+        buckets (tuple): Upper bounds of the buckets.
+        counts (list): Observations per bucket (not cumulative), the last one for values above every bound.
+        sum (float): Sum of the observations.
+        count (int): Number of observations.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the `q` quantile, inf if it is above every bucket.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return bound
+        return 0.0
+
+
+class Registry:
+    """
+    Thread-safe store of counters and histograms, identified by a name and a set of labels.
+
+    Methods:
+        increment(name, value, **labels): Adds to a counter.
+        observe(name, value, **labels): Records a value in a histogram.
+        snapshot(): Returns a copy of every metric.
+        reset(): Drops every metric.
+    """
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name: str, value: float = 1, /, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, /, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self) -> tuple:
+        """
+        Returns a consistent copy of the metrics.
+
+        Returns:
+            tuple: ({(name, labels): value} counters, {(name, labels): (buckets, counts, sum, count)} histograms).
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                for key, histogram in self._histograms.items()
+            }
+        return counters, histograms
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+
+
+# Labels that span() sets itself, or that the Prometheus export adds to histogram buckets.
+RESERVED_LABELS = ("span", "le")
+
+
+def _check_labels(labels: dict):
+    reserved = sorted(set(labels) & set(RESERVED_LABELS))
+    if reserved:
+        raise ValueError(f"Span labels {reserved} are reserved, use other names than {list(RESERVED_LABELS)}")
+
+
+@contextmanager
+def span(name: str, /, **labels):
+    """
+    Times the enclosed block into the `span_seconds` histogram, labelled with the span name.
+
+    Exceptions propagate unchanged and are also counted in `span_errors_total`.
+
+    Args:
+        name (str): Name of the span, dotted by area, e.g. "predict.transform" or "train.ingestion".
+        **labels: Additional labels of the measurement, not named like one of RESERVED_LABELS.
+
+    Raises:
+        ValueError: If a label is named like one of RESERVED_LABELS.
+
+    Example:
+        with span("predict.render"):
+            html = render_template("home.html", results=prediction)
+    """
+    _check_labels(labels)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        registry.increment("span_errors_total", span=name, **labels)
+        raise
+    finally:
+        registry.observe("span_seconds", time.perf_counter() - start, span=name, **labels)
+
+
+def timed(name: str = None, /, **labels):
+    """
+    Decorator timing every call of the function as a span, named after the function by default.
+
+    Args:
+        name (str): Name of the span. Defaults to `module.qualname` of the function.
+        **labels: Additional labels of the measurement, not named like one of RESERVED_LABELS.
+
+    Raises:
+        ValueError: If a label is named like one of RESERVED_LABELS.
+    """
+    _check_labels(labels)
+
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _label_text(labels: tuple, extra: tuple = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def to_prometheus(metrics: Registry = None) -> str:
+    """
+    Renders the metrics in the Prometheus text exposition format.
+
+    Args:
+        metrics (Registry): The registry to render. Defaults to the process-wide one.
+
+    Returns:
+        str: The metrics, ready to be served with content type `text/plain; version=0.0.4`.
+    """
+    counters, histograms = (metrics or registry).snapshot()
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {NAMESPACE}_{name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{NAMESPACE}_{name}{_label_text(labels)} {value}")
+
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {NAMESPACE}_{name} histogram")
+        for (metric, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{NAMESPACE}_{name}_bucket{_label_text(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{NAMESPACE}_{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{NAMESPACE}_{name}_count{_label_text(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _finite(value: float):
+    return None if value == float("inf") else value
+
+
+def to_json(metrics: Registry = None) -> str:
+    """
+    Renders the metrics as JSON, with the mean and approximate p50/p99 of every histogram.
+
+    Args:
+        metrics (Registry): The registry to render. Defaults to the process-wide one.
+
+    Returns:
+        str: A JSON object with a `counters` and a `histograms` list.
+    """
+    counters, histograms = (metrics or registry).snapshot()
+    report = {"counters": [], "histograms": []}
+    for (name, labels), value in sorted(counters.items()):
+        report["counters"].append({"name": name, "labels": dict(labels), "value": value})
+    for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+        histogram = Histogram(buckets)
+        histogram.counts, histogram.sum, histogram.count = counts, total, count
+        report["histograms"].append({
+            "name": name,
+            "labels": dict(labels),
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            # None when the quantile lies above the last bucket.
+            "p50": _finite(histogram.quantile(0.5)),
+            "p99": _finite(histogram.quantile(0.99)),
+            "buckets": dict(zip([str(bound) for bound in buckets] + ["+Inf"], counts)),
+        })
+    return json.dumps(report, indent=2)
+
+
+EXPORTERS = {"prometheus": to_prometheus, "json": to_json}
+
+
+def register_exporter(name: str, exporter):
+    """
+    Makes an exporter available to `export`.
+
+    Args:
+        name (str): Name of the exporter.
+        exporter (callable): Function taking a Registry (or None for the process-wide one) and returning the
+            rendered metrics.
+    """
+    EXPORTERS[name] = exporter
+
+
+def export(name: str = "prometheus", path: str = None) -> str:
+    """
+    Renders the process-wide metrics with the named exporter, optionally writing them to a file.
+
+    Args:
+        name (str): Name of the exporter, see EXPORTERS.
+        path (str): File to write the rendered metrics to.
+
+    Returns:
+        str: The rendered metrics.
+    """
+    rendered = EXPORTERS[name](registry)
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(rendered)
+    return rendered
+
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join("artifacts", "profiles"))
+PROFILER = os.environ.get("PROFILER", "cprofile")
+# Only one profiler can be active per process; a sampled call arriving while another is profiled is skipped.
+_profile_lock = threading.Lock()
+_profile_ids = itertools.count()
+
+
+def _pyinstrument():
+    try:
+        import pyinstrument
+        return pyinstrument
+    except ImportError:
+        raise ImportError("pyinstrument is required for PROFILER=pyinstrument, install it with `pip install pyinstrument`")
+
+
+@contextmanager
+def profile(name: str, sample_rate: float = None):
+    """
+    Profiles the enclosed block for a random `sample_rate` fraction of the calls, with cProfile or pyinstrument
+    (the PROFILER environment variable), and writes the profile to PROFILE_DIR. Unsampled calls cost one
+    random number. Only one call is profiled at a time per process.
+
+    Profiles are named `<name>-<timestamp>-<pid>-<sequence>.pstats` for cProfile (open them with `python -m pstats`
+    or snakeviz) and `.html` for pyinstrument.
+
+    Args:
+        name (str): Name of the profiled operation, used in the file name.
+        sample_rate (float): Fraction of the calls to profile. Defaults to PROFILE_SAMPLE_RATE, 0 unless set.
+    """
+    rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or random.random() >= rate or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stem = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_ids)}")
+        registry.increment("profiles_total", name=name)
+        if PROFILER == "pyinstrument":
+            profiler = _pyinstrument().Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(stem + ".html", "w") as f:
+                    f.write(profiler.output_html())
+            return
+
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(stem + ".pstats")
+    finally:
+        _profile_lock.release()
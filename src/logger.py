@@ -1,16 +1,187 @@
-from datetime import datetime
+"""
+Logging setup of the project.
 
-import logging
+Modules log through `from src.logger import logging` and call `logging.info(...)` etc. as before. `logging` here
+is a thin proxy of the standard module which configures logging on first use, so importing `src` never touches
+the filesystem and processes that never log create no file.
+
+The configuration is read from the environment:
+
+- LOG_DIR (default "logs") and LOG_FILE (default "mlproject.log", "{pid}" is replaced by the process id, use it
+  when several processes would otherwise rotate the same file)
+- LOG_LEVEL (default INFO) and LOG_FORMAT: "json" (default, one object per line) or "text"
+- LOG_ROTATE: "size" (default, LOG_MAX_BYTES per file) or "time" (LOG_ROTATE_WHEN, default midnight), keeping
+  LOG_BACKUPS rotated files
+- LOG_SAMPLE: per-level fractions of records to keep, e.g. "DEBUG=0.01,INFO=0.1", for hot paths that log per
+  request. Unlisted levels keep every record.
+
+Log calls only format the record and put it on an in-memory queue (QueueHandler); a background thread
+(QueueListener) does the formatting to JSON and the disk writes, and is flushed at exit. Sampled-out records are
+dropped before they are queued.
+"""
+from dataclasses import dataclass, field
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+import atexit
+import json
+import logging as _logging
 import os
+import queue
+import random
+import threading
+import time
+
+
+@dataclass
+class LoggingConfig:
+    log_dir: str = field(default_factory=lambda: os.environ.get("LOG_DIR", "logs"))
+    log_file: str = field(default_factory=lambda: os.environ.get("LOG_FILE", "mlproject.log"))
+    level: str = field(default_factory=lambda: os.environ.get("LOG_LEVEL", "INFO"))
+    json_format: bool = field(default_factory=lambda: os.environ.get("LOG_FORMAT", "json") == "json")
+    rotate: str = field(default_factory=lambda: os.environ.get("LOG_ROTATE", "size"))
+    max_bytes: int = field(default_factory=lambda: int(os.environ.get("LOG_MAX_BYTES", 10 << 20)))
+    rotate_when: str = field(default_factory=lambda: os.environ.get("LOG_ROTATE_WHEN", "midnight"))
+    backups: int = field(default_factory=lambda: int(os.environ.get("LOG_BACKUPS", 5)))
+    sample: dict = field(default_factory=lambda: parse_sample_rates(os.environ.get("LOG_SAMPLE", "")))
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """
+    Parses a "LEVEL=rate,LEVEL=rate" string into a level number to keep-fraction dict.
+
+    Args:
+        spec (str): The specification, e.g. "DEBUG=0.01,INFO=0.1".
+
+    Returns:
+        dict: Level number to fraction of records to keep.
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        level, rate = item.split("=")
+        rates[_logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and goes into the JSON record.
+_RECORD_ATTRIBUTES = set(vars(_logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(_logging.Formatter):
+    """
+    Formats records as one JSON object per line, with the fields passed through `extra=` included.
+    """
+    def format(self, record: _logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(_logging.Filter):
+    """
+    Keeps a random fraction of the records of each level, all records of the levels without a rate.
+    """
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: _logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        return rate is None or random.random() < rate
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The stock QueueHandler formats the message here, on the logging thread. Only merge the arguments into
+        # the message (they may be mutable) and leave the formatting to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = None
+        if record.exc_info:
+            record.exc_text = _logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(config: LoggingConfig = None):
+    """
+    Configures the root logger to log through a queue to a rotating file. Does nothing after the first call.
+
+    Args:
+        config (LoggingConfig): The configuration. Defaults to the one read from the environment.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    with _setup_lock:
+        if _listener is not None:
+            return
+        config = config or LoggingConfig()
+        os.makedirs(config.log_dir, exist_ok=True)
+        path = os.path.join(config.log_dir, config.log_file.format(pid=os.getpid()))
+        if config.rotate == "time":
+            file_handler = TimedRotatingFileHandler(path, when=config.rotate_when, backupCount=config.backups)
+        else:
+            file_handler = RotatingFileHandler(path, maxBytes=config.max_bytes, backupCount=config.backups)
+        file_handler.setFormatter(
+            JsonFormatter() if config.json_format
+            else _logging.Formatter("[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s")
+        )
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _QueueHandler(log_queue)
+        if config.sample:
+            queue_handler.addFilter(SamplingFilter(config.sample))
+
+        root = _logging.getLogger()
+        root.setLevel(config.level)
+        root.addHandler(queue_handler)
+
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        _listener, _queue_handler = listener, queue_handler
+
+
+def _reset_after_fork():
+    # A forked child (e.g. a preloaded gunicorn worker) inherits the queue but not the listener thread, so records
+    # would pile up unwritten. Drop the inherited setup; the child sets up its own on its next log call.
+    global _listener, _queue_handler, _setup_lock
+    if _queue_handler is not None:
+        _logging.getLogger().removeHandler(_queue_handler)
+    _listener = _queue_handler = None
+    _setup_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 
-LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
-LOGS_PATH = os.path.join(os.getcwd(), "logs", LOG_FILE)
-os.makedirs(LOGS_PATH, exist_ok=True)
+class _LazyLogging:
+    """
+    Stand-in for the standard logging module that calls `setup_logging` before the first attribute access.
+    """
+    def __getattr__(self, name):
+        setup_logging()
+        return getattr(_logging, name)
 
-LOG_FILE_PATH = os.path.join(LOGS_PATH, LOG_FILE)
 
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    level=logging.INFO,
-    format="[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s"
-)
+logging = _LazyLogging()
@@ -0,0 +1,287 @@
+"""
+Offline scoring of a table of students.
+
+Usage:
+    python -m src.pipeline.batch_predict INPUT OUTPUT [--chunk-size 100000] [--workers N] [--restart]
+
+INPUT and OUTPUT are CSV, parquet or feather files (by extension). The output holds the input columns plus a
+`prediction` column, in input order.
+
+The input is streamed in chunks of --chunk-size rows and every chunk is transformed and predicted in a pool of
+--workers processes, each loading the model once. At most two chunks per worker are read ahead, so memory is
+bounded by the chunk size whatever the input size. Each worker writes its chunk's results to
+`<OUTPUT>.parts/part-<chunk>` as soon as they are ready. Once every chunk is done the parts are concatenated
+into OUTPUT in order and removed.
+
+The parts directory is the checkpoint: rerunning an interrupted job skips the chunks whose part exists (the
+leading run of them without even parsing the rows), provided the input file, the chunk size and the model are
+unchanged. --restart discards the parts instead. The manifest in the parts directory records the rows and failed
+rows of every part, so the report of a resumed run still covers the whole input.
+"""
+from src.exception import CustomException
+from src.logger import logging
+from src.pipeline.model_cache import ModelCache, ModelCacheConfig
+from src.pipeline.prediction_cache import PredictionCache, PredictionCacheConfig
+from src.pipeline.predict import FEATURE_COLUMNS, PredictPipeline
+from src.storage import FORMATS, TableWriter, read_table, read_table_chunks, table_format
+from src.utils import set_thread_budget
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+
+
+@dataclass
+class BatchPredictConfig:
+    chunk_size: int = 100_000
+    workers: int = os.cpu_count() or 1
+    model_path: str = os.path.join("artifacts", "model")
+    preprocessor_path: str = os.path.join("artifacts", "preprocessor")
+    prediction_column: str = "prediction"
+
+
+_pipeline = None
+
+
+def _init_worker(config: BatchPredictConfig):
+    global _pipeline
+    # One model version per run: never reload mid-run, and one thread per process as the pool uses every core.
+    cache = ModelCache(ModelCacheConfig(
+        model_path=config.model_path, preprocessor_path=config.preprocessor_path, check_interval=float("inf"),
+        compile_preprocessor=False
+    ))
+    set_thread_budget(cache.get().model, 1)
+    _pipeline = PredictPipeline(cache=cache, prediction_cache=PredictionCache(PredictionCacheConfig(enabled=False)))
+
+
+def _predict_rows(features) -> np.ndarray:
+    """
+    Predicts the rows, giving NaN to the ones that cannot be predicted (e.g. a category the preprocessor has not
+    seen). A failing block is split in halves until the bad rows are isolated, so a few bad rows cost a few
+    dozen extra calls rather than one per row.
+    """
+    try:
+        return np.asarray(_pipeline.predict(features), dtype=np.float64)
+    except CustomException:
+        if len(features) == 1:
+            return np.array([np.nan])
+        middle = len(features) // 2
+        return np.concatenate([_predict_rows(features.iloc[:middle]), _predict_rows(features.iloc[middle:])])
+
+
+def _score_chunk(index: int, chunk, part_path: str, prediction_column: str) -> tuple:
+    """
+    Predicts one chunk and writes it with its predictions to `part_path`. Runs in a pool worker.
+    """
+    version = _pipeline.cache.get().version
+    predictions = _predict_rows(chunk[FEATURE_COLUMNS])
+    failed = int(np.isnan(predictions).sum())
+
+    chunk = chunk.assign(**{prediction_column: predictions})
+    staging = f"{part_path}.tmp-{os.getpid()}"
+    with TableWriter(staging, table_format(part_path)) as writer:
+        writer.write(chunk)
+    os.replace(staging, part_path)
+    return index, len(chunk), failed, version
+
+
+def _assemble(part_paths: list, output_path: str):
+    """
+    Concatenates the part files, in order, into the output file.
+    """
+    fmt = table_format(output_path)
+    staging = output_path + ".tmp"
+    if fmt == "csv":
+        with open(staging, "wb") as out:
+            for position, path in enumerate(part_paths):
+                with open(path, "rb") as part:
+                    if position:
+                        part.readline()
+                    shutil.copyfileobj(part, out)
+    else:
+        import pyarrow.feather
+        import pyarrow.parquet
+
+        read = pyarrow.parquet.read_table if fmt == "parquet" else pyarrow.feather.read_table
+        # TableWriter reconciles parts where a column is entirely null, or an integer column has missing values.
+        with TableWriter(staging, fmt) as writer:
+            for path in part_paths:
+                writer.write(read(path).to_pandas())
+    os.replace(staging, output_path)
+
+
+class BatchPredictor:
+    """
+    Scores a table file in parallel chunks, resuming an interrupted run from its checkpoint.
+
+    Args:
+        config (BatchPredictConfig): Chunking, parallelism and artifact paths.
+
+    Attributes:
+        config (BatchPredictConfig): Chunking, parallelism and artifact paths.
+
+    Methods:
+        run(input_path, output_path, restart): Scores the input file into the output file.
+    """
+    def __init__(self, config: BatchPredictConfig):
+        """
+        Initializes the BatchPredictor with the provided configuration.
+
+        Args:
+            config (BatchPredictConfig): Chunking, parallelism and artifact paths.
+        """
+        self.config = config
+
+    def _checkpoint(self, input_path: str, parts_dir: str, restart: bool) -> dict:
+        """
+        Returns the checkpoint manifest of the run, discarding the parts of a run over different input.
+        """
+        stat = os.stat(input_path)
+        manifest = {
+            "input": os.path.abspath(input_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "chunk_size": self.config.chunk_size, "model_version": None, "parts": {},
+        }
+        manifest_path = os.path.join(parts_dir, "manifest.json")
+        if not restart and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                previous = json.load(f)
+            if {**previous, "model_version": None, "parts": {}} == manifest:
+                return previous
+            logging.info(f"Input or chunk size changed since the checkpoint in {parts_dir}, starting over")
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        os.makedirs(parts_dir)
+        self._write_manifest(parts_dir, manifest)
+        return manifest
+
+    def _write_manifest(self, parts_dir: str, manifest: dict):
+        with open(os.path.join(parts_dir, "manifest.json.tmp"), "w") as f:
+            json.dump(manifest, f)
+        os.replace(os.path.join(parts_dir, "manifest.json.tmp"), os.path.join(parts_dir, "manifest.json"))
+
+    def _part_counts(self, manifest: dict, index: int, path: str) -> list:
+        """
+        Returns the rows and failed rows of a scored part, counting them in the part file if the run stopped before
+        recording them in the manifest.
+        """
+        if str(index) in manifest["parts"]:
+            return manifest["parts"][str(index)]
+        part = read_table(path, table_format(path))
+        return [len(part), int(part[self.config.prediction_column].isna().sum())]
+
+    def run(self, input_path: str, output_path: str, restart: bool = False) -> dict:
+        """
+        Scores every row of the input file into the output file.
+
+        Args:
+            input_path (str): The table to score, with every column of FEATURE_COLUMNS.
+            output_path (str): The table to write: the input columns and the prediction column.
+            restart (bool): Whether to ignore the checkpoint of a previous run.
+
+        Returns:
+            dict: The run report: `rows` and `failed_rows` of the whole input, `scored_rows` by this run (the others
+            were scored before it was interrupted), `chunks`, `resumed_chunks`, `model_version`, `seconds` and
+            `rows_per_sec`, the scored rows per second.
+
+        Raises:
+            CustomException: If the input cannot be scored, or the model changed since the checkpoint.
+        """
+        try:
+            start_time = time.perf_counter()
+            part_format = FORMATS[table_format(output_path)]
+            parts_dir = output_path + ".parts"
+            manifest = self._checkpoint(input_path, parts_dir, restart)
+
+            def part_path(index):
+                return os.path.join(parts_dir, f"part-{index:06d}{part_format}")
+
+            done = {int(name[5:11]) for name in os.listdir(parts_dir) if name.startswith("part-") and name.endswith(part_format)}
+            leading = 0
+            while leading in done:
+                leading += 1
+            if done:
+                logging.info(f"Resuming from {parts_dir}: {len(done)} chunks already scored")
+
+            resumed = [self._part_counts(manifest, index, part_path(index)) for index in sorted(done)]
+            rows = sum(part_rows for part_rows, _ in resumed)
+            failed = sum(part_failed for _, part_failed in resumed)
+            scored = 0
+            version = manifest["model_version"]
+            chunks = read_table_chunks(input_path, self.config.chunk_size, skip_rows=leading * self.config.chunk_size)
+            with ProcessPoolExecutor(self.config.workers, initializer=_init_worker, initargs=(self.config,)) as pool:
+                pending = set()
+
+                def collect(futures):
+                    nonlocal rows, failed, scored, version
+                    for future in futures:
+                        chunk_index, chunk_rows, chunk_failed, chunk_version = future.result()
+                        if version is None:
+                            version = manifest["model_version"] = chunk_version
+                        elif chunk_version != version:
+                            raise CustomException(
+                                f"Model changed during the run ({version} -> {chunk_version}), rerun with --restart", sys
+                            )
+                        manifest["parts"][str(chunk_index)] = [chunk_rows, chunk_failed]
+                        self._write_manifest(parts_dir, manifest)
+                        rows += chunk_rows
+                        failed += chunk_failed
+                        scored += chunk_rows
+
+                index = leading
+                for chunk in chunks:
+                    if index == leading:
+                        missing = [column for column in FEATURE_COLUMNS if column not in chunk.columns]
+                        if missing:
+                            raise CustomException(f"Input is missing the columns {missing}", sys)
+                    if index not in done:
+                        pending.add(pool.submit(
+                            _score_chunk, index, chunk, part_path(index), self.config.prediction_column
+                        ))
+                    index += 1
+                    if len(pending) >= 2 * self.config.workers:
+                        completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(completed)
+                        logging.info(f"Scored {rows} rows, {scored / (time.perf_counter() - start_time):.0f} rows/sec")
+                collect(wait(pending).done)
+
+            _assemble([part_path(i) for i in range(index)], output_path)
+            shutil.rmtree(parts_dir, ignore_errors=True)
+            seconds = time.perf_counter() - start_time
+            report = {
+                "rows": rows, "scored_rows": scored, "chunks": index, "resumed_chunks": len(done), "failed_rows": failed,
+                "model_version": version, "seconds": seconds, "rows_per_sec": scored / max(seconds, 1e-9),
+            }
+            logging.info(f"Batch scoring of {input_path} into {output_path} done: {report}")
+            return report
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--chunk-size", type=int, default=BatchPredictConfig.chunk_size)
+    parser.add_argument("--workers", type=int, default=BatchPredictConfig.workers)
+    parser.add_argument("--model-path", default=BatchPredictConfig.model_path)
+    parser.add_argument("--preprocessor-path", default=BatchPredictConfig.preprocessor_path)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    args = parser.parse_args(argv)
+
+    report = BatchPredictor(BatchPredictConfig(
+        chunk_size=args.chunk_size, workers=args.workers,
+        model_path=args.model_path, preprocessor_path=args.preprocessor_path
+    )).run(args.input, args.output, restart=args.restart)
+    print(
+        f"{report['scored_rows']} of {report['rows']} rows scored in {report['seconds']:.1f}s "
+        f"({report['rows_per_sec']:.0f} rows/sec), {report['failed_rows']} failed, model version {report['model_version']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
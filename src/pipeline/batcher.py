@@ -0,0 +1,182 @@
+from src.exception import CustomException
+from src.instrumentation import registry, span
+from src.logger import logging
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+import os
+import queue
+import sys
+import threading
+import time
+
+
+@dataclass
+class MicroBatcherConfig:
+    max_batch_size: int = 64
+    max_wait_ms: float = 2.0
+
+
+class MicroBatcher:
+    """
+    Merges concurrent prediction requests into one vectorized call.
+
+    Requests are queued and a single background thread drains the queue: it takes the oldest request, keeps
+    collecting more until the batch holds `max_batch_size` rows or `max_wait_ms` milliseconds have passed
+    since the first one arrived, then calls `predict_fn` once for the whole batch and hands each request its
+    slice of the result. A request larger than `max_batch_size` is run as a batch of its own. If the merged call
+    fails, each request of the batch is predicted on its own, so only the requests that fail by themselves get
+    the exception.
+
+    Args:
+        predict_fn (callable): Function taking a list of items and returning one prediction per item.
+        config (MicroBatcherConfig): Batch size and wait time limits.
+
+    Attributes:
+        config (MicroBatcherConfig): Batch size and wait time limits.
+        batches (int): Number of `predict_fn` calls made.
+        rows (int): Number of rows predicted.
+
+    Methods:
+        submit(items): Queues a list of items and returns a Future of their predictions.
+        predict(items, timeout): Queues a list of items and waits for their predictions.
+        close(): Stops the background thread after the queued requests are served.
+    """
+    def __init__(self, predict_fn, config: MicroBatcherConfig):
+        """
+        Initializes the MicroBatcher. Its background thread is started by the first request of each process, so a
+        batcher created before a fork (e.g. in a preloaded gunicorn master) works in the forked workers.
+
+        Args:
+            predict_fn (callable): Function taking a list of items and returning one prediction per item.
+            config (MicroBatcherConfig): Batch size and wait time limits.
+        """
+        self.predict_fn = predict_fn
+        self.config = config
+        self.batches = 0
+        self.rows = 0
+        self._closed = False
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Threads don't survive a fork: give this process its own queue and thread.
+                self._queue = queue.Queue()
+                self._pending = None
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, items: list) -> Future:
+        """
+        Queues a list of items for prediction.
+
+        Args:
+            items (list): The items to predict, passed to `predict_fn` together with other queued items.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the list of predictions for `items`, in order.
+
+        Raises:
+            CustomException: If the batcher was closed.
+        """
+        if self._closed:
+            raise CustomException("MicroBatcher is closed", sys)
+        future = Future()
+        if not items:
+            future.set_result([])
+            return future
+        self._ensure_started()
+        self._queue.put((list(items), future))
+        return future
+
+    def predict(self, items: list, timeout: float = None) -> list:
+        """
+        Queues a list of items and waits for their predictions.
+
+        Args:
+            items (list): The items to predict.
+            timeout (float): Seconds to wait for the result, None waits forever.
+
+        Returns:
+            list: The predictions for `items`, in order.
+        """
+        return self.submit(items).result(timeout=timeout)
+
+    def close(self):
+        """
+        Stops accepting requests and waits for the queued ones to be served.
+        """
+        self._closed = True
+        if self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.config.max_wait_ms / 1000
+        while size < self.config.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            if size + len(request[0]) > self.config.max_batch_size:
+                # Doesn't fit, it starts the next batch.
+                self._pending = request
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            if self._pending is not None:
+                first, self._pending = self._pending, None
+            else:
+                first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            items = [item for request_items, _ in batch for item in request_items]
+            registry.increment("batcher_rows_total", len(items))
+            try:
+                with span("batcher.flush"):
+                    predictions = list(self.predict_fn(items))
+            except Exception as e:
+                logging.info(f"Batch of {len(items)} rows failed: {e}")
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._run_separately(batch)
+                continue
+
+            self.batches += 1
+            self.rows += len(items)
+            offset = 0
+            for request_items, future in batch:
+                future.set_result(predictions[offset:offset + len(request_items)])
+                offset += len(request_items)
+
+    def _run_separately(self, batch):
+        # One request failed the merged call: predict each on its own so only the faulty one fails.
+        for request_items, future in batch:
+            try:
+                predictions = list(self.predict_fn(request_items))
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(request_items)
+            future.set_result(predictions)
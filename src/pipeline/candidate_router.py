@@ -0,0 +1,160 @@
+from src.exception import CustomException
+from src.instrumentation import registry as metrics
+from src.logger import logging
+from src.pipeline.model_cache import ModelCache, ModelCacheConfig
+from src.pipeline.model_registry import CANDIDATE, ModelRegistry, ModelRegistryConfig
+from dataclasses import dataclass, field
+
+import os
+import queue
+import random
+import threading
+import time
+import numpy as np
+
+
+@dataclass
+class CandidateRouterConfig:
+    registry_root: str = field(default_factory=lambda: os.environ.get("MODEL_REGISTRY"))
+    check_interval: float = 1.0
+    shadow_queue_size: int = 1000
+
+
+class CandidateRouter:
+    """
+    Sends a fraction of the requests to the candidate version of a model registry.
+
+    The CANDIDATE pointer is re-read at most every `check_interval` seconds and its version is loaded in a
+    ModelCache of its own, next to the serving one. Each request is drawn into the candidate's traffic with
+    probability `fraction`:
+
+    - "ab": the request is answered by the candidate.
+    - "shadow": the request is answered by the current version as usual, and the candidate scores the same
+      features in a background thread. The absolute difference of the two predictions is recorded in the
+      `shadow_abs_diff` histogram. Shadow work waits in a bounded queue; when it is full the work is dropped
+      (`shadow_dropped_total`) rather than slowing the requests down.
+
+    `predictions_total` counts the predictions made by each version, labelled with its role.
+
+    Args:
+        config (CandidateRouterConfig): The registry, the check interval and the shadow queue size.
+
+    Attributes:
+        config (CandidateRouterConfig): The registry, the check interval and the shadow queue size.
+        cache (ModelCache): Cache of the candidate version.
+
+    Methods:
+        route(snapshot): Returns the candidate snapshot a request is drawn for, and the mode.
+        record(snapshot, role, n): Counts predictions made by a version.
+        shadow(predict, served): Queues the comparison of a candidate's predictions with the served ones.
+    """
+    def __init__(self, config: CandidateRouterConfig):
+        """
+        Initializes the CandidateRouter with the provided configuration. The candidate is loaded on first use.
+
+        Args:
+            config (CandidateRouterConfig): The registry, the check interval and the shadow queue size.
+        """
+        self.config = config
+        self.registry = ModelRegistry(ModelRegistryConfig(root=config.registry_root))
+        self.cache = ModelCache(ModelCacheConfig(
+            registry_root=config.registry_root, pointer=CANDIDATE, check_interval=config.check_interval
+        ))
+        self._pointer = None
+        self._next_check = 0.0
+        self._queue = queue.Queue(config.shadow_queue_size)
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def _candidate(self) -> dict:
+        if time.monotonic() >= self._next_check:
+            try:
+                self._pointer = self.registry.pointer(CANDIDATE)
+            except (OSError, ValueError) as e:
+                logging.info(f"Cannot read the candidate pointer, keeping {self._pointer}: {e}")
+            self._next_check = time.monotonic() + self.config.check_interval
+        return self._pointer
+
+    def route(self, snapshot) -> tuple:
+        """
+        Returns whether a request answered with `snapshot` is drawn into the candidate's traffic.
+
+        Args:
+            snapshot (ModelSnapshot): The snapshot of the current version.
+
+        Returns:
+            tuple: (candidate ModelSnapshot, mode) for a drawn request, (None, None) otherwise, including when
+            there is no candidate, it is the current version or it cannot be loaded.
+        """
+        pointer = self._candidate()
+        if pointer is None or random.random() >= pointer["fraction"]:
+            return None, None
+        try:
+            candidate = self.cache.get()
+        except CustomException as e:
+            metrics.increment("candidate_errors_total", version=pointer["version"])
+            logging.info(f"Candidate model version {pointer['version']} cannot be loaded: {e}")
+            return None, None
+        if candidate.version == snapshot.version:
+            return None, None
+        return candidate, pointer["mode"]
+
+    def record(self, snapshot, role: str, n: int = 1):
+        """
+        Counts `n` predictions made by the version of `snapshot` in a role ("current" or "candidate").
+        """
+        metrics.increment("predictions_total", n, version=snapshot.version, role=role)
+
+    def shadow(self, predict, served):
+        """
+        Queues the comparison of the candidate's predictions with the served ones.
+
+        Args:
+            predict (callable): Returns the candidate's predictions. Called in the shadow thread.
+            served (array-like): The predictions that were returned to the client.
+        """
+        if self._thread_pid != os.getpid():
+            # Started lazily, and again in a forked worker, which does not inherit the master's thread.
+            with self._lock:
+                if self._thread_pid != os.getpid():
+                    self._queue = queue.Queue(self.config.shadow_queue_size)
+                    threading.Thread(target=self._run, args=(self._queue,), daemon=True, name="shadow-scoring").start()
+                    self._thread_pid = os.getpid()
+        try:
+            self._queue.put_nowait((predict, np.asarray(served, dtype=np.float64)))
+        except queue.Full:
+            metrics.increment("shadow_dropped_total")
+
+    def _run(self, work: queue.Queue):
+        while True:
+            predict, served = work.get()
+            try:
+                candidate = np.asarray(predict(), dtype=np.float64)
+                for difference in np.abs(candidate - served):
+                    metrics.observe("shadow_abs_diff", float(difference))
+            except Exception as e:
+                metrics.increment("shadow_errors_total")
+                logging.info(f"Shadow scoring failed: {e}")
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_candidate_router(config: CandidateRouterConfig = None) -> CandidateRouter:
+    """
+    Returns the process-wide CandidateRouter, creating it on first use.
+
+    Args:
+        config (CandidateRouterConfig): Configuration used when the router is created. Ignored afterwards.
+
+    Returns:
+        CandidateRouter: The shared router, None when no registry is configured.
+    """
+    global _router
+    config = config or CandidateRouterConfig()
+    if _router is None and config.registry_root is not None:
+        with _router_lock:
+            if _router is None:
+                _router = CandidateRouter(config)
+    return _router
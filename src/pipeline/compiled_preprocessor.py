@@ -0,0 +1,226 @@
+from src.exception import CustomException
+
+import sys
+import numpy as np
+
+
+def _is_nan(value) -> bool:
+    return isinstance(value, float) and value != value
+
+
+def _scaler_coefficients(scaler, width):
+    """
+    Returns the (mean, scale) arrays a fitted StandardScaler applies, as identity values where it applies none.
+    """
+    mean = np.zeros(width)
+    scale = np.ones(width)
+    if scaler is not None:
+        if scaler.with_mean:
+            mean = np.asarray(scaler.mean_, dtype=np.float64)
+        if scaler.scale_ is not None:
+            scale = np.asarray(scaler.scale_, dtype=np.float64)
+    return mean, scale
+
+
+class CompiledPreprocessor:
+    """
+    Plain NumPy version of the fitted ColumnTransformer built by DataTransformation.get_preprocessor.
+
+    The fitted imputer statistics, one-hot vocabularies and scaler coefficients are extracted once into lookup
+    tables, so a single record maps straight to its feature vector without building a DataFrame or going through
+    the sklearn pipelines. The arithmetic matches the sklearn transformers operation for operation, so the output
+    is bit-identical to `preprocessor.transform` (densified).
+
+    Only the transformers used in this project are supported: per column group, an optional SimpleImputer,
+    an optional OneHotEncoder (no `drop`, no infrequent categories) and an optional StandardScaler.
+
+    Args:
+        preprocessor (ColumnTransformer): The fitted preprocessor.
+
+    Attributes:
+        columns (list): Input column names, in the order tuple records must follow.
+        n_features_out (int): Length of the produced feature vectors.
+
+    Methods:
+        transform_record(record): Returns the feature vector of one record.
+        transform_records(records): Returns the feature matrix of several records.
+        verify(preprocessor, records): Counts the records whose features differ from the preprocessor's.
+    """
+    def __init__(self, preprocessor):
+        """
+        Compiles the fitted preprocessor into lookup tables.
+
+        Args:
+            preprocessor (ColumnTransformer): The fitted preprocessor.
+
+        Raises:
+            CustomException: If the preprocessor uses a transformer or option that cannot be compiled.
+        """
+        try:
+            # Imported here rather than at module level: the preprocessor was unpickled, so sklearn is loaded
+            # already, and importing this module stays cheap for processes that never compile one.
+            from sklearn.compose import ColumnTransformer
+            from sklearn.pipeline import Pipeline
+
+            if not isinstance(preprocessor, ColumnTransformer):
+                raise ValueError(f"Expected a ColumnTransformer, got {type(preprocessor).__name__}")
+
+            self.columns = list(preprocessor.feature_names_in_)
+            positions = {column: index for index, column in enumerate(self.columns)}
+            self.n_features_out = sum(
+                indices.stop - indices.start for indices in preprocessor.output_indices_.values()
+            )
+
+            # (input position, output position, fill value, mean, scale)
+            self._numeric = []
+            # (input position, fill value, {category: (output position, value)})
+            self._categorical = []
+
+            for name, transformer, columns in preprocessor.transformers_:
+                if transformer == "drop" or len(columns) == 0:
+                    continue
+                steps = transformer.steps if isinstance(transformer, Pipeline) else [(name, transformer)]
+                offset = preprocessor.output_indices_[name].start
+                self._compile_group(steps, [positions[column] for column in columns], offset)
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    def _compile_group(self, steps, input_positions, offset):
+        from sklearn.impute import SimpleImputer
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+        imputer = encoder = scaler = None
+        for _, step in steps:
+            if isinstance(step, SimpleImputer) and encoder is None and scaler is None:
+                imputer = step
+            elif isinstance(step, OneHotEncoder) and scaler is None:
+                encoder = step
+            elif isinstance(step, StandardScaler):
+                scaler = step
+            else:
+                raise ValueError(f"Cannot compile step {type(step).__name__}")
+
+        fills = list(imputer.statistics_) if imputer is not None else [None] * len(input_positions)
+
+        if encoder is None:
+            mean, scale = _scaler_coefficients(scaler, len(input_positions))
+            for index, position in enumerate(input_positions):
+                fill = float(fills[index]) if fills[index] is not None else None
+                self._numeric.append((position, offset + index, fill, float(mean[index]), float(scale[index])))
+            return
+
+        if encoder.drop is not None or getattr(encoder, "infrequent_categories_", None):
+            raise ValueError("Cannot compile a OneHotEncoder with dropped or infrequent categories")
+        if scaler is not None and scaler.with_mean:
+            raise ValueError("Cannot compile a centered StandardScaler after a OneHotEncoder")
+        width = sum(len(categories) for categories in encoder.categories_)
+        _, scale = _scaler_coefficients(scaler, width)
+        # StandardScaler scales sparse input by multiplying with 1 / scale_, dense input by dividing.
+        # 1.0 * (1 / s) and 1.0 / s are the same double, so either way this is the stored value.
+        values = 1 / scale
+
+        column_offset = 0
+        for index, (position, categories) in enumerate(zip(input_positions, encoder.categories_)):
+            vocabulary = {
+                category: (offset + column_offset + code, float(values[column_offset + code]))
+                for code, category in enumerate(categories)
+            }
+            self._categorical.append((position, fills[index], vocabulary))
+            column_offset += len(categories)
+
+    def _fill_row(self, row, values):
+        for position, out, fill, mean, scale in self._numeric:
+            value = values[position]
+            if value is None or _is_nan(value):
+                if fill is None:
+                    raise ValueError(f"Missing value for {self.columns[position]}")
+                value = fill
+            row[out] = (float(value) - mean) / scale
+
+        for position, fill, vocabulary in self._categorical:
+            value = values[position]
+            # Like SimpleImputer on object columns, only NaN counts as missing: None is not imputed and fails below
+            # as an unknown category. CustomData.from_record turns JSON nulls into NaN.
+            if _is_nan(value):
+                value = fill
+            try:
+                out, encoded = vocabulary[value]
+            except KeyError:
+                raise ValueError(f"Found unknown category {value!r} in column {self.columns[position]}")
+            row[out] = encoded
+
+    def _values(self, record):
+        if isinstance(record, dict):
+            return [record.get(column) for column in self.columns]
+        if len(record) != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} values in the order {self.columns}, got {len(record)}")
+        return record
+
+    def transform_record(self, record) -> np.ndarray:
+        """
+        Returns the feature vector of one record.
+
+        Args:
+            record (dict or tuple): The record, keyed by column name or with values in the order of `columns`.
+
+        Returns:
+            np.ndarray: A float64 vector of length `n_features_out`.
+
+        Raises:
+            ValueError: If a category was not seen during fitting or a value cannot be imputed.
+        """
+        row = np.zeros(self.n_features_out)
+        self._fill_row(row, self._values(record))
+        return row
+
+    def transform_records(self, records) -> np.ndarray:
+        """
+        Returns the feature matrix of several records.
+
+        Args:
+            records (iterable): Records as accepted by `transform_record`.
+
+        Returns:
+            np.ndarray: A float64 matrix with one row per record.
+
+        Raises:
+            ValueError: If a category was not seen during fitting or a value cannot be imputed.
+        """
+        records = list(records)
+        matrix = np.zeros((len(records), self.n_features_out))
+        for row, record in zip(matrix, records):
+            self._fill_row(row, self._values(record))
+        return matrix
+
+    def verify(self, preprocessor, records) -> int:
+        """
+        Transforms records with both this and the sklearn preprocessor and counts those whose features differ in
+        any byte. The batch path is checked too and counts as one more record when it differs.
+
+        Args:
+            preprocessor (ColumnTransformer): The fitted preprocessor this was compiled from.
+            records (pd.DataFrame): The records, with the preprocessor's columns.
+
+        Returns:
+            int: The number of mismatches.
+
+        Raises:
+            CustomException: If the sklearn preprocessor cannot transform the records, e.g. because it was pickled
+                by another scikit-learn version whose fitted attributes the installed one does not have.
+        """
+        try:
+            expected = preprocessor.transform(records[self.columns])
+        except Exception as e:
+            import sklearn
+
+            raise CustomException(
+                f"The preprocessor cannot transform with the installed scikit-learn {sklearn.__version__}, "
+                f"refit it if it was pickled by another version: {e}", sys
+            )
+        expected = expected.toarray() if hasattr(expected, "toarray") else np.asarray(expected, dtype=np.float64)
+
+        rows = records[self.columns].to_dict(orient="records")
+        mismatches = sum(
+            self.transform_record(row).tobytes() != expected[index].tobytes() for index, row in enumerate(rows)
+        )
+        return mismatches + int(self.transform_records(rows).tobytes() != expected.tobytes())
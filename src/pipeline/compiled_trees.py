@@ -0,0 +1,198 @@
+from src.exception import CustomException
+
+import sys
+import numpy as np
+
+
+SUPPORTED_MODELS = {"DecisionTreeRegressor", "RandomForestRegressor", "ExtraTreesRegressor", "AdaBoostRegressor"}
+# Above about this many rows x trees x levels, sklearn's per tree loop beats walking every (row, tree) pair at once:
+# the traversal arrays outgrow the CPU caches. Measured on a 100 tree forest (about 250 rows) and a 50 stump
+# AdaBoost (beyond 4000 rows).
+MAX_VECTORIZED_WORK = 500_000
+
+
+class CompiledTrees:
+    """
+    Plain NumPy version of a fitted sklearn tree model: DecisionTreeRegressor, RandomForestRegressor,
+    ExtraTreesRegressor or AdaBoostRegressor.
+
+    The nodes of every tree are flattened into contiguous arrays (split feature, threshold, children, leaf
+    value) with global node ids, and a leaf is its own left and right child. A batch is then predicted by
+    walking all the trees for all the rows at once: one vectorized step per level moves every (row, tree) pair
+    to the child its feature value selects, until every pair sits on a leaf. This replaces sklearn's per tree
+    Python loop (and the thread pool forests dispatch it to), which dominates the latency of small batches.
+
+    The features are rounded to float32 before the comparisons, as sklearn does, so every row reaches the same
+    leaf as in sklearn. Forests average the leaf values and AdaBoost takes the weighted median of the trees, like
+    the sklearn models do, so predictions match `model.predict` up to floating point summation order. Batches too
+    large for the traversal to pay off (MAX_VECTORIZED_WORK) are handed to `model.predict` instead.
+
+    Args:
+        model (estimator): The fitted tree model.
+
+    Attributes:
+        kind (str): "tree", "forest" or "adaboost".
+        n_trees (int): Number of trees.
+        n_nodes (int): Total number of nodes.
+        max_depth (int): Depth of the deepest tree, the number of traversal steps.
+
+    Methods:
+        supports(model): Returns whether the model can be compiled.
+        predict(X): Returns the predictions of the rows of X.
+        predict_vectorized(X): Returns the predictions of the rows of X, always by the vectorized traversal.
+        apply(X): Returns the leaf each row reaches in each tree.
+        verify(model, n_rows, random_state): Returns the largest absolute difference from `model.predict`.
+    """
+    def __init__(self, model):
+        """
+        Flattens the trees of the fitted model.
+
+        Args:
+            model (estimator): The fitted tree model.
+
+        Raises:
+            CustomException: If the model is not a supported single-output tree model.
+        """
+        try:
+            from sklearn.ensemble import AdaBoostRegressor, ExtraTreesRegressor, RandomForestRegressor
+            from sklearn.tree import DecisionTreeRegressor
+
+            if type(model) is DecisionTreeRegressor:
+                self.kind, estimators = "tree", [model]
+            elif type(model) in (RandomForestRegressor, ExtraTreesRegressor):
+                self.kind, estimators = "forest", list(model.estimators_)
+            elif type(model) is AdaBoostRegressor:
+                self.kind, estimators = "adaboost", list(model.estimators_)
+                self.weights = np.asarray(model.estimator_weights_[:len(estimators)], dtype=np.float64)
+            else:
+                raise ValueError(f"Cannot compile {type(model).__name__}")
+            if getattr(model, "n_outputs_", 1) != 1:
+                raise ValueError("Cannot compile a multi-output model")
+
+            self.model = model
+            self.n_features_in = model.n_features_in_
+            self.n_trees = len(estimators)
+            features, thresholds, lefts, rights, values, roots, depths = [], [], [], [], [], [], []
+            offset = 0
+            for estimator in estimators:
+                tree = estimator.tree_
+                leaf = tree.children_left == -1
+                ids = np.arange(tree.node_count)
+                features.append(np.where(leaf, 0, tree.feature))
+                thresholds.append(np.where(leaf, np.inf, tree.threshold))
+                lefts.append(np.where(leaf, ids, tree.children_left) + offset)
+                rights.append(np.where(leaf, ids, tree.children_right) + offset)
+                values.append(tree.value[:, 0, 0])
+                roots.append(offset)
+                depths.append(tree.max_depth)
+                offset += tree.node_count
+
+            self.feature = np.concatenate(features).astype(np.intp)
+            self.threshold = np.concatenate(thresholds).astype(np.float64)
+            self.left = np.concatenate(lefts).astype(np.intp)
+            self.right = np.concatenate(rights).astype(np.intp)
+            self.value = np.concatenate(values).astype(np.float64)
+            self.is_leaf = self.left == np.arange(offset)
+            self.roots = np.asarray(roots, dtype=np.intp)
+            self.n_nodes = offset
+            self.max_depth = max(depths)
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    @staticmethod
+    def supports(model) -> bool:
+        """
+        Returns whether the model is of a class that can be compiled, without importing sklearn.
+        """
+        return type(model).__module__.startswith("sklearn.") and type(model).__name__ in SUPPORTED_MODELS
+
+    def _features(self, X) -> np.ndarray:
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in:
+            raise ValueError(f"Expected {self.n_features_in} features, got {X.shape[1]}")
+        return X
+
+    def apply(self, X) -> np.ndarray:
+        """
+        Returns the global id of the leaf each row reaches in each tree.
+
+        Args:
+            X (array-like or sparse matrix): The features, one row per sample.
+
+        Returns:
+            np.ndarray: An (n_rows, n_trees) array of node ids.
+        """
+        X = self._features(X)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            if self.is_leaf[nodes].all():
+                break
+        return nodes
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Returns the predictions of the rows of X, as `model.predict` would.
+
+        Args:
+            X (array-like or sparse matrix): The features, one row per sample.
+
+        Returns:
+            np.ndarray: One float64 prediction per row.
+        """
+        n_rows = X.shape[0] if hasattr(X, "shape") and len(X.shape) == 2 else 1
+        if n_rows * self.n_trees * max(self.max_depth, 1) > MAX_VECTORIZED_WORK:
+            return self.model.predict(X)
+        return self.predict_vectorized(X)
+
+    def predict_vectorized(self, X) -> np.ndarray:
+        """
+        Returns the predictions of the rows of X by the vectorized traversal, whatever the batch size.
+
+        Args:
+            X (array-like or sparse matrix): The features, one row per sample.
+
+        Returns:
+            np.ndarray: One float64 prediction per row.
+        """
+        predictions = self.value[self.apply(X)]
+        if self.kind == "tree":
+            return predictions[:, 0]
+        if self.kind == "forest":
+            return predictions.mean(axis=1)
+
+        # AdaBoostRegressor._get_median_predict: the prediction of the tree at the weighted median.
+        order = np.argsort(predictions, axis=1)
+        cdf = np.cumsum(self.weights[order], axis=1)
+        median = (cdf >= 0.5 * cdf[:, -1:]).argmax(axis=1)
+        rows = np.arange(predictions.shape[0])
+        return predictions[rows, order[rows, median]]
+
+    def verify(self, model, n_rows: int = 512, random_state: int = 17) -> float:
+        """
+        Returns the largest absolute difference between `predict` and `model.predict` on random rows whose
+        values are drawn around the split thresholds of the trees, so that both sides of the splits are taken.
+
+        Args:
+            model (estimator): The model this was compiled from.
+            n_rows (int): Number of random rows.
+            random_state (int): Seed of the rows.
+
+        Returns:
+            float: The largest absolute difference.
+        """
+        rng = np.random.RandomState(random_state)
+        X = np.zeros((n_rows, self.n_features_in))
+        for feature in range(self.n_features_in):
+            splits = self.threshold[~self.is_leaf & (self.feature == feature)]
+            if len(splits):
+                X[:, feature] = rng.choice(splits, n_rows) + rng.choice([-1e-3, 0.0, 1e-3], n_rows)
+            else:
+                X[:, feature] = rng.normal(size=n_rows)
+        return float(np.max(np.abs(self.predict_vectorized(X) - model.predict(X))))
@@ -0,0 +1,136 @@
+from src.logger import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+import asyncio
+import threading
+import time
+
+
+@dataclass
+class InferenceExecutorConfig:
+    kind: str = "thread"
+    max_workers: int = 4
+    max_queue_depth: int = 64
+    request_timeout: float = 5.0
+
+
+class Overloaded(Exception):
+    """
+    Raised when the executor already holds as many calls as it may queue, or is shutting down.
+    """
+
+
+class InferenceExecutor:
+    """
+    Bounded pool that runs CPU-bound inference off the event loop.
+
+    At most `max_workers` calls run at a time (threads, or processes with `kind="process"`) and at most
+    `max_queue_depth` more wait for a worker. Calls beyond that are rejected right away with Overloaded instead
+    of queueing without bound, so the caller can shed load (e.g. answer 503) while latency of the admitted
+    calls stays bounded. Each call is also given `request_timeout` seconds before the caller stops waiting for it.
+
+    Args:
+        config (InferenceExecutorConfig): Pool kind, size, queue depth and timeout.
+
+    Attributes:
+        config (InferenceExecutorConfig): Pool kind, size, queue depth and timeout.
+        in_flight (int): Calls admitted and not finished yet, running or queued.
+        rejected (int): Calls rejected because the pool was full or shutting down.
+        timed_out (int): Calls the caller stopped waiting for.
+
+    Methods:
+        run(fn, *args): Runs `fn(*args)` on the pool and awaits its result.
+        shutdown(timeout): Stops admitting calls and waits for the admitted ones to finish.
+    """
+    def __init__(self, config: InferenceExecutorConfig):
+        """
+        Initializes the InferenceExecutor and its pool.
+
+        Args:
+            config (InferenceExecutorConfig): Pool kind, size, queue depth and timeout.
+        """
+        self.config = config
+        if config.kind == "process":
+            self._pool = ProcessPoolExecutor(max_workers=config.max_workers)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=config.max_workers, thread_name_prefix="inference")
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._accepting = True
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def _admit(self):
+        with self._lock:
+            if not self._accepting or self.in_flight >= self.config.max_workers + self.config.max_queue_depth:
+                self.rejected += 1
+                raise Overloaded("Inference queue is full" if self._accepting else "Shutting down")
+            self.in_flight += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.notify_all()
+
+    async def run(self, fn, *args):
+        """
+        Runs `fn(*args)` on the pool and awaits its result.
+
+        Args:
+            fn (callable): The function to run. Must be picklable for a process pool.
+            *args: Its arguments.
+
+        Returns:
+            object: What `fn` returned.
+
+        Raises:
+            Overloaded: If the pool and its queue are full, or the executor is shutting down.
+            asyncio.TimeoutError: If the call did not finish within `request_timeout` seconds.
+        """
+        self._admit()
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.config.request_timeout)
+        except asyncio.TimeoutError:
+            # A queued call is dropped; a running one cannot be interrupted and finishes in the background.
+            future.cancel()
+            self.timed_out += 1
+            raise
+
+    def shutdown(self, timeout: float = 30.0) -> bool:
+        """
+        Stops admitting calls and waits for the admitted ones to finish.
+
+        Args:
+            timeout (float): Seconds to wait for in-flight calls.
+
+        Returns:
+            bool: True if every call finished in time.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._accepting = False
+            while self.in_flight and time.monotonic() < deadline:
+                self._idle.wait(deadline - time.monotonic())
+            drained = self.in_flight == 0
+        self._pool.shutdown(wait=drained, cancel_futures=not drained)
+        logging.info(f"Inference executor shut down, {'drained' if drained else 'abandoned in-flight calls'}")
+        return drained
+
+    def stats(self) -> dict:
+        """
+        Returns the executor counters.
+
+        Returns:
+            dict: `in_flight`, `rejected` and `timed_out`.
+        """
+        return {"in_flight": self.in_flight, "rejected": self.rejected, "timed_out": self.timed_out}
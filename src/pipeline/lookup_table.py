@@ -0,0 +1,109 @@
+import json
+import os
+import numpy as np
+
+
+TABLE_FILE = "table.npy"
+META_FILE = "meta.json"
+
+
+class LookupTable:
+    """
+    A model compiled into a dense table of its predictions, see src.components.model_export.
+
+    The table has one axis per categorical column (indexed by the category's position in the fitted vocabulary)
+    and one per score (indexed by the score minus the lowest score), so predicting a record is a few dict
+    lookups and one array index. Only NumPy is needed: the table is memory-mapped, shared between processes
+    through the page cache, and neither sklearn nor the boosting libraries are imported.
+
+    Records outside the table (unknown or missing categories, scores that are not integers in the exported
+    range) have no entry and must be predicted by the real model.
+
+    Args:
+        path (str): The directory the table was exported to.
+
+    Attributes:
+        meta (dict): The export metadata: axes, score range, source model and its `model_version`, and
+            verification results.
+        table (np.ndarray): The read-only, memory-mapped predictions.
+
+    Methods:
+        index(record): Returns the table index of a record, None if it is outside the table.
+        predict_record(record): Returns the prediction of a record, None if it is outside the table.
+        predict(records): Returns the predictions of several records, NaN for the ones outside the table.
+    """
+    def __init__(self, path: str):
+        """
+        Maps the table exported to `path`.
+
+        Args:
+            path (str): The directory the table was exported to.
+        """
+        # Read both files from the version the path points to now, even if an export swaps it meanwhile.
+        path = os.path.realpath(path)
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.table = np.load(os.path.join(path, TABLE_FILE), mmap_mode="r")
+        self._categorical = [
+            (column, {category: code for code, category in enumerate(categories)})
+            for column, categories in self.meta["categorical"]
+        ]
+        self._scores = self.meta["scores"]
+        self._low, self._high = self.meta["score_range"]
+
+    def index(self, record: dict):
+        """
+        Returns the table index of a record.
+
+        Args:
+            record (dict): The record, keyed by column name.
+
+        Returns:
+            tuple or None: The index into `table`, None if the record is outside the table.
+        """
+        index = []
+        for column, vocabulary in self._categorical:
+            code = vocabulary.get(record.get(column)) if isinstance(record.get(column), str) else None
+            if code is None:
+                return None
+            index.append(code)
+
+        for column in self._scores:
+            try:
+                value = float(record.get(column))
+            except (TypeError, ValueError):
+                return None
+            if not value.is_integer() or not self._low <= value <= self._high:
+                return None
+            index.append(int(value) - self._low)
+        return tuple(index)
+
+    def predict_record(self, record: dict):
+        """
+        Returns the prediction of a record.
+
+        Args:
+            record (dict): The record, keyed by column name.
+
+        Returns:
+            float or None: The prediction, None if the record is outside the table.
+        """
+        index = self.index(record)
+        return float(self.table[index]) if index is not None else None
+
+    def predict(self, records) -> np.ndarray:
+        """
+        Returns the predictions of several records.
+
+        Args:
+            records (iterable): Records keyed by column name.
+
+        Returns:
+            np.ndarray: One float64 prediction per record, NaN for the records outside the table.
+        """
+        indices = [self.index(record) for record in records]
+        predictions = np.full(len(indices), np.nan)
+        for position, index in enumerate(indices):
+            if index is not None:
+                predictions[position] = self.table[index]
+        return predictions
@@ -0,0 +1,351 @@
+from src.exception import CustomException
+from src.logger import logging
+from src.pipeline.compiled_preprocessor import CompiledPreprocessor
+from src.pipeline.compiled_trees import CompiledTrees
+from src.pipeline.model_registry import CURRENT, ModelRegistry, ModelRegistryConfig
+from src.serialization import artifact_state_file
+from src.utils import file_digest, load_object
+from dataclasses import dataclass, field
+
+import hashlib
+import os
+import sys
+import threading
+import time
+
+
+@dataclass
+class ModelCacheConfig:
+    model_path: str = os.path.join("artifacts", "model")
+    preprocessor_path: str = os.path.join("artifacts", "preprocessor")
+    check_interval: float = 1.0
+    verify_hash: bool = True
+    compile_preprocessor: bool = True
+    compile_model: bool = True
+    compile_tolerance: float = 1e-9
+    # When set, the paths above are ignored and the version named by the `pointer` file of this registry is served.
+    registry_root: str = field(default_factory=lambda: os.environ.get("MODEL_REGISTRY"))
+    pointer: str = CURRENT
+
+
+@dataclass(frozen=True)
+class ModelSnapshot:
+    """
+    An immutable model/preprocessor pair loaded together.
+
+    Attributes:
+        model: The fitted model.
+        preprocessor: The fitted preprocessor the model was trained with.
+        version (str): Identifier of the artifact contents the pair was loaded from: the registry version id when
+            served from a registry.
+        loaded_at (float): Unix timestamp of the load.
+        compiled_preprocessor (CompiledPreprocessor): NumPy version of the preprocessor for single records,
+            None if it was not compiled.
+        compiled_model (CompiledTrees): Vectorized version of a tree model, None if the model is not one or was
+            not compiled.
+        categories (dict): The categories the preprocessor was fitted with, as sets of strings keyed by column,
+            None if they cannot be read from it.
+    """
+    model: object
+    preprocessor: object
+    version: str
+    loaded_at: float
+    compiled_preprocessor: CompiledPreprocessor = None
+    compiled_model: CompiledTrees = None
+    categories: dict = None
+
+    @property
+    def predictor(self):
+        """
+        The object to call `predict` on: the compiled model if there is one, the model otherwise.
+        """
+        return self.compiled_model if self.compiled_model is not None else self.model
+
+
+def artifact_version(model_path: str, preprocessor_path: str) -> str:
+    """
+    Returns the version a ModelCache without a registry, verifying hashes, gives the pair at these paths, e.g.
+    to tie a lookup table to the model it was exported from.
+
+    Args:
+        model_path (str): The model artifact.
+        preprocessor_path (str): The preprocessor artifact.
+
+    Returns:
+        str: The version.
+    """
+    return _digest_version(tuple(file_digest(artifact_state_file(path)) for path in (model_path, preprocessor_path)))
+
+
+def _digest_version(digests: tuple) -> str:
+    return hashlib.sha256("".join(digests).encode()).hexdigest()[:12]
+
+
+def fitted_categories(preprocessor) -> dict:
+    """
+    Returns the categories the encoders of a fitted ColumnTransformer know, keyed by column.
+
+    Args:
+        preprocessor: The fitted preprocessor.
+
+    Returns:
+        dict: Set of the string categories of each encoded column, None if the preprocessor is not a fitted
+        ColumnTransformer.
+    """
+    if not hasattr(preprocessor, "transformers_"):
+        return None
+    categories = {}
+    for _, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        encoders = [step for _, step in getattr(transformer, "steps", [(None, transformer)]) if hasattr(step, "categories_")]
+        if encoders:
+            categories.update(
+                (column, frozenset(str(category) for category in values))
+                for column, values in zip(columns, encoders[0].categories_)
+            )
+    return categories
+
+
+class ModelCache:
+    """
+    Process-wide cache of the serving model and preprocessor.
+
+    Both artifacts are deserialized once and shared by every request. The files (the manifests of versioned
+    artifacts) are re-stat'ed at most every `check_interval` seconds; when their mtime or size changes (and, with `verify_hash`, their content
+    hash too) the pair is reloaded and swapped in as a single snapshot, so a request never sees a model
+    from one version with the preprocessor from another. With `registry_root` set, the pointer file is re-read
+    at the same pace and a promotion swaps in the version it names; requests in flight finish on the snapshot
+    they started with.
+
+    Args:
+        config (ModelCacheConfig): Paths of the artifacts and the invalidation settings.
+
+    Attributes:
+        config (ModelCacheConfig): Paths of the artifacts and the invalidation settings.
+        hits (int): Number of `get` calls served from the loaded snapshot.
+        misses (int): Number of `get` calls that had to load the artifacts because nothing was loaded yet.
+        reloads (int): Number of times a loaded snapshot was replaced because the artifacts changed.
+        on_change (callable): When set, called with the loaded version instead of reloading when the artifacts
+            change, see src.pipeline.prefork.
+
+    Methods:
+        get(): Returns the current ModelSnapshot, loading or reloading it if needed.
+        reload(): Loads the artifacts again and returns the new ModelSnapshot.
+        invalidate(): Forces the next `get` to reload the artifacts.
+        stats(): Returns the hit/miss/reload counters.
+    """
+    def __init__(self, config: ModelCacheConfig):
+        """
+        Initializes the ModelCache with the provided configuration. Nothing is loaded until the first `get`.
+
+        Args:
+            config (ModelCacheConfig): Paths of the artifacts and the invalidation settings.
+        """
+        self.config = config
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._snapshot = None
+        self._stamps = None
+        self._digests = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.on_change = None
+
+    def _source(self):
+        """
+        Returns the model path, the preprocessor path and the registry version they belong to (None without a registry).
+        """
+        if self.config.registry_root is None:
+            return self.config.model_path, self.config.preprocessor_path, None
+        registry = ModelRegistry(ModelRegistryConfig(root=self.config.registry_root))
+        pointer = registry.pointer(self.config.pointer)
+        if pointer is None:
+            raise CustomException(f"No {self.config.pointer} model version in the registry {self.config.registry_root}", sys)
+        return (*registry.paths(pointer["version"]), pointer["version"])
+
+    def _read_stamps(self, source):
+        stamps = [] if source[2] is None else [source[2]]
+        for path in source[:2]:
+            stat = os.stat(artifact_state_file(path))
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stamps)
+
+    def _read_digests(self, source):
+        digests = tuple(file_digest(artifact_state_file(path)) for path in source[:2])
+        return digests if source[2] is None else (source[2], *digests)
+
+    def _load(self, source, stamps, digests):
+        model_path, preprocessor_path, registry_version = source
+        model = load_object(model_path)
+        preprocessor = load_object(preprocessor_path)
+
+        if registry_version is not None:
+            version = registry_version
+        elif digests is not None:
+            version = _digest_version(digests)
+        else:
+            version = hashlib.sha256(repr(stamps).encode()).hexdigest()[:12]
+
+        compiled = None
+        if self.config.compile_preprocessor:
+            try:
+                compiled = CompiledPreprocessor(preprocessor)
+            except CustomException as e:
+                logging.info(f"Preprocessor not compiled, single records use the sklearn path: {e}")
+
+        compiled_model = None
+        if self.config.compile_model and CompiledTrees.supports(model):
+            compiled_model = self._compile_model(model)
+        elif self.config.compile_model and hasattr(model, "compile_members"):
+            # An EnsembleRegressor: its tree members predict through their compiled versions.
+            model.compile_members(lambda member: self._compile_model(member) if CompiledTrees.supports(member) else None)
+
+        self._snapshot = ModelSnapshot(
+            model, preprocessor, version, time.time(), compiled, compiled_model, fitted_categories(preprocessor)
+        )
+        self._stamps = stamps
+        self._digests = digests
+        logging.info(f"Loaded model version {version} from {model_path} and {preprocessor_path}")
+
+    def _compile_model(self, model):
+        try:
+            compiled = CompiledTrees(model)
+        except CustomException as e:
+            logging.info(f"Model not compiled, predicting with {type(model).__name__}.predict: {e}")
+            return None
+        error = compiled.verify(model)
+        if error > self.config.compile_tolerance:
+            logging.info(f"Compiled {type(model).__name__} differs from the model by {error}, not using it")
+            return None
+        logging.info(f"Compiled {type(model).__name__}: {compiled.n_trees} trees, {compiled.n_nodes} nodes")
+        return compiled
+
+    def _is_stale(self, source):
+        stamps = self._read_stamps(source)
+        if stamps == self._stamps:
+            return False, stamps, self._digests
+        if not self.config.verify_hash:
+            return True, stamps, None
+
+        digests = self._read_digests(source)
+        if digests == self._digests:
+            # Touched but not modified, remember the new stamps so we don't hash again.
+            self._stamps = stamps
+            return False, stamps, digests
+        return True, stamps, digests
+
+    def get(self) -> ModelSnapshot:
+        """
+        Returns the current model/preprocessor snapshot.
+
+        The first call loads the artifacts. Later calls return the loaded snapshot and, once every
+        `check_interval` seconds, check whether the files on disk changed and reload them if so. If a reload
+        fails (for example because the file is being rewritten) the previous snapshot keeps being served.
+
+        Returns:
+            ModelSnapshot: The loaded model and preprocessor.
+
+        Raises:
+            CustomException: If the artifacts cannot be loaded and no snapshot is available.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            try:
+                source = self._source()
+                if self._snapshot is None:
+                    self.misses += 1
+                    stamps = self._read_stamps(source)
+                    digests = self._read_digests(source) if self.config.verify_hash else None
+                    self._load(source, stamps, digests)
+                else:
+                    stale, stamps, digests = self._is_stale(source)
+                    if stale and self.on_change is not None:
+                        # Someone else reloads (e.g. a rolling worker restart): report the change once and keep
+                        # serving the loaded snapshot.
+                        self._stamps, self._digests = stamps, digests
+                        self.on_change(self._snapshot.version)
+                    elif stale:
+                        self.reloads += 1
+                        self._load(source, stamps, digests)
+                    else:
+                        self.hits += 1
+            except Exception as e:
+                if self._snapshot is None:
+                    raise CustomException(str(e), sys)
+                logging.info(f"Model reload failed, serving version {self._snapshot.version}: {e}")
+            self._next_check = time.monotonic() + self.config.check_interval
+            return self._snapshot
+
+    def reload(self) -> ModelSnapshot:
+        """
+        Loads the artifacts again regardless of their stamps and swaps the new snapshot in.
+
+        Returns:
+            ModelSnapshot: The new snapshot.
+
+        Raises:
+            CustomException: If the artifacts cannot be loaded. The previous snapshot, if any, keeps being served.
+        """
+        with self._lock:
+            try:
+                source = self._source()
+                stamps = self._read_stamps(source)
+                digests = self._read_digests(source) if self.config.verify_hash else None
+                self._load(source, stamps, digests)
+            except Exception as e:
+                raise CustomException(str(e), sys)
+            self.reloads += 1
+            self._next_check = time.monotonic() + self.config.check_interval
+            return self._snapshot
+
+    def invalidate(self):
+        """
+        Forces the next `get` to reload the artifacts regardless of their stamps.
+        """
+        with self._lock:
+            self._stamps = None
+            self._digests = None
+            self._next_check = 0.0
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters and the loaded version.
+
+        Returns:
+            dict: The `hits`, `misses` and `reloads` counters and the loaded `version` (None if nothing is loaded).
+        """
+        snapshot = self._snapshot
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "version": snapshot.version if snapshot is not None else None,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_model_cache(config: ModelCacheConfig = None) -> ModelCache:
+    """
+    Returns the process-wide ModelCache, creating it on first use.
+
+    Args:
+        config (ModelCacheConfig): Configuration used when the cache is created. Ignored afterwards.
+
+    Returns:
+        ModelCache: The shared cache.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ModelCache(config or ModelCacheConfig())
+    return _cache
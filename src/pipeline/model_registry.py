@@ -0,0 +1,330 @@
+"""
+Local on-disk registry of trained model versions.
+
+Usage:
+    python -m src.pipeline.model_registry list
+    python -m src.pipeline.model_registry promote VERSION
+    python -m src.pipeline.model_registry rollback
+    python -m src.pipeline.model_registry candidate VERSION [--mode shadow|ab] [--fraction 0.1]
+    python -m src.pipeline.model_registry clear-candidate
+    python -m src.pipeline.model_registry prune [--keep 10]
+
+Layout, under the registry root (artifacts/registry by default):
+
+    versions/<version>/model           the model artifact
+    versions/<version>/preprocessor    the preprocessor it was trained with
+    versions/<version>/metrics.json    the training metrics and when the version was registered
+    CURRENT                            {"version", "previous", "promoted_at"}: the version to serve
+    CANDIDATE                          {"version", "mode", "fraction"}: a version to try on part of the traffic
+
+A version directory is built under a temporary name and renamed into place, and is never modified afterwards.
+The pointers are written to a temporary file and swapped in with os.replace, so a reader sees either the old or
+the new pointer and the version it names is always complete. Serving follows the pointers when
+ModelCacheConfig.registry_root is set (the MODEL_REGISTRY environment variable), see src.pipeline.model_cache and
+src.pipeline.candidate_router.
+"""
+from src.exception import CustomException
+from src.logger import logging
+from src.serialization import artifact_state_file, resolve_artifact
+from src.utils import file_digest
+from dataclasses import dataclass
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+CURRENT = "CURRENT"
+CANDIDATE = "CANDIDATE"
+MODES = ("shadow", "ab")
+
+
+@dataclass
+class ModelRegistryConfig:
+    root: str = os.path.join("artifacts", "registry")
+    keep: int = 10
+
+
+class ModelRegistry:
+    """
+    Versioned model/preprocessor pairs with a promoted "current" version and an optional candidate.
+
+    Args:
+        config (ModelRegistryConfig): Location of the registry and how many versions `prune` keeps.
+
+    Attributes:
+        config (ModelRegistryConfig): Location of the registry and how many versions `prune` keeps.
+
+    Methods:
+        register(model_path, preprocessor_path, metrics): Copies a trained pair into a new version.
+        versions(): Returns the registered versions, oldest first.
+        paths(version): Returns the model and preprocessor paths of a version.
+        pointer(name): Returns the contents of the CURRENT or CANDIDATE pointer.
+        promote(version): Makes a version the one to serve.
+        rollback(): Serves the version promoted before the current one again.
+        set_candidate(version, mode, fraction): Tries a version on a fraction of the traffic.
+        clear_candidate(): Stops trying the candidate.
+        prune(keep): Deletes the oldest versions that no pointer names.
+    """
+    def __init__(self, config: ModelRegistryConfig):
+        """
+        Initializes the ModelRegistry with the provided configuration.
+
+        Args:
+            config (ModelRegistryConfig): Location of the registry and how many versions `prune` keeps.
+        """
+        self.config = config
+
+    def _version_dir(self, version: str) -> str:
+        return os.path.join(self.config.root, "versions", version)
+
+    def _write_json(self, path: str, data: dict):
+        staging = f"{path}.tmp-{os.getpid()}"
+        with open(staging, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(staging, path)
+
+    def register(self, model_path: str, preprocessor_path: str, metrics: dict = None) -> str:
+        """
+        Copies a trained model and its preprocessor into a new, immutable version.
+
+        The version id is the UTC registration time followed by a hash of the two artifacts, so ids sort in
+        registration order. Registering artifacts that are already in the registry (e.g. a training run answered
+        from the stage cache) returns their existing version.
+
+        Args:
+            model_path (str): The model artifact.
+            preprocessor_path (str): The preprocessor artifact.
+            metrics (dict): JSON-serializable training metrics to keep with the version.
+
+        Returns:
+            str: The version id.
+
+        Raises:
+            CustomException: If the artifacts cannot be copied.
+        """
+        try:
+            sources = {"model": resolve_artifact(model_path), "preprocessor": resolve_artifact(preprocessor_path)}
+            digest = hashlib.sha256("".join(file_digest(artifact_state_file(path)) for path in sources.values()).encode())
+            content = digest.hexdigest()[:8]
+            parent = os.path.join(self.config.root, "versions")
+            os.makedirs(parent, exist_ok=True)
+            for existing in os.listdir(parent):
+                if existing.endswith(f"-{content}") and not existing.startswith("."):
+                    return existing
+
+            version = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{content}"
+            target = self._version_dir(version)
+            staging = tempfile.mkdtemp(dir=parent, prefix=f".{version}-")
+            os.chmod(staging, 0o755)
+            for name, source in sources.items():
+                # Legacy artifacts are `<name>.pkl` files, which load_object finds from `<name>`.
+                destination = os.path.join(staging, name + (".pkl" if os.path.isfile(source) else ""))
+                if os.path.isdir(source):
+                    shutil.copytree(source, destination)
+                else:
+                    shutil.copy2(source, destination)
+            self._write_json(os.path.join(staging, "metrics.json"), {**(metrics or {}), "registered_at": time.time()})
+            os.rename(staging, target)
+            logging.info(f"Registered model version {version} from {model_path} and {preprocessor_path}")
+            return version
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    def versions(self) -> list:
+        """
+        Returns the registered versions, oldest first.
+
+        Returns:
+            list: One dict per version: its `version` id, its `metrics` and whether it is `current` or the `candidate`.
+        """
+        directory = os.path.join(self.config.root, "versions")
+        if not os.path.isdir(directory):
+            return []
+        current = (self.pointer(CURRENT) or {}).get("version")
+        candidate = (self.pointer(CANDIDATE) or {}).get("version")
+        versions = []
+        for version in sorted(name for name in os.listdir(directory) if not name.startswith(".")):
+            with open(os.path.join(directory, version, "metrics.json")) as f:
+                metrics = json.load(f)
+            versions.append({
+                "version": version, "metrics": metrics, "current": version == current, "candidate": version == candidate
+            })
+        return versions
+
+    def paths(self, version: str) -> tuple:
+        """
+        Returns the model and preprocessor paths of a version, to pass to `load_object`.
+
+        Args:
+            version (str): The version id.
+
+        Returns:
+            tuple: (model path, preprocessor path).
+
+        Raises:
+            CustomException: If the version does not exist.
+        """
+        directory = self._version_dir(version)
+        if not os.path.isdir(directory):
+            raise CustomException(f"Model version {version} is not in the registry {self.config.root}", sys)
+        return os.path.join(directory, "model"), os.path.join(directory, "preprocessor")
+
+    def pointer(self, name: str = CURRENT) -> dict:
+        """
+        Returns the contents of a pointer.
+
+        Args:
+            name (str): CURRENT or CANDIDATE.
+
+        Returns:
+            dict: The pointer, None if it is not set.
+        """
+        try:
+            with open(os.path.join(self.config.root, name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def promote(self, version: str) -> dict:
+        """
+        Makes a version the one to serve. Servers swap it in at their next check, finishing the requests already
+        started on the previous version. The candidate pointer is cleared if it named this version.
+
+        Args:
+            version (str): The version id.
+
+        Returns:
+            dict: The new CURRENT pointer.
+
+        Raises:
+            CustomException: If the version does not exist.
+        """
+        self.paths(version)
+        previous = (self.pointer(CURRENT) or {}).get("version")
+        pointer = {"version": version, "previous": previous, "promoted_at": time.time()}
+        self._write_json(os.path.join(self.config.root, CURRENT), pointer)
+        if (self.pointer(CANDIDATE) or {}).get("version") == version:
+            self.clear_candidate()
+        logging.info(f"Promoted model version {version} (previously {previous})")
+        return pointer
+
+    def rollback(self) -> dict:
+        """
+        Promotes the version that was current before the current one. Rolling back twice swaps them back.
+
+        Returns:
+            dict: The new CURRENT pointer.
+
+        Raises:
+            CustomException: If no version was promoted before the current one.
+        """
+        previous = (self.pointer(CURRENT) or {}).get("previous")
+        if previous is None:
+            raise CustomException("No previous model version to roll back to", sys)
+        return self.promote(previous)
+
+    def set_candidate(self, version: str, mode: str = "shadow", fraction: float = 0.1) -> dict:
+        """
+        Tries a version on a fraction of the traffic next to the current one.
+
+        Args:
+            version (str): The version id.
+            mode (str): "shadow" to also score the fraction of requests with the candidate, off the request path,
+                and record how its predictions differ; "ab" to answer the fraction of requests with the candidate.
+            fraction (float): The fraction of requests, in [0, 1].
+
+        Returns:
+            dict: The new CANDIDATE pointer.
+
+        Raises:
+            CustomException: If the version does not exist, or the mode or fraction is invalid.
+        """
+        self.paths(version)
+        if mode not in MODES:
+            raise CustomException(f"Unknown candidate mode {mode!r}, expected one of {MODES}", sys)
+        if not 0.0 <= fraction <= 1.0:
+            raise CustomException(f"Candidate fraction must be in [0, 1], got {fraction}", sys)
+        pointer = {"version": version, "mode": mode, "fraction": fraction, "set_at": time.time()}
+        self._write_json(os.path.join(self.config.root, CANDIDATE), pointer)
+        logging.info(f"Candidate model version {version}: {mode} on {fraction:.1%} of the requests")
+        return pointer
+
+    def clear_candidate(self):
+        """
+        Removes the candidate pointer.
+        """
+        try:
+            os.remove(os.path.join(self.config.root, CANDIDATE))
+            logging.info("Candidate model version cleared")
+        except FileNotFoundError:
+            pass
+
+    def prune(self, keep: int = None) -> list:
+        """
+        Deletes the oldest versions beyond the `keep` most recent, sparing those the pointers name (including the
+        rollback target). Processes still serving a deleted version keep their loaded copy.
+
+        Args:
+            keep (int): Number of recent versions to keep. Defaults to `config.keep`.
+
+        Returns:
+            list: The deleted version ids.
+        """
+        keep = self.config.keep if keep is None else keep
+        current = self.pointer(CURRENT) or {}
+        named = {current.get("version"), current.get("previous"), (self.pointer(CANDIDATE) or {}).get("version")}
+        versions = [entry["version"] for entry in self.versions()]
+        deleted = [version for version in versions[:max(len(versions) - keep, 0)] if version not in named]
+        for version in deleted:
+            # Renamed away first so no reader ever sees a half-deleted version.
+            retired = tempfile.mkdtemp(dir=os.path.dirname(self._version_dir(version)), prefix=".deleted-")
+            os.rename(self._version_dir(version), os.path.join(retired, version))
+            shutil.rmtree(retired, ignore_errors=True)
+        if deleted:
+            logging.info(f"Pruned model versions {deleted}")
+        return deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=ModelRegistryConfig.root)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    commands.add_parser("promote").add_argument("version")
+    commands.add_parser("rollback")
+    candidate = commands.add_parser("candidate")
+    candidate.add_argument("version")
+    candidate.add_argument("--mode", choices=MODES, default="shadow")
+    candidate.add_argument("--fraction", type=float, default=0.1)
+    commands.add_parser("clear-candidate")
+    commands.add_parser("prune").add_argument("--keep", type=int, default=ModelRegistryConfig.keep)
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(ModelRegistryConfig(root=args.root))
+    if args.command == "list":
+        for entry in registry.versions():
+            marker = "*" if entry["current"] else ("c" if entry["candidate"] else " ")
+            metrics = {key: value for key, value in entry["metrics"].items() if key != "registered_at"}
+            print(f"{marker} {entry['version']}  {json.dumps(metrics)}")
+    elif args.command == "promote":
+        print(registry.promote(args.version))
+    elif args.command == "rollback":
+        print(registry.rollback())
+    elif args.command == "candidate":
+        print(registry.set_candidate(args.version, args.mode, args.fraction))
+    elif args.command == "clear-candidate":
+        registry.clear_candidate()
+    elif args.command == "prune":
+        print(registry.prune(args.keep))
+
+
+if __name__ == "__main__":
+    main()
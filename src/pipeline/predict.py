@@ -1,8 +1,39 @@
 from src.exception import CustomException
-from src.utils import load_object
+from src.instrumentation import span
+from src.pipeline.candidate_router import CandidateRouter, get_candidate_router
+from src.pipeline.model_cache import ModelCache, get_model_cache
+from src.pipeline.prediction_cache import PredictionCache, get_prediction_cache, normalize_value
+from src.utils import as_model_input
 
 import sys
-import pandas as pd
+import numpy as np
+
+# pandas is imported by the methods building DataFrames: the compiled single-record path never needs it.
+
+
+FEATURE_COLUMNS = [
+    "gender",
+    "race_ethnicity",
+    "parental_level_of_education",
+    "lunch",
+    "test_preparation_course",
+    "reading_score",
+    "writing_score"
+]
+SCORE_COLUMNS = ["reading_score", "writing_score"]
+
+
+def feature_key(values) -> tuple:
+    """
+    Returns the prediction cache key of one student: their feature values in FEATURE_COLUMNS order, normalized.
+
+    Args:
+        values (iterable): The feature values in FEATURE_COLUMNS order.
+
+    Returns:
+        tuple: The cache key.
+    """
+    return tuple(normalize_value(value, column in SCORE_COLUMNS) for column, value in zip(FEATURE_COLUMNS, values))
 
 
 class CustomData:
@@ -19,6 +50,9 @@ class CustomData:
         - writing_score: student's writing score
 
     Methods:
+        - from_record: builds a CustomData object from a dict keyed by the feature names
+        - from_form: builds a CustomData object from the fields of the prediction form
+        - get_data_dict: returns the student's data as a dict keyed by the feature names
         - get_data_df: returns a pandas DataFrame containing the student's data
     """
     def __init__(self, gender, race_ethnicity, parental_level_of_education, lunch, test_preparation_course, reading_score, writing_score):
@@ -44,6 +78,89 @@ class CustomData:
         self.test_preparation_course = test_preparation_course
         self.reading_score = reading_score
         self.writing_score = writing_score
+
+    @classmethod
+    def from_record(cls, record: dict, categories: dict = None):
+        """
+        Builds a CustomData object from a dict keyed by the feature names, e.g. one record of a JSON request.
+
+        Args:
+            - record: dict with one entry per name in FEATURE_COLUMNS
+            - categories: allowed values of the categorical features keyed by column, e.g. ModelSnapshot.categories.
+
+        A null categorical feature is turned into NaN, which the preprocessor imputes with the most frequent
+        category. Left as None it would reach the encoder as an unknown category: SimpleImputer only treats NaN
+        as missing in text columns.
+
+        Returns:
+            CustomData: The student's data.
+
+        Raises:
+            ValueError: If the record is not a dict, a feature is missing, a score is not a number or a categorical
+                feature is not one of its `categories`.
+        """
+        if not isinstance(record, dict):
+            raise ValueError(f"Expected a JSON object per record, got {type(record).__name__}")
+        missing = [column for column in FEATURE_COLUMNS if column not in record]
+        if missing:
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+        values = {column: record[column] for column in FEATURE_COLUMNS}
+        for column in SCORE_COLUMNS:
+            try:
+                values[column] = float(values[column])
+            except (TypeError, ValueError):
+                raise ValueError(f"Field {column} must be a number, got {values[column]!r}")
+        for column in FEATURE_COLUMNS:
+            value = values[column]
+            if column not in SCORE_COLUMNS and (value is None or (isinstance(value, float) and np.isnan(value))):
+                values[column] = np.nan
+        for column, allowed in (categories or {}).items():
+            value = values.get(column)
+            if isinstance(value, float) and np.isnan(value):
+                continue
+            if not (isinstance(value, str) and value in allowed):
+                raise ValueError(f"Field {column} must be one of {sorted(allowed)}, got {value!r}")
+        return cls(**values)
+
+    @classmethod
+    def from_form(cls, form):
+        """
+        Builds a CustomData object from the fields of the form in templates/home.html.
+
+        Args:
+            - form: mapping of the submitted form fields
+
+        Returns:
+            CustomData: The student's data.
+
+        Raises:
+            ValueError: If a score is missing or not a number.
+        """
+        try:
+            # The form's score inputs are labelled the other way round from their names, hence the swap.
+            reading_score = float(form.get('writing_score'))
+            writing_score = float(form.get('reading_score'))
+        except (TypeError, ValueError):
+            raise ValueError("Both scores must be numbers")
+        return cls(
+            gender=form.get('gender'),
+            race_ethnicity=form.get('ethnicity'),
+            parental_level_of_education=form.get('parental_level_of_education'),
+            lunch=form.get('lunch'),
+            test_preparation_course=form.get('test_preparation_course'),
+            reading_score=reading_score,
+            writing_score=writing_score
+        )
+
+    def get_data_dict(self):
+        """
+        Returns the student's data as a dict keyed by the feature names.
+
+        Returns:
+            dict: The student's data.
+        """
+        return {column: getattr(self, column) for column in FEATURE_COLUMNS}
     
     def get_data_df(self):
         """
@@ -64,6 +181,8 @@ class CustomData:
             print(data_df)
         """
         try:
+            import pandas as pd
+
             data_df = pd.DataFrame({
                 "gender": [self.gender],
                 "race_ethnicity": [self.race_ethnicity],
@@ -83,19 +202,45 @@ class PredictPipeline:
     PredictPipeline class to predict the outcome of a given input.
 
     Attributes:
-        - None
+        - cache: ModelCache the model and preprocessor are taken from
+        - prediction_cache: PredictionCache repeated inputs are answered from
+        - router: CandidateRouter sending part of the requests to a candidate model version, or None
 
     Methods:
-        - __init__(self): Initializes the PredictPipeline object.
+        - __init__(self, cache, prediction_cache, router): Initializes the PredictPipeline object.
         - predict(self, features): Predicts the outcome of the given input features.
+        - predict_batch(self, data): Predicts the outcome of several CustomData objects in one call.
+        - predict_record(self, data): Predicts the outcome of one CustomData object without pandas.
     """
-    def __init__(self):
-        pass
+    def __init__(self, cache: ModelCache = None, prediction_cache: PredictionCache = None, router: CandidateRouter = None):
+        """
+        Initialize a PredictPipeline object.
+
+        Args:
+            - cache: ModelCache to take the model and preprocessor from. Defaults to the process-wide cache, so the
+              artifacts are only deserialized once per worker.
+            - prediction_cache: PredictionCache to answer repeated inputs from. Defaults to the process-wide cache.
+            - router: CandidateRouter for A/B or shadow scoring of a candidate version. Defaults to the process-wide
+              router (None without a model registry) when the process-wide cache is used, to none otherwise.
+
+        Returns:
+            None
+        """
+        if router is None and cache is None:
+            router = get_candidate_router()
+        self.cache = cache if cache is not None else get_model_cache()
+        self.prediction_cache = prediction_cache if prediction_cache is not None else get_prediction_cache()
+        self.router = router
 
     def predict(self, featutres):
         """
         Predicts the outcome of the given input features.
 
+        When the features are a DataFrame with every column of FEATURE_COLUMNS, rows whose normalized values were
+        already predicted by the loaded model version are answered from the prediction cache, and only the
+        remaining rows go through the preprocessor and the model. Requests the router draws for an A/B candidate
+        are answered by the candidate, bypassing the prediction cache, which holds a single version.
+
         Args:
             features (dict): A dictionary containing the input features.
 
@@ -111,15 +256,127 @@ class PredictPipeline:
             print(prediction)
         """
         try:
-            model_path = "artifacts\model.pkl"
-            preprocessor_path = "artifacts\preprocessor.pkl"
+            snapshot = self.cache.get()
+            candidate, mode = self.router.route(snapshot) if self.router is not None else (None, None)
+            if mode == "ab":
+                prediction = self._predict_uncached(candidate, featutres)
+                self.router.record(candidate, "candidate", len(prediction))
+                return prediction
+
+            prediction = self._predict_cached(snapshot, featutres)
+            if self.router is not None:
+                self.router.record(snapshot, "current", len(prediction))
+                if mode == "shadow":
+                    self.router.shadow(lambda: self._predict_uncached(candidate, featutres), prediction)
+            return prediction
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    def _predict_cached(self, snapshot, featutres):
+        import pandas as pd
+
+        if not self.prediction_cache.config.enabled or not isinstance(featutres, pd.DataFrame) \
+                or not set(FEATURE_COLUMNS).issubset(featutres.columns):
+            return self._predict_uncached(snapshot, featutres)
+
+        with span("predict.cache_lookup"):
+            keys = [feature_key(row) for row in featutres[FEATURE_COLUMNS].itertuples(index=False, name=None)]
+            cached = self.prediction_cache.get_many(snapshot.version, keys)
+        missing = [i for i, value in enumerate(cached) if value is None]
+        if not missing:
+            return np.asarray(cached)
+
+        computed = self._predict_uncached(snapshot, featutres.iloc[missing])
+        self.prediction_cache.put_many(snapshot.version, [keys[i] for i in missing], computed)
+        if len(missing) == len(keys):
+            return computed
+
+        prediction = np.empty(len(keys), dtype=computed.dtype)
+        prediction[missing] = computed
+        hit = [i for i, value in enumerate(cached) if value is not None]
+        prediction[hit] = [cached[i] for i in hit]
+        return prediction
+
+    def _predict_uncached(self, snapshot, features):
+        with span("predict.transform"):
+            preprocessed_data = as_model_input(snapshot.model, snapshot.preprocessor.transform(features))
+        with span("predict.model"):
+            return np.ravel(snapshot.predictor.predict(preprocessed_data))
+
+    def predict_batch(self, data: list):
+        """
+        Predicts the outcome of several students with a single transform and predict call.
+
+        Args:
+            data (list): A list of CustomData objects.
+
+        Returns:
+            numpy.ndarray: One prediction per CustomData object, in the same order.
+
+        Raises:
+            CustomException: If an exception occurs during the prediction process.
+        """
+        try:
+            import pandas as pd
+
+            with span("predict.build_dataframe"):
+                features = pd.DataFrame.from_records([item.get_data_dict() for item in data], columns=FEATURE_COLUMNS)
+            return self.predict(features)
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    def predict_record(self, data: CustomData):
+        """
+        Predicts the outcome of a single student.
+
+        The record goes through the compiled preprocessor of the loaded snapshot, skipping the DataFrame and
+        sklearn pipeline overhead. Falls back to the DataFrame path when the preprocessor could not be compiled. A
+        record already predicted by the loaded model version is answered from the prediction cache. Records are
+        routed to a candidate version like in `predict`.
 
-            model = load_object(model_path)
-            preprocessor = load_object(preprocessor_path)
+        Args:
+            data (CustomData): The student's data.
+
+        Returns:
+            numpy.ndarray: An array holding the single prediction.
 
-            preprocessed_data = preprocessor.transform(featutres)
-            prediction = model.predict(preprocessed_data)
+        Raises:
+            CustomException: If an exception occurs during the prediction process.
+        """
+        try:
+            snapshot = self.cache.get()
+            candidate, mode = self.router.route(snapshot) if self.router is not None else (None, None)
+            if mode == "ab":
+                prediction = self._predict_record(candidate, data, use_cache=False)
+                self.router.record(candidate, "candidate")
+                return prediction
 
+            prediction = self._predict_record(snapshot, data)
+            if self.router is not None:
+                self.router.record(snapshot, "current")
+                if mode == "shadow":
+                    self.router.shadow(lambda: self._predict_record(candidate, data, use_cache=False), prediction)
             return prediction
         except Exception as e:
             raise CustomException(str(e), sys)
+
+    def _predict_record(self, snapshot, data: CustomData, use_cache: bool = True):
+        if snapshot.compiled_preprocessor is None:
+            features = data.get_data_df()
+            return self._predict_cached(snapshot, features) if use_cache else self._predict_uncached(snapshot, features)
+
+        record = data.get_data_dict()
+        if use_cache:
+            with span("predict.cache_lookup"):
+                key = feature_key(record[column] for column in FEATURE_COLUMNS)
+                cached = self.prediction_cache.get_many(snapshot.version, [key])[0]
+            if cached is not None:
+                return np.asarray([cached])
+
+        with span("predict.transform", compiled="true"):
+            features = snapshot.compiled_preprocessor.transform_record(record)
+        with span("predict.model"):
+            prediction = np.ravel(snapshot.predictor.predict(features.reshape(1, -1)))
+        if use_cache:
+            self.prediction_cache.put_many(snapshot.version, [key], prediction)
+        return prediction
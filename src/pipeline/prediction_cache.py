@@ -0,0 +1,189 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import math
+import threading
+import time
+
+
+@dataclass
+class PredictionCacheConfig:
+    max_entries: int = 100_000
+    ttl: float = 3600.0
+    enabled: bool = True
+
+
+def normalize_value(value, is_score: bool):
+    """
+    Returns the hashable form of one feature value used in cache keys.
+
+    Scores are compared as floats, so 70, 70.0 and "70" share an entry. Missing values get a fixed marker because
+    NaN never equals itself; None stays distinct from NaN for categoricals since the preprocessor treats them
+    differently. A categorical that is not a string keeps its type in the key: the encoder does not treat 1 and
+    "1", or True and "True", as the same category.
+
+    Args:
+        value: The feature value.
+        is_score (bool): Whether the feature is one of the numeric scores.
+
+    Returns:
+        object: The normalized value.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return "<nan>"
+    if is_score:
+        value = float(value)
+        return "<nan>" if math.isnan(value) else value
+    return value if isinstance(value, str) else (type(value).__name__, value)
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions keyed on normalized feature tuples.
+
+    The model input space is small and traffic repeats the same combinations, so a cached prediction lets a
+    request skip the preprocessor and the model entirely. Entries belong to one model version: as soon as a
+    lookup is made with another version (the ModelCache swapped in new artifacts) the whole cache is dropped.
+    At most `max_entries` predictions are kept, the least recently used being evicted first, and each one
+    expires `ttl` seconds after it was stored (never if `ttl` is None).
+
+    Args:
+        config (PredictionCacheConfig): Size cap, TTL and switch of the cache.
+
+    Attributes:
+        config (PredictionCacheConfig): Size cap, TTL and switch of the cache.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that were not cached, had expired or were dropped with an old model version.
+        evictions (int): Entries dropped to stay under `max_entries`.
+        invalidations (int): Times the cache was cleared because the model version changed.
+
+    Methods:
+        get_many(version, keys): Returns the cached prediction of each key, None where there is none.
+        put_many(version, keys, predictions): Stores predictions for the given keys.
+        clear(): Drops every entry.
+        stats(): Returns the counters and the hit rate.
+    """
+    def __init__(self, config: PredictionCacheConfig):
+        """
+        Initializes the PredictionCache with the provided configuration.
+
+        Args:
+            config (PredictionCacheConfig): Size cap, TTL and switch of the cache.
+        """
+        self.config = config
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get_many(self, version: str, keys: list) -> list:
+        """
+        Returns the cached prediction of each key.
+
+        Args:
+            version (str): Version of the loaded model, see ModelSnapshot.
+            keys (list): Normalized feature tuples.
+
+        Returns:
+            list: The cached prediction for each key, None where there is none.
+        """
+        if not self.config.enabled:
+            return [None] * len(keys)
+
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            self._check_version(version)
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results.append(entry[0])
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+                    results.append(None)
+        return results
+
+    def put_many(self, version: str, keys: list, predictions):
+        """
+        Stores predictions for the given keys, evicting the least recently used entries past `max_entries`.
+
+        Args:
+            version (str): Version of the model that made the predictions.
+            keys (list): Normalized feature tuples.
+            predictions (iterable): One prediction per key.
+        """
+        if not self.config.enabled:
+            return
+
+        expires = time.monotonic() + self.config.ttl if self.config.ttl is not None else None
+        with self._lock:
+            self._check_version(version)
+            for key, prediction in zip(keys, predictions):
+                self._entries[key] = (prediction, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.config.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The `hits`, `misses`, `evictions` and `invalidations` counters, the `hit_rate` and the number of
+                `entries` held.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache(config: PredictionCacheConfig = None) -> PredictionCache:
+    """
+    Returns the process-wide PredictionCache, creating it on first use.
+
+    Args:
+        config (PredictionCacheConfig): Configuration used when the cache is created. Ignored afterwards.
+
+    Returns:
+        PredictionCache: The shared cache.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache(config or PredictionCacheConfig())
+    return _cache
@@ -0,0 +1,115 @@
+"""
+Pre-fork model loading for the gunicorn launcher (gunicorn.conf.py).
+
+With `preload_app` the serving app is imported once in the gunicorn master; `load_in_master` then loads the model
+and preprocessor into the process-wide ModelCache before any worker is forked, so every worker starts with the
+snapshot already in memory and shares its pages with the master copy-on-write instead of deserializing its own.
+Versioned artifacts keep their large arrays in memory-mapped files, which are shared page cache regardless; the
+freeze below keeps the rest of the object graph (estimators, trees, Python containers) shared too: `gc.freeze`
+moves every object to a permanent generation the collector never traverses, so a collection in a worker does not
+write to their GC headers and dirty the pages.
+
+Workers never reload the model themselves. When the cache of a worker sees the artifacts change it asks the
+master to reload (SIGHUP, at most once per generation for all the workers); gunicorn's reload hook loads the new
+snapshot in the master, refreezes, and gunicorn replaces the workers with fresh forks while the old ones finish
+their in-flight requests (graceful_timeout): a rolling restart. `kill -HUP <master pid>` does the same by hand.
+
+The master must not serve predictions: XGBoost and CatBoost start OpenMP thread pools on first use, and those do
+not survive a fork. The only predictions it makes are the ones ModelCache runs to verify a compiled tree model
+(CompiledTrees.verify), and those models are sklearn trees and forests, whose predict starts no thread pool that
+outlives the call.
+"""
+from src.exception import CustomException
+from src.logger import logging
+from src.pipeline.model_cache import get_model_cache
+
+import gc
+import multiprocessing
+import os
+import signal
+
+
+# Shared with the workers through fork: the model generation loaded in the master and the latest generation a
+# worker asked for, so that only the first worker to see a change signals the master.
+_generation = None
+_requested = None
+_worker_generation = 0
+
+
+def load_in_master():
+    """
+    Loads the serving snapshot in the gunicorn master and freezes the heap before the workers are forked.
+
+    If nothing can be loaded yet (no trained model, no CURRENT version in the registry) the master starts anyway
+    and each worker loads the model itself on its first request.
+    """
+    global _generation, _requested
+    if _generation is None:
+        _generation = multiprocessing.Value("q", 0, lock=False)
+        _requested = multiprocessing.Value("q", 0)
+
+    try:
+        snapshot = get_model_cache().get()
+    except CustomException as e:
+        logging.info(f"No model loaded before fork, the workers load it on first use: {e}")
+        return
+    _freeze(snapshot)
+
+
+def reload_in_master():
+    """
+    Reloads the serving snapshot in the gunicorn master, before gunicorn forks the replacement workers.
+
+    The generation only moves on once the new snapshot is loaded. If the reload fails the master keeps the
+    previous snapshot, the replacement workers are forked with it, and the workers do not ask again until the
+    next successful reload: send SIGHUP by hand once the artifacts are fixed.
+    """
+    # Unfreeze so that the objects of the previous snapshot can be collected once it is replaced.
+    gc.unfreeze()
+    try:
+        snapshot = get_model_cache().reload()
+    except CustomException as e:
+        logging.info(f"Model reload failed in the master, keeping the loaded snapshot: {e}")
+        gc.freeze()
+        return
+    if _generation is not None:
+        _generation.value = max(_generation.value + 1, _requested.value)
+    _freeze(snapshot)
+
+
+def _freeze(snapshot):
+    gc.collect()
+    gc.freeze()
+    # No generation if the reload hook runs without load_in_master having run first.
+    generation = _generation.value if _generation is not None else None
+    logging.info(
+        f"Loaded model version {snapshot.version} (generation {generation}) before fork, "
+        f"{gc.get_freeze_count()} objects frozen"
+    )
+
+
+def request_reload(version: str = None):
+    """
+    Asks the master for a rolling restart on the new artifacts. Called by the ModelCache of a worker.
+
+    Args:
+        version (str): The version the worker is serving, for the log.
+    """
+    with _requested.get_lock():
+        if _requested.value > _worker_generation:
+            return
+        _requested.value = _worker_generation + 1
+    logging.info(f"Artifacts changed while serving version {version}, asking master {os.getppid()} to reload")
+    os.kill(os.getppid(), signal.SIGHUP)
+
+
+def init_worker():
+    """
+    Sets up a freshly forked worker: records the generation it was forked with and routes artifact changes to
+    the master. Outside a preloaded master (e.g. without `preload_app`) the worker reloads on its own as usual.
+    """
+    global _worker_generation
+    if _generation is None:
+        return
+    _worker_generation = _generation.value
+    get_model_cache().on_change = request_reload
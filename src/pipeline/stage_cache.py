@@ -0,0 +1,256 @@
+from src.exception import CustomException
+from src.logger import logging
+from src.serialization import copy_artifact
+from src.utils import file_digest
+from dataclasses import dataclass
+from scipy import sparse
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+
+@dataclass
+class StageCacheConfig:
+    cache_dir: str = os.path.join("artifacts", "cache")
+    max_bytes: int = 2 << 30
+    enabled: bool = True
+
+
+def config_fingerprint(config) -> dict:
+    """
+    Returns the public, non-callable attributes of a config object, including the ones declared without a type
+    annotation (which dataclasses do not treat as fields).
+
+    Args:
+        config: The config object.
+
+    Returns:
+        dict: Attribute name to value.
+    """
+    values = {}
+    for name in dir(config):
+        value = getattr(config, name)
+        if not name.startswith("_") and not callable(value):
+            values[name] = value
+    return values
+
+
+def _path_digest(path: str) -> str:
+    if not os.path.isdir(path):
+        return file_digest(path)
+    digest = hashlib.sha256()
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(file_digest(file_path).encode())
+    return digest.hexdigest()
+
+
+def _copy(source: str, target: str):
+    if not os.path.isdir(source):
+        shutil.copyfile(source, target)
+        return
+
+    # Build the copy next to the target and swap it in, so readers never see a partial directory.
+    staging = target + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.copytree(source, staging)
+    if os.path.isdir(target):
+        retired = target + ".old"
+        shutil.rmtree(retired, ignore_errors=True)
+        os.rename(target, retired)
+        os.rename(staging, target)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        if os.path.exists(target):
+            os.remove(target)
+        os.rename(staging, target)
+
+
+def _directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+
+class StageCache:
+    """
+    Content-addressed cache of the outputs of the training pipeline stages.
+
+    A stage's cache key hashes everything its outputs depend on: the contents of its input files, its config,
+    the source code of the modules implementing it and any upstream keys. When the key is found, the stage is
+    skipped and its outputs are restored: files are copied back to where the stage would have written them,
+    arrays and JSON values are returned. Entries are written atomically and the least recently used ones are
+    evicted once the cache grows past `max_bytes`.
+
+    Args:
+        config (StageCacheConfig): Location, size cap and switch of the cache.
+
+    Attributes:
+        config (StageCacheConfig): Location, size cap and switch of the cache.
+
+    Methods:
+        key(stage, config, input_paths, modules, upstream): Returns the cache key of a stage run.
+        load(stage, key): Returns the cached outputs of a stage run, or None.
+        save(stage, key, files, arrays, values): Stores the outputs of a stage run.
+    """
+    def __init__(self, config: StageCacheConfig):
+        """
+        Initializes the StageCache with the provided configuration.
+
+        Args:
+            config (StageCacheConfig): Location, size cap and switch of the cache.
+        """
+        self.config = config
+
+    def key(self, stage: str, config, input_paths=(), modules=(), upstream=()) -> str:
+        """
+        Returns the cache key of a stage run.
+
+        Args:
+            stage (str): Name of the stage.
+            config: The stage's config object.
+            input_paths (iterable): Files or directories the stage reads, hashed by content.
+            modules (iterable): Modules (or classes/functions) implementing the stage, hashed by source file.
+            upstream (iterable): Keys of the stages whose in-memory outputs this stage consumes.
+
+        Returns:
+            str: Hex digest identifying the run.
+        """
+        digest = hashlib.sha256()
+        digest.update(stage.encode())
+        digest.update(repr(sorted(config_fingerprint(config).items())).encode())
+        for path in input_paths:
+            digest.update(_path_digest(path).encode())
+        for module in modules:
+            digest.update(file_digest(inspect.getsourcefile(module)).encode())
+        for key in upstream:
+            digest.update(key.encode())
+        return digest.hexdigest()
+
+    def _entry(self, stage: str, key: str) -> str:
+        return os.path.join(self.config.cache_dir, stage, key)
+
+    def load(self, stage: str, key: str):
+        """
+        Returns the cached outputs of a stage run.
+
+        Cached files and directories are copied back to the paths they were saved from.
+
+        Args:
+            stage (str): Name of the stage.
+            key (str): Cache key from `key`.
+
+        Returns:
+            tuple or None: (files, arrays, values) dicts as given to `save`, None if the run is not cached.
+        """
+        entry = self._entry(stage, key)
+        manifest_path = os.path.join(entry, "manifest.json")
+        if not self.config.enabled or not os.path.exists(manifest_path):
+            return None
+
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+            for name, target in manifest["files"].items():
+                cached = os.path.join(entry, "files", name)
+                if not os.path.exists(target) or _path_digest(target) != _path_digest(cached):
+                    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                    if os.path.isdir(cached):
+                        # Artifacts and lookup tables are swapped in through a symlink, like when they are saved.
+                        copy_artifact(cached, target)
+                    else:
+                        _copy(cached, target)
+
+            arrays = {}
+            for name, kind in manifest["arrays"].items():
+                if kind == "sparse":
+                    arrays[name] = sparse.load_npz(os.path.join(entry, "arrays", f"{name}.npz"))
+                else:
+                    arrays[name] = np.load(os.path.join(entry, "arrays", f"{name}.npy"))
+
+            os.utime(manifest_path)
+            logging.info(f"Stage {stage}: cache hit {key[:12]}")
+            return manifest["files"], arrays, manifest["values"]
+        except Exception as e:
+            logging.info(f"Stage {stage}: ignoring unreadable cache entry {key[:12]}: {e}")
+            return None
+
+    def save(self, stage: str, key: str, files: dict = None, arrays: dict = None, values: dict = None):
+        """
+        Stores the outputs of a stage run and evicts the least recently used entries past the size cap.
+
+        Args:
+            stage (str): Name of the stage.
+            key (str): Cache key from `key`.
+            files (dict): Output name to the path of a file or directory the stage wrote.
+            arrays (dict): Output name to a numpy array or scipy sparse matrix.
+            values (dict): Output name to a JSON serializable value.
+
+        Raises:
+            CustomException: If the entry cannot be written.
+        """
+        if not self.config.enabled:
+            return
+        try:
+            files, arrays, values = files or {}, arrays or {}, values or {}
+            stage_dir = os.path.join(self.config.cache_dir, stage)
+            os.makedirs(stage_dir, exist_ok=True)
+            staging = tempfile.mkdtemp(dir=stage_dir, prefix=".tmp-")
+
+            os.makedirs(os.path.join(staging, "files"))
+            for name, path in files.items():
+                _copy(path, os.path.join(staging, "files", name))
+
+            os.makedirs(os.path.join(staging, "arrays"))
+            kinds = {}
+            for name, array in arrays.items():
+                if sparse.issparse(array):
+                    sparse.save_npz(os.path.join(staging, "arrays", f"{name}.npz"), array.tocsr())
+                    kinds[name] = "sparse"
+                else:
+                    np.save(os.path.join(staging, "arrays", f"{name}.npy"), np.asarray(array))
+                    kinds[name] = "dense"
+
+            with open(os.path.join(staging, "manifest.json"), "w") as f:
+                json.dump({"files": files, "arrays": kinds, "values": values}, f)
+
+            entry = self._entry(stage, key)
+            if os.path.exists(entry):
+                shutil.rmtree(entry)
+            os.rename(staging, entry)
+            logging.info(f"Stage {stage}: cached outputs as {key[:12]}")
+            self._evict(keep=entry)
+        except Exception as e:
+            raise CustomException(str(e), sys)
+
+    def _evict(self, keep: str):
+        entries = []
+        for stage in os.listdir(self.config.cache_dir):
+            stage_dir = os.path.join(self.config.cache_dir, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for key in os.listdir(stage_dir):
+                manifest_path = os.path.join(stage_dir, key, "manifest.json")
+                if not key.startswith(".") and os.path.exists(manifest_path):
+                    entry = os.path.join(stage_dir, key)
+                    entries.append((os.path.getmtime(manifest_path), entry, _directory_size(entry)))
+
+        total = sum(size for _, _, size in entries)
+        for _, entry, size in sorted(entries):
+            if total <= self.config.max_bytes:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logging.info(f"Evicted cache entry {entry} ({size} bytes)")
@@ -1,15 +1,204 @@
+from src.components import cross_validation, data_ingestion, data_transform, ensemble, model_export, model_trainer, model_tuner
+from src.components.ensemble import METHODS
 from src.components.data_ingestion import DataIngestionConfig, DataIngestion
 from src.components.data_transform import DataTransformationConfig, DataTransformation
+from src.components.incremental_trainer import IncrementalTrainerConfig, IncrementalTrainer
+from src.components.model_export import ModelExportConfig, ModelExporter
 from src.components.model_trainer import ModelTrainerConfig, ModelTrainer
+from src.pipeline.model_cache import artifact_version
+from src.pipeline.model_registry import ModelRegistryConfig, ModelRegistry
+from src.pipeline.stage_cache import StageCacheConfig, StageCache
+from src.serialization import artifact_state_file
+from src.utils import load_object
+from src.pipeline import lookup_table
+from src.instrumentation import export, timed
+from src import storage, utils
 
+import argparse
+import json
+import os
 
-ingestion = DataIngestion(DataIngestionConfig())
-train_path, test_path = ingestion.initiate_data_ingestion()
 
-transformation = DataTransformation(DataTransformationConfig())
-train, test, preporcessor_path = transformation.data_transform(train_path, test_path)
+@timed("train.ingestion")
+def run_ingestion(cache: StageCache, config: DataIngestionConfig, force: bool):
+    key = cache.key("ingestion", config, [config.raw_data_path], [data_ingestion, storage, utils])
+    cached = None if force else cache.load("ingestion", key)
+    if cached is not None:
+        _, _, values = cached
+        return values["train_path"], values["test_path"]
 
-trainer = ModelTrainer(ModelTrainerConfig())
-model, name, score = trainer.model_training(train, test)
+    train_path, test_path = DataIngestion(config).initiate_data_ingestion()
+    cache.save(
+        "ingestion", key,
+        files={"train": train_path, "test": test_path},
+        values={"train_path": train_path, "test_path": test_path}
+    )
+    return train_path, test_path
 
-print(name, score)
+
+@timed("train.transformation")
+def run_transformation(cache: StageCache, config: DataTransformationConfig, train_path: str, test_path: str, force: bool):
+    key = cache.key("transformation", config, [train_path, test_path], [data_transform, storage, utils])
+    cached = None if force else cache.load("transformation", key)
+    if cached is not None:
+        _, arrays, values = cached
+        return key, arrays["train_X"], arrays["train_y"], arrays["test_X"], arrays["test_y"], values["preprocessor_path"]
+
+    train_X, train_y, test_X, test_y, preprocessor_path = DataTransformation(config).data_transform(train_path, test_path)
+    cache.save(
+        "transformation", key,
+        files={"preprocessor": preprocessor_path},
+        arrays={"train_X": train_X, "train_y": train_y, "test_X": test_X, "test_y": test_y},
+        values={"preprocessor_path": preprocessor_path}
+    )
+    return key, train_X, train_y, test_X, test_y, preprocessor_path
+
+
+@timed("train.training")
+def run_training(cache: StageCache, config: ModelTrainerConfig, upstream: str, train_X, train_y, test_X, test_y, force: bool):
+    key = cache.key("training", config, modules=[model_trainer, model_tuner, cross_validation, ensemble, utils], upstream=[upstream])
+    cached = None if force else cache.load("training", key)
+    if cached is not None:
+        _, _, values = cached
+        return key, load_object(config.model_path), values["name"], values["score"], values.get("trials", [])
+
+    trainer = ModelTrainer(config)
+    model, name, score = trainer.model_training(train_X, train_y, test_X, test_y)
+    cache.save(
+        "training", key,
+        files={"model": config.model_path},
+        values={"name": name, "score": score, "trials": trainer.trials}
+    )
+    return key, model, name, score, trainer.trials
+
+
+@timed("train.export")
+def run_export(cache: StageCache, config: ModelExportConfig, upstream: str, model, model_path: str, preprocessor_path: str, test_path: str, force: bool):
+    # The saved artifacts are part of the key: the table records their version, which serving checks.
+    sources = [artifact_state_file(model_path), artifact_state_file(preprocessor_path)]
+    key = cache.key("export", config, [test_path, *sources], [model_export, lookup_table, utils], upstream=[upstream])
+    cached = None if force else cache.load("export", key)
+    if cached is not None:
+        _, _, values = cached
+        return values["report"]
+
+    report = ModelExporter(config).export(
+        model, load_object(preprocessor_path), storage.read_table(test_path), artifact_version(model_path, preprocessor_path)
+    )
+    cache.save("export", key, files={"lookup_table": config.table_path}, values={"report": report})
+    return report
+
+
+@timed("train.incremental")
+def run_incremental(config: IncrementalTrainerConfig, new_data_path: str):
+    return IncrementalTrainer(config).update(storage.read_table(new_data_path))
+
+
+def register(args, model_path: str, preprocessor_path: str, metrics: dict):
+    if args.no_register:
+        return
+    registry = ModelRegistry(ModelRegistryConfig(root=args.registry))
+    version = registry.register(model_path, preprocessor_path, metrics)
+    print(f"Registered model version {version}")
+    if args.promote:
+        registry.promote(version)
+        print(f"Promoted model version {version}")
+    registry.prune()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the training pipeline, reusing cached stage outputs.")
+    parser.add_argument("--force", action="store_true", help="rerun every stage and refresh the cache")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the stage cache")
+    parser.add_argument("--cache-dir", default=StageCacheConfig.cache_dir)
+    parser.add_argument("--cache-max-mb", type=int, default=StageCacheConfig.max_bytes >> 20)
+    parser.add_argument("--no-export", action="store_true", help="skip compiling the model into a lookup table")
+    parser.add_argument("--metrics", help="write the stage timings to this file as JSON")
+    parser.add_argument("--models", help="comma separated names of the models to train, see model_trainer.MODELS")
+    parser.add_argument("--tune", action="store_true", help="search the hyperparameters of every model before training it")
+    parser.add_argument(
+        "--trials", default=os.path.join("artifacts", "tuning_trials.json"),
+        help="with --tune, write the hyperparameter search trials to this file as JSON"
+    )
+    parser.add_argument("--cv", type=int, metavar="K", help="select the model by K-fold cross-validation")
+    parser.add_argument(
+        "--ensemble", type=int, metavar="N",
+        help="save a weighted ensemble of the N best models by cross-validation instead of the single best"
+    )
+    parser.add_argument("--ensemble-method", choices=METHODS, default="blend", help="how the ensemble's weights are fitted")
+    parser.add_argument(
+        "--incremental", metavar="PATH",
+        help="append the records of this file to a copy of the raw data and update the model with them, retraining fully "
+             "only when incremental_trainer decides it is needed"
+    )
+    parser.add_argument("--registry", default=ModelRegistryConfig.root, help="model registry to register the trained model in")
+    parser.add_argument("--no-register", action="store_true", help="don't register the trained model")
+    parser.add_argument("--promote", action="store_true", help="serve the registered model: point the registry's CURRENT at it")
+    args = parser.parse_args(argv)
+
+    cache = StageCache(StageCacheConfig(
+        cache_dir=args.cache_dir, max_bytes=args.cache_max_mb << 20, enabled=not args.no_cache
+    ))
+    ingestion_config = DataIngestionConfig()
+    incremental_config = IncrementalTrainerConfig(ingestion=ingestion_config)
+
+    if args.incremental:
+        report = run_incremental(incremental_config, args.incremental)
+        if report["mode"] == "incremental":
+            print(report["model_name"], report["score"])
+            register(args, incremental_config.model_path, incremental_config.preprocessor_path, {
+                "model_name": report["model_name"], "r2": report["score"], "mode": "incremental"
+            })
+            if not args.no_export:
+                model_key = cache.key("incremental", incremental_config, [incremental_config.model_path])
+                report = run_export(
+                    cache, ModelExportConfig(), model_key, load_object(incremental_config.model_path),
+                    incremental_config.model_path, incremental_config.preprocessor_path, ingestion_config.test_data_path,
+                    args.force
+                )
+                print(f"Lookup table {report['path']}: max absolute error {report['max_abs_error']:.3g} on {report['n_verified']} records")
+            if args.metrics:
+                export("json", args.metrics)
+            return
+        print(f"Full retrain: {report['reason']}")
+
+    # Include the records appended by incremental updates, which go to a copy of the raw data.
+    ingestion_config.raw_data_path = IncrementalTrainer.raw_data_path(incremental_config)
+    train_path, test_path = run_ingestion(cache, ingestion_config, args.force)
+    transformation_key, train_X, train_y, test_X, test_y, preprocessor_path = run_transformation(
+        cache, DataTransformationConfig(), train_path, test_path, args.force
+    )
+    trainer_config = ModelTrainerConfig(models=args.models.split(",") if args.models else None, tune=args.tune)
+    if args.cv:
+        trainer_config.cross_validate = True
+        trainer_config.cv.n_splits = args.cv
+    if args.ensemble:
+        trainer_config.ensemble = True
+        trainer_config.ensembling.size = args.ensemble
+        trainer_config.ensembling.method = args.ensemble_method
+    training_key, model, name, score, trials = run_training(
+        cache, trainer_config, transformation_key, train_X, train_y, test_X, test_y, args.force
+    )
+    if args.tune:
+        os.makedirs(os.path.dirname(os.path.abspath(args.trials)), exist_ok=True)
+        with open(args.trials, "w") as f:
+            json.dump(trials, f, indent=2)
+        print(f"{len(trials)} hyperparameter search trials written to {args.trials}")
+
+    print(name, score)
+    register(args, trainer_config.model_path, preprocessor_path, {"model_name": name, "r2": score, "mode": "full"})
+    IncrementalTrainer(incremental_config).reset(model, name, score, train_X, train_y)
+
+    if not args.no_export:
+        report = run_export(
+            cache, ModelExportConfig(), training_key, model, trainer_config.model_path, preprocessor_path, test_path,
+            args.force
+        )
+        print(f"Lookup table {report['path']}: max absolute error {report['max_abs_error']:.3g} on {report['n_verified']} records")
+
+    if args.metrics:
+        export("json", args.metrics)
+
+
+if __name__ == "__main__":
+    main()
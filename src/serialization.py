@@ -0,0 +1,349 @@
+from src.exception import CustomException
+from src import utils
+
+import importlib
+import json
+import mmap
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+BUFFER_ALIGNMENT = 64
+
+
+def _kind(obj) -> str:
+    module = type(obj).__module__
+    if module.startswith("xgboost") and hasattr(obj, "save_model"):
+        return "xgboost"
+    if module.startswith("catboost") and hasattr(obj, "save_model"):
+        return "catboost"
+    return "pickle"
+
+
+def _dump_pickle(obj, directory: str, compress: int) -> list:
+    """
+    Pickles `obj` with protocol 5, keeping the large binary buffers (NumPy array data) out of band: they are
+    written back to back, aligned, to `buffers.bin` so loading can map them all with a single mmap instead of
+    copying them. Returns the (offset, length) of each buffer.
+    """
+    buffers = []
+    with open(os.path.join(directory, "object.pkl"), "wb") as f:
+        pickle.dump(obj, f, protocol=5, buffer_callback=buffers.append)
+
+    layout = []
+    position = 0
+    with open(os.path.join(directory, "buffers.bin"), "wb") as f:
+        for buffer in buffers:
+            raw = buffer.raw()
+            padding = -position % BUFFER_ALIGNMENT
+            f.write(b"\0" * padding)
+            position += padding
+            layout.append((position, raw.nbytes))
+            f.write(raw)
+            position += raw.nbytes
+
+    if compress:
+        path = os.path.join(directory, "buffers.bin")
+        with open(path, "rb") as f:
+            data = zlib.compress(f.read(), compress)
+        with open(path, "wb") as f:
+            f.write(data)
+    return layout
+
+
+def _load_pickle(directory: str, manifest: dict, mmap_buffers: bool):
+    path = os.path.join(directory, "buffers.bin")
+    if manifest["compress"]:
+        with open(path, "rb") as f:
+            data = memoryview(zlib.decompress(f.read()))
+    elif mmap_buffers and os.path.getsize(path):
+        with open(path, "rb") as f:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    else:
+        data = memoryview(bytearray(os.path.getsize(path)))
+        with open(path, "rb") as f:
+            f.readinto(data)
+
+    with open(os.path.join(directory, "object.pkl"), "rb") as f:
+        return pickle.load(f, buffers=[data[offset:offset + length] for offset, length in manifest["buffers"]])
+
+
+def _library_versions(obj) -> dict:
+    versions = {}
+    for name in {type(obj).__module__.split(".")[0], "sklearn", "numpy"}:
+        module = sys.modules.get(name)
+        if module is not None and hasattr(module, "__version__"):
+            versions[name] = module.__version__
+    return versions
+
+
+def resolve_artifact(path: str) -> str:
+    """
+    This function returns where the artifact saved at `path` actually is.
+
+    Artifacts are directories in the versioned format. Before it, they were dill files named `<path>.pkl`; when
+    `path` does not exist but such a file does, its path is returned so old artifacts keep loading.
+
+    Args:
+        path (str): The artifact path.
+
+    Returns:
+        str: `path`, or the legacy `<path>.pkl` file.
+    """
+    if not os.path.exists(path) and os.path.exists(path + ".pkl"):
+        return path + ".pkl"
+    return path
+
+
+def artifact_state_file(path: str) -> str:
+    """
+    This function returns the single file whose stat and contents change whenever the artifact at `path` changes:
+    the manifest of a versioned artifact (it records the payload's sha256), or the file itself for a legacy one.
+
+    Args:
+        path (str): The artifact path.
+
+    Returns:
+        str: The path of the file to watch.
+    """
+    path = resolve_artifact(path)
+    return os.path.join(path, MANIFEST) if os.path.isdir(path) else path
+
+
+def is_artifact(path: str) -> bool:
+    """
+    This function returns whether `path` holds an artifact in the versioned format.
+
+    Args:
+        path (str): The path to check.
+
+    Returns:
+        bool: True if `path` is a directory with a manifest.
+    """
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def save_artifact(path: str, obj, compress: int = 0):
+    """
+    This function saves an object as a versioned artifact directory.
+
+    XGBoost and CatBoost models are stored in their native formats (UBJSON and cbm). Everything else is pickled
+    with protocol 5 with its NumPy array data kept out of band in a separate buffer file; uncompressed, that file
+    is memory-mapped on load and the arrays are views into it. A manifest records the format version, how the
+    payload was written, its sha256 and the library versions. Loading a pickle payload runs whatever code it
+    names, and the sha256 only catches corruption: only load artifacts from a location that no one else can write.
+
+    The artifact is written to a new directory of the hidden `.<name>.versions` directory next to `path`, and
+    `path` is a symlink to it that is swapped with os.replace, so readers see either the previous artifact or
+    the new one, never a partial one or none. The previous artifact is kept for readers still loading it, older
+    ones are deleted.
+    An artifact saved by an earlier version of this function is a plain directory: it is moved aside before the
+    first symlink is put in its place.
+
+    Args:
+        path (str): The directory to save the artifact to. An existing artifact there is replaced.
+        obj (object): The object to save.
+        compress (int): zlib level from 0 (none, allows memory-mapping) to 9 for the array buffers. Ignored by the native formats.
+
+    Raises:
+        CustomException: If the artifact cannot be written.
+    """
+    try:
+        staging = new_version_dir(path)
+
+        kind = _kind(obj)
+        layout = None
+        if kind == "xgboost":
+            payload = ["model.ubj"]
+            obj.save_model(os.path.join(staging, payload[0]))
+        elif kind == "catboost":
+            payload = ["model.cbm"]
+            obj.save_model(os.path.join(staging, payload[0]))
+        else:
+            payload = ["object.pkl", "buffers.bin"]
+            layout = _dump_pickle(obj, staging, compress)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "kind": kind,
+            "class": f"{type(obj).__module__}.{type(obj).__qualname__}",
+            "payload": payload,
+            "sha256": {name: utils.file_digest(os.path.join(staging, name)) for name in payload},
+            "compress": compress if kind == "pickle" else 0,
+            "buffers": layout,
+            "created": time.time(),
+            "library_versions": _library_versions(obj),
+        }
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        swap_in(path, staging)
+    except Exception as e:
+        raise CustomException(str(e), sys)
+
+
+def copy_artifact(source: str, path: str):
+    """
+    This function copies a directory (an artifact, a lookup table) to `path`, replacing the one there the way
+    `save_artifact` does.
+
+    Args:
+        source (str): The directory to copy.
+        path (str): Where to install the copy.
+
+    Raises:
+        CustomException: If the directory cannot be copied.
+    """
+    try:
+        staging = new_version_dir(path)
+        shutil.copytree(source, staging, dirs_exist_ok=True)
+        swap_in(path, staging)
+    except Exception as e:
+        raise CustomException(str(e), sys)
+
+
+def _versions_dir(path: str) -> str:
+    path = os.path.abspath(path)
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.versions")
+
+
+def new_version_dir(path: str) -> str:
+    """
+    This function creates an empty directory to build the next version of the directory at `path` in, for
+    `swap_in`. It is in the hidden `.<name>.versions` directory next to `path`.
+
+    Args:
+        path (str): The path the directory will be swapped in at.
+
+    Returns:
+        str: The new directory.
+    """
+    versions = _versions_dir(path)
+    os.makedirs(versions, exist_ok=True)
+    directory = tempfile.mkdtemp(dir=versions)
+    os.chmod(directory, 0o755)
+    return directory
+
+
+def swap_in(path: str, directory: str):
+    """
+    This function makes `path` a symlink to `directory`, made by `new_version_dir(path)`, with os.replace: readers
+    of `path` see the previous version or the new one, never neither. The previous version is kept for readers
+    still using it, older ones are deleted. A plain directory or file at `path`, from before this scheme, is
+    moved aside first.
+
+    Args:
+        path (str): The path to swap the directory in at.
+        directory (str): The new version.
+    """
+    versions = _versions_dir(path)
+    previous = os.path.basename(os.readlink(path)) if os.path.islink(path) else None
+    if os.path.isdir(path) and previous is None:
+        os.rename(path, tempfile.mkdtemp(dir=versions, prefix="retired-") + os.sep + "artifact")
+    elif os.path.isfile(path) and previous is None:
+        os.remove(path)
+
+    link = os.path.join(versions, f"link-{os.getpid()}")
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.join(os.path.basename(versions), os.path.basename(directory)), link)
+    os.replace(link, path)
+
+    for entry in os.listdir(versions):
+        if entry not in (os.path.basename(directory), previous):
+            shutil.rmtree(os.path.join(versions, entry), ignore_errors=True)
+
+
+def read_manifest(path: str) -> dict:
+    """
+    This function returns the manifest of a versioned artifact.
+
+    Args:
+        path (str): The artifact directory.
+
+    Returns:
+        dict: The manifest.
+    """
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def load_artifact(path: str, mmap: bool = True, verify: bool = False, lazy: bool = False):
+    """
+    This function loads an object saved with `save_artifact`.
+
+    Args:
+        path (str): The artifact directory.
+        mmap (bool): Whether to memory-map the array buffers of uncompressed pickle payloads (the arrays are then
+            read-only) instead of reading them into memory.
+        verify (bool): Whether to check the payload against the sha256 in the manifest before loading it. This
+            detects corruption, not tampering: the manifest is stored next to the payload.
+        lazy (bool): Whether to return a LazyArtifact that only loads the object on first use.
+
+    Returns:
+        object: The loaded object, or a LazyArtifact wrapping it.
+
+    Raises:
+        CustomException: If the artifact cannot be loaded, its format version is unknown or it fails verification.
+    """
+    if lazy:
+        return LazyArtifact(path, mmap=mmap, verify=verify)
+    try:
+        # Read every file through the directory the symlink points to now, even if a save swaps it meanwhile.
+        path = os.path.realpath(path)
+        manifest = read_manifest(path)
+        if manifest["format_version"] > FORMAT_VERSION:
+            raise ValueError(f"Artifact format {manifest['format_version']} is newer than supported {FORMAT_VERSION}")
+
+        if verify:
+            for name, digest in manifest["sha256"].items():
+                if utils.file_digest(os.path.join(path, name)) != digest:
+                    raise ValueError(f"Artifact file {os.path.join(path, name)} does not match its manifest")
+
+        if manifest["kind"] in ("xgboost", "catboost"):
+            module_name, class_name = manifest["class"].rsplit(".", 1)
+            obj = getattr(importlib.import_module(module_name), class_name)()
+            obj.load_model(os.path.join(path, manifest["payload"][0]))
+            return obj
+
+        return _load_pickle(path, manifest, mmap)
+    except Exception as e:
+        raise CustomException(str(e), sys)
+
+
+class LazyArtifact:
+    """
+    Placeholder for an artifact that is only loaded when one of its attributes is first accessed.
+
+    Args:
+        path (str): The artifact directory.
+        **options: Keyword arguments passed on to `load_artifact`.
+
+    Methods:
+        load(): Loads the artifact if needed and returns it.
+    """
+    def __init__(self, path: str, **options):
+        self._path = path
+        self._options = options
+        self._obj = None
+
+    def load(self):
+        """
+        Loads the artifact if needed and returns it.
+
+        Returns:
+            object: The loaded object.
+        """
+        if self._obj is None:
+            self._obj = load_artifact(self._path, **self._options)
+        return self._obj
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
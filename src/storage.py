@@ -0,0 +1,296 @@
+from src.exception import CustomException
+
+import os
+import sys
+import pandas as pd
+
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+
+def table_format(path: str, fmt: str = None) -> str:
+    """
+    This function returns the storage format of a table file.
+
+    Args:
+        path (str): The path to the table file.
+        fmt (str): Explicit format, one of FORMATS. When None the format is inferred from the file extension.
+
+    Returns:
+        str: The format name.
+
+    Raises:
+        ValueError: If the format is unknown or cannot be inferred.
+    """
+    if fmt is None:
+        extension = os.path.splitext(path)[1].lower()
+        fmt = next((name for name, suffix in FORMATS.items() if suffix == extension), None)
+        if fmt is None:
+            raise ValueError(f"Cannot infer the table format of {path}, expected one of {list(FORMATS.values())}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown table format {fmt}, expected one of {list(FORMATS)}")
+    return fmt
+
+
+def table_path(path: str, fmt: str) -> str:
+    """
+    This function returns `path` with the file extension of the given format.
+
+    Args:
+        path (str): The path to the table file.
+        fmt (str): The format, one of FORMATS.
+
+    Returns:
+        str: The path with its extension replaced.
+    """
+    return os.path.splitext(path)[0] + FORMATS[table_format(path, fmt)]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ImportError("pyarrow is required for the parquet and feather formats, install it with `pip install pyarrow`")
+
+
+def _categorize(df: pd.DataFrame) -> pd.DataFrame:
+    columns = [column for column in df.columns if df[column].dtype == object or pd.api.types.is_string_dtype(df[column])]
+    return df.astype({column: "category" for column in columns}) if columns else df
+
+
+def write_table(df: pd.DataFrame, path: str, fmt: str = None):
+    """
+    This function writes a DataFrame to a table file.
+
+    Text columns are stored as categoricals in the columnar formats. Feather files are written uncompressed so
+    they can be memory-mapped when read back.
+
+    Args:
+        df (pd.DataFrame): The data to write.
+        path (str): The path to the table file.
+        fmt (str): The format, one of FORMATS. Inferred from the extension when None.
+
+    Raises:
+        CustomException: If the table cannot be written.
+    """
+    try:
+        fmt = table_format(path, fmt)
+        if fmt == "csv":
+            df.to_csv(path, index=False)
+            return
+
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(_categorize(df), preserve_index=False)
+        if fmt == "parquet":
+            pa.parquet.write_table(table, path)
+        else:
+            pa.feather.write_feather(table, path, compression="uncompressed")
+    except Exception as e:
+        raise CustomException(str(e), sys)
+
+
+def read_table(path: str, fmt: str = None, memory_map: bool = True) -> pd.DataFrame:
+    """
+    This function reads a table file into a DataFrame.
+
+    Text columns of columnar files come back as categoricals, numeric columns keep their stored types.
+
+    Args:
+        path (str): The path to the table file.
+        fmt (str): The format, one of FORMATS. Inferred from the extension when None.
+        memory_map (bool): Whether to memory-map parquet and feather files instead of reading them into memory.
+
+    Returns:
+        pd.DataFrame: The data.
+
+    Raises:
+        CustomException: If the table cannot be read.
+    """
+    try:
+        fmt = table_format(path, fmt)
+        if fmt == "csv":
+            return pd.read_csv(path)
+
+        pa = _pyarrow()
+        if fmt == "parquet":
+            table = pa.parquet.read_table(path, memory_map=memory_map)
+        else:
+            table = pa.feather.read_table(path, memory_map=memory_map)
+        return _categorize(table.to_pandas())
+    except Exception as e:
+        raise CustomException(str(e), sys)
+
+
+def read_table_chunks(path: str, chunk_size: int, fmt: str = None, skip_rows: int = 0):
+    """
+    This function reads a table file as a sequence of DataFrames of at most `chunk_size` rows.
+
+    Only one chunk is held in memory at a time. Skipped rows are not converted to DataFrames: CSV lines are
+    skipped by the parser and whole parquet/feather record batches are dropped before conversion.
+
+    Args:
+        path (str): The path to the table file.
+        chunk_size (int): The number of rows per chunk.
+        fmt (str): The format, one of FORMATS. Inferred from the extension when None.
+        skip_rows (int): The number of leading data rows to skip.
+
+    Yields:
+        pd.DataFrame: The chunks, in file order. Their index continues from `skip_rows`.
+
+    Raises:
+        CustomException: If the table cannot be read.
+    """
+    try:
+        fmt = table_format(path, fmt)
+        position = skip_rows
+        if fmt == "csv":
+            for chunk in pd.read_csv(path, chunksize=chunk_size, skiprows=range(1, skip_rows + 1)):
+                chunk.index = pd.RangeIndex(position, position + len(chunk))
+                position += len(chunk)
+                yield chunk
+            return
+
+        pa = _pyarrow()
+        if fmt == "parquet":
+            batches = pa.parquet.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_size)
+        else:
+            reader = pa.ipc.open_file(pa.memory_map(path))
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+        skip, pending, pending_rows = skip_rows, [], 0
+        for batch in batches:
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            batch, skip = batch.slice(skip), 0
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= chunk_size:
+                table = pa.Table.from_batches(pending)
+                chunk = table.slice(0, chunk_size).to_pandas()
+                pending, pending_rows = table.slice(chunk_size).to_batches(), pending_rows - chunk_size
+                chunk.index = pd.RangeIndex(position, position + len(chunk))
+                position += len(chunk)
+                yield chunk
+        if pending_rows:
+            chunk = pa.Table.from_batches(pending).to_pandas()
+            chunk.index = pd.RangeIndex(position, position + len(chunk))
+            yield chunk
+    except Exception as e:
+        raise CustomException(str(e), sys)
+
+
+class TableWriter:
+    """
+    Writes a table file incrementally, one DataFrame chunk at a time.
+
+    All chunks must have the same columns. Categorical vocabularies are not known until the last chunk, so text
+    columns are written as plain strings; `read_table` turns them back into categoricals.
+
+    Unless a `schema` is given, the schema of the file is inferred from the chunks: chunks are held back until
+    every column has had a value, so a column that is null at first gets the type of its first values, and the
+    types seen so far are promoted together (e.g. integers and floats give floats). Later chunks are cast to
+    that schema, so an integer column where missing values show up later (and pandas turns into floats) stays an
+    integer column.
+
+    Args:
+        path (str): The path to the table file. An existing file is overwritten.
+        fmt (str): The format, one of FORMATS. Inferred from the extension when None.
+        schema (pyarrow.Schema): The schema of the file, for the parquet and feather formats.
+
+    Methods:
+        write(df): Appends a chunk.
+        close(): Finishes the file. Also called when used as a context manager.
+    """
+    def __init__(self, path: str, fmt: str = None, schema=None):
+        self.path = path
+        self.fmt = table_format(path, fmt)
+        self._writer = None
+        self._schema = schema
+        self._pending = []
+        self._header = True
+
+    def write(self, df: pd.DataFrame):
+        """
+        Appends a chunk to the file.
+
+        Args:
+            df (pd.DataFrame): The chunk.
+
+        Raises:
+            ValueError: If the chunk cannot be cast to the schema of the file without losing values.
+        """
+        if self.fmt == "csv":
+            df.to_csv(self.path, mode="w" if self._header else "a", header=self._header, index=False)
+            self._header = False
+            return
+
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is not None:
+            self._writer.write_table(self._cast(table))
+            return
+
+        self._pending.append(table)
+        if self._schema is not None or all(self._has_values(name) for name in table.schema.names):
+            self._open()
+
+    def _has_values(self, name: str) -> bool:
+        return any(table.column(name).null_count < table.num_rows for table in self._pending)
+
+    def _open(self):
+        pa = _pyarrow()
+        if self._schema is None:
+            first = self._pending[0].schema
+            schemas = [
+                pa.schema([
+                    field if table.column(field.name).null_count < table.num_rows else field.with_type(pa.null())
+                    for field in table.schema
+                ])
+                for table in self._pending
+            ]
+            schema = pa.unify_schemas(schemas, promote_options="permissive")
+            # Columns without a single value keep the type pandas gave them.
+            self._schema = pa.schema([
+                first.field(field.name) if pa.types.is_null(field.type) else field for field in schema
+            ])
+
+        if self.fmt == "parquet":
+            self._writer = pa.parquet.ParquetWriter(self.path, self._schema)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=None)
+            self._writer = pa.ipc.new_file(self.path, self._schema, options=options)
+        pending, self._pending = self._pending, []
+        for table in pending:
+            self._writer.write_table(self._cast(table))
+
+    def _cast(self, table):
+        pa = _pyarrow()
+        columns = [
+            pa.nulls(table.num_rows, field.type) if table.column(field.name).null_count == table.num_rows
+            else table.column(field.name)
+            for field in self._schema
+        ]
+        try:
+            return pa.Table.from_arrays(columns, names=self._schema.names).cast(self._schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"Chunk does not fit the schema of {self.path}, pass an explicit schema: {e}")
+
+    def close(self):
+        """
+        Finishes the file.
+        """
+        if self._pending:
+            self._open()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
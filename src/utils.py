@@ -1,21 +1,36 @@
 from src.exception import CustomException
-from sklearn.metrics import r2_score
+from src.logger import logging
+from src import serialization
 
+import hashlib
 import os
 import sys
-import dill
+import time
 
+# sklearn, joblib and dill are imported where they are used: serving imports this module but only loads
+# versioned artifacts, and importing them costs more than a second of worker startup.
 
-def save_object(file_path, obj):
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def save_object(file_path, obj, compress=0):
     """
     This function saves an object to a file.
 
+    Paths ending in `.pkl` are written with dill as before. Any other path is saved as a versioned artifact
+    directory, see `src.serialization.save_artifact`.
+
     Parameters
     ----------
     file_path : str
         The path to the file where the object will be saved.
     obj : object
         The object to be saved.
+    compress : int, default=0
+        Compression level of versioned artifacts, 0 keeps their arrays memory-mappable.
 
     Returns
     -------
@@ -29,18 +44,133 @@ def save_object(file_path, obj):
 
     """
     try:
+        if not file_path.endswith(".pkl"):
+            serialization.save_artifact(file_path, obj, compress=compress)
+            return
+
+        import dill
+
         dir = os.path.dirname(file_path)
         os.makedirs(dir, exist_ok=True)
 
         with open(file_path, "wb") as f:
             dill.dump(obj, f)
     except Exception as e:
-        raise CustomException(str(e), sys)            
+        raise CustomException(str(e), sys)
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    This function returns the sha256 hex digest of a file's contents.
 
-def evaluate_models(train_X, train_y, test_X, test_y, models: dict):
+    Parameters
+    ----------
+    path : str
+        The path to the file.
+    chunk_size : int, default=1 MiB
+        The number of bytes read at a time.
+
+    Returns
+    -------
+    str
+        The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def peak_rss_mb():
+    """
+    This function returns the peak resident set size of the current process.
+
+    Returns
+    -------
+    float or None
+        The peak RSS in megabytes, None on platforms without the `resource` module.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def set_thread_budget(model, threads: int):
+    """
+    This function limits the number of threads a model uses for fitting and predicting.
+
+    Parameters
+    ----------
+    model : estimator
+        The model to configure. Models exposing `n_jobs` or `nthread` (sklearn, XGBoost) have that parameter set,
+        unfitted CatBoost models have `thread_count` set. Other models are left untouched. The members of an ensemble get
+        the same budget as the ensemble's own pool.
+    threads : int
+        The number of threads the model may use.
+
+    Returns
+    -------
+    estimator
+        The same model.
+    """
+    if type(model).__module__.startswith("catboost"):
+        # CatBoost refuses to change the parameters of a fitted model.
+        if not model.is_fitted():
+            model.set_params(thread_count=threads)
+        return model
+
+    params = model.get_params()
+    for name in ("n_jobs", "nthread"):
+        if name in params:
+            model.set_params(**{name: threads})
+    for member in getattr(model, "members_", ()):
+        set_thread_budget(member, threads)
+    return model
+
+def as_model_input(model, X):
+    """
+    This function returns the features in the representation the model must be fitted and queried with.
+
+    Sparse features are passed through as they are, except to XGBoost: it treats the entries a sparse matrix
+    does not store as missing rather than zero, so a model fitted on sparse one-hot features would predict
+    differently on the same features given densely (as the compiled preprocessor produces them). XGBoost models
+    therefore always get dense input, at training and at serving time.
+
+    Parameters
+    ----------
+    model : estimator
+        The model the features are for.
+    X : array-like or sparse matrix
+        The features.
+
+    Returns
+    -------
+    array-like or sparse matrix
+        The features, densified if the model needs it.
+    """
+    if hasattr(X, "toarray") and type(model).__module__.startswith("xgboost"):
+        return X.toarray()
+    return X
+
+def _fit_and_score(name, model, train_X, train_y, test_X, test_y, score_train):
+    from sklearn.metrics import r2_score
+
+    start = time.perf_counter()
+    model.fit(as_model_input(model, train_X), train_y)
+    fit_time = time.perf_counter() - start
+
+    test_score = r2_score(test_y, model.predict(as_model_input(model, test_X)))
+    train_score = r2_score(train_y, model.predict(as_model_input(model, train_X))) if score_train else None
+    return name, model, test_score, train_score, fit_time
+
+def evaluate_models(train_X, train_y, test_X, test_y, models: dict, n_jobs: int = 1, score_train: bool = False):
     """
     This function evaluates the performance of the given models on the provided test data.
 
+    The models are fitted in parallel across a pool of `n_jobs` worker processes. Each model's own thread count
+    (`n_jobs`, `thread_count`, `nthread`) is set so that the workers together use about one thread per core.
+    The fitted models replace the entries of `models`, so after the call `models[name]` is the fitted model.
+
     Parameters
     ----------
     train_X : array-like, shape (n_samples, n_features)
@@ -52,7 +182,11 @@ def evaluate_models(train_X, train_y, test_X, test_y, models: dict):
     test_y : array-like, shape (n_samples,)
         The target variable corresponding to the input test data.
     models : dict
-        A dictionary containing the trained models to be evaluated. The keys are the names of the models and the values are the trained models themselves.
+        A dictionary containing the models to be evaluated. The keys are the names of the models and the values are the models themselves.
+    n_jobs : int, default=1
+        The number of worker processes. -1 uses all cores, 1 fits the models one after another in this process.
+    score_train : bool, default=False
+        Whether to also compute and log the R2 score on the training data, e.g. to spot overfitting.
 
     Returns
     -------
@@ -65,27 +199,43 @@ def evaluate_models(train_X, train_y, test_X, test_y, models: dict):
         If an exception occurs during the evaluation process.
     """
     try:
-        report = dict()
+        from joblib import Parallel, delayed, effective_n_jobs
 
-        for name, model in models.items():
-            model.fit(train_X, train_y)
-            y_pred_train = model.predict(train_X)
-            y_pred_test = model.predict(test_X)
-            train_score = r2_score(train_y, y_pred_train)
-            test_score = r2_score(test_y, y_pred_test)
+        workers = max(1, min(effective_n_jobs(n_jobs), len(models)))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        for model in models.values():
+            set_thread_budget(model, threads)
+        logging.info(f"Evaluating {len(models)} models on {workers} workers with {threads} threads each")
+
+        results = Parallel(n_jobs=workers)(
+            delayed(_fit_and_score)(name, model, train_X, train_y, test_X, test_y, score_train)
+            for name, model in models.items()
+        )
+
+        report = dict()
+        for name, model, test_score, train_score, fit_time in results:
+            models[name] = model
             report[name] = test_score
+            train_message = f", train R2 {train_score:.4f}" if score_train else ""
+            logging.info(f"{name}: test R2 {test_score:.4f}{train_message}, fitted in {fit_time:.2f}s")
         return report
     except Exception as e:
         raise CustomException(str(e), sys)
 
-def load_object(path):
+def load_object(path, lazy=False):
     """
     This function loads an object from a file.
 
+    Versioned artifact directories are loaded with `src.serialization.load_artifact`, with their arrays
+    memory-mapped. Other files are unpickled with dill. When `path` does not exist but the legacy dill file
+    `<path>.pkl` does, that file is loaded.
+
     Parameters
     ----------
     path : str
         The path to the file from which the object will be loaded.
+    lazy : bool, default=False
+        Whether to defer loading a versioned artifact until it is first used.
 
     Returns
     -------
@@ -99,6 +249,12 @@ def load_object(path):
 
     """
     try:
+        path = serialization.resolve_artifact(path)
+        if serialization.is_artifact(path):
+            return serialization.load_artifact(path, lazy=lazy)
+
+        import dill
+
         with open(path, "rb") as f:
             obj = dill.load(f)
         return obj
@@ -0,0 +1,68 @@
+from src.pipeline.batcher import MicroBatcher, MicroBatcherConfig
+
+import threading
+import pytest
+
+
+def test_failing_request_does_not_fail_its_batch():
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def predict_fn(items):
+        if items == ["block"]:
+            started.set()
+            release.wait(5)
+        calls.append(list(items))
+        if "bad" in items:
+            raise ValueError("bad item")
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(predict_fn, MicroBatcherConfig(max_batch_size=64, max_wait_ms=1000))
+    try:
+        # Hold the thread on a first batch so the next three requests are queued and merged into one.
+        blocker = batcher.submit(["block"])
+        assert started.wait(5)
+        futures = [batcher.submit(["a", "b"]), batcher.submit(["bad"]), batcher.submit(["c"])]
+        release.set()
+
+        assert blocker.result(5) == ["BLOCK"]
+        assert futures[0].result(5) == ["A", "B"]
+        with pytest.raises(ValueError):
+            futures[1].result(5)
+        assert futures[2].result(5) == ["C"]
+        assert ["a", "b", "bad", "c"] in calls
+    finally:
+        batcher.close()
+
+
+def test_null_categorical_is_imputed(tmp_path):
+    from sklearn.linear_model import LinearRegression
+    from src.components.data_transform import DataTransformation, DataTransformationConfig
+    from src.pipeline.model_cache import ModelCache, ModelCacheConfig
+    from src.pipeline.predict import CustomData, PredictPipeline
+    from src.pipeline.prediction_cache import PredictionCache, PredictionCacheConfig
+    from src.utils import save_object
+    from tests.test_compiled_preprocessor import training_data
+
+    data = training_data()
+    preprocessor = DataTransformation(DataTransformationConfig()).get_preprocessor().fit(data)
+    model = LinearRegression().fit(preprocessor.transform(data), data["reading_score"])
+    save_object(str(tmp_path / "model"), model)
+    save_object(str(tmp_path / "preprocessor"), preprocessor)
+    cache = ModelCache(ModelCacheConfig(
+        model_path=str(tmp_path / "model"), preprocessor_path=str(tmp_path / "preprocessor"), registry_root=None
+    ))
+    pipeline = PredictPipeline(cache, PredictionCache(PredictionCacheConfig()))
+
+    record = data.iloc[0].to_dict()
+    categories = cache.get().categories
+    nulled = CustomData.from_record(dict(record, gender=None), categories)
+    batcher = MicroBatcher(pipeline.predict_batch, MicroBatcherConfig())
+    try:
+        predictions = batcher.predict([CustomData.from_record(record, categories), nulled], timeout=30)
+    finally:
+        batcher.close()
+    assert len(predictions) == 2
+    with pytest.raises(ValueError, match="gender"):
+        CustomData.from_record(dict(record, gender="unknown"), categories)
@@ -0,0 +1,57 @@
+from src.components.data_transform import DataTransformation, DataTransformationConfig
+from src.pipeline.compiled_preprocessor import CompiledPreprocessor
+
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+
+
+CATEGORIES = {
+    "gender": ["female", "male"],
+    "race_ethnicity": ["group A", "group B", "group C"],
+    "parental_level_of_education": ["high school", "some college", "master's degree"],
+    "lunch": ["free/reduced", "standard"],
+    "test_preparation_course": ["completed", "none"],
+}
+
+
+def training_data(n_rows: int = 300) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({column: rng.choice(values, n_rows) for column, values in CATEGORIES.items()})
+    data["reading_score"] = rng.integers(20, 100, n_rows)
+    data["writing_score"] = rng.integers(20, 100, n_rows)
+    return data
+
+
+def parity_cases(data: pd.DataFrame) -> pd.DataFrame:
+    base = data.iloc[0].to_dict()
+    combinations = pd.DataFrame(
+        [dict(base, **dict(zip(CATEGORIES, values))) for values in itertools.product(*CATEGORIES.values())]
+    )
+    # One missing value per column, imputed with the fitted median or most frequent category.
+    missing = data.head(len(data.columns)).astype(object)
+    for index, column in enumerate(data.columns):
+        missing.iloc[index, missing.columns.get_loc(column)] = np.nan
+    return pd.concat([data, combinations, missing], ignore_index=True)
+
+
+@pytest.mark.parametrize("sparse_output", [True, False])
+def test_compiled_preprocessor_matches_sklearn_bytes(sparse_output):
+    config = DataTransformationConfig()
+    config.sparse_output = sparse_output
+    data = training_data()
+    preprocessor = DataTransformation(config).get_preprocessor().fit(data)
+    compiled = CompiledPreprocessor(preprocessor)
+
+    cases = parity_cases(data)
+    assert cases[compiled.columns].isna().any().all()
+    assert compiled.verify(preprocessor, cases) == 0
+
+
+def test_unknown_category_is_rejected():
+    data = training_data()
+    compiled = CompiledPreprocessor(DataTransformation(DataTransformationConfig()).get_preprocessor().fit(data))
+    record = dict(data.iloc[0].to_dict(), gender="unknown")
+    with pytest.raises(ValueError):
+        compiled.transform_record(record)
@@ -0,0 +1,39 @@
+from src.components.cross_validation import CrossValidationConfig, CrossValidator
+
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import KFold, cross_val_score
+
+
+@pytest.mark.parametrize("n_rows", [800, 801, 803])
+def test_sparse_folds_of_uneven_size(tmp_path, n_rows):
+    # 801 and 803 rows don't divide into 5 folds: the first folds hold out one row more than the last.
+    rng = np.random.RandomState(0)
+    X = sparse.random(n_rows, 20, density=0.3, format="csr", random_state=rng)
+    y = X @ rng.normal(size=20) + rng.normal(scale=0.1, size=n_rows)
+    config = CrossValidationConfig(n_splits=5, n_jobs=1, cache_dir=str(tmp_path))
+
+    report = CrossValidator(config).evaluate(X, y, {"Ridge": Ridge()}, out_of_fold=True)["Ridge"]
+
+    expected = cross_val_score(Ridge(), X, y, cv=KFold(5, shuffle=True, random_state=config.random_state))
+    np.testing.assert_allclose(report["scores"], expected)
+    assert report["oof"].shape == (n_rows,)
+    assert not report["cached"]
+
+    again = CrossValidator(config).evaluate(X, y, {"Ridge": Ridge()})["Ridge"]
+    assert again["cached"]
+    np.testing.assert_allclose(again["scores"], expected)
+
+
+def test_dense_folds_of_uneven_size(tmp_path):
+    rng = np.random.RandomState(1)
+    X = rng.normal(size=(203, 4))
+    y = X @ rng.normal(size=4)
+    config = CrossValidationConfig(n_splits=4, n_jobs=1, cache_dir=str(tmp_path))
+
+    report = CrossValidator(config).evaluate(X, y, {"Ridge": Ridge()})["Ridge"]
+
+    expected = cross_val_score(Ridge(), X, y, cv=KFold(4, shuffle=True, random_state=config.random_state))
+    np.testing.assert_allclose(report["scores"], expected)
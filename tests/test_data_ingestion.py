@@ -0,0 +1,15 @@
+from src.components.data_ingestion import DataIngestion, DataIngestionConfig
+from src.exception import CustomException
+
+import pytest
+
+
+@pytest.mark.parametrize("content", ["math_score,reading_score\n", ""])
+def test_streaming_an_empty_raw_file_fails(tmp_path, content):
+    (tmp_path / "data.csv").write_text(content)
+    config = DataIngestionConfig(
+        train_data_path=str(tmp_path / "train.csv"), test_data_path=str(tmp_path / "test.csv"),
+        raw_data_path=str(tmp_path / "data.csv"), chunk_size=10
+    )
+    with pytest.raises(CustomException):
+        DataIngestion(config).initiate_data_ingestion()
@@ -0,0 +1,93 @@
+from src.components.data_ingestion import DataIngestionConfig
+from src.components.data_transform import DataTransformation, DataTransformationConfig
+from src.components.incremental_trainer import IncrementalTrainer, IncrementalTrainerConfig
+from src.exception import CustomException
+from src.utils import save_object
+from tests.test_compiled_preprocessor import training_data
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def raw_data(n_rows: int, seed: int) -> pd.DataFrame:
+    data = training_data(n_rows).sample(frac=1, random_state=seed, ignore_index=True)
+    rng = np.random.default_rng(seed)
+    data["math_score"] = 0.4 * data["reading_score"] + 0.5 * data["writing_score"] + rng.normal(0, 5, n_rows)
+    return data
+
+
+def trained(tmp_path, model) -> IncrementalTrainer:
+    data = raw_data(300, 0)
+    data.to_csv(tmp_path / "data.csv", index=False)
+    config = IncrementalTrainerConfig(
+        ingestion=DataIngestionConfig(raw_data_path=str(tmp_path / "data.csv")),
+        model_path=str(tmp_path / "model"),
+        preprocessor_path=str(tmp_path / "preprocessor"),
+        state_path=str(tmp_path / "incremental_state.json"),
+        data_path=str(tmp_path / "incremental_data.csv"),
+    )
+    features = data.drop(columns=["math_score"])
+    preprocessor = DataTransformation(DataTransformationConfig()).get_preprocessor().fit(features)
+    X = preprocessor.transform(features)
+    model.fit(X, data["math_score"])
+    save_object(config.model_path, model)
+    save_object(config.preprocessor_path, preprocessor)
+    trainer = IncrementalTrainer(config)
+    trainer.reset(model, type(model).__name__, model.score(X, data["math_score"]), X, data["math_score"])
+    return trainer
+
+
+def test_raw_data_is_copied_not_written(tmp_path):
+    from sklearn.linear_model import Ridge
+
+    trainer = trained(tmp_path, Ridge())
+    raw = (tmp_path / "data.csv").read_bytes()
+    assert trainer.update(raw_data(20, 1))["mode"] == "incremental"
+    assert (tmp_path / "data.csv").read_bytes() == raw
+    assert IncrementalTrainer.raw_data_path(trainer.config) == trainer.config.data_path
+    assert len(pd.read_csv(trainer.config.data_path)) == 320
+
+    # A failed update removes the rows it appended.
+    state = trainer._read_state()
+    state["normal_equations"]["sum_x"] = [0.0, 0.0]
+    trainer._write_state(state)
+    with pytest.raises(CustomException):
+        trainer.update(raw_data(20, 2))
+    assert len(pd.read_csv(trainer.config.data_path)) == 320
+
+
+def test_ridge_update_matches_refit(tmp_path):
+    from scipy import sparse
+    from sklearn.linear_model import Ridge
+    from src.components.data_ingestion import DataIngestion
+    from src.utils import load_object
+
+    trainer = trained(tmp_path, Ridge(alpha=2.0))
+    new_df = raw_data(40, 1)
+    assert trainer.update(new_df)["mode"] == "incremental"
+
+    # The updated model is the one fitted on the old rows and the new training rows at once.
+    data = pd.concat([raw_data(300, 0), new_df[~DataIngestion(trainer.config.ingestion).test_mask(340)[300:]]])
+    preprocessor = load_object(trainer.config.preprocessor_path)
+    X = preprocessor.transform(data.drop(columns=["math_score"]))
+    expected = Ridge(alpha=2.0, solver="cholesky").fit(X.toarray() if sparse.issparse(X) else X, data["math_score"])
+    model = load_object(trainer.config.model_path)
+    np.testing.assert_allclose(model.coef_, expected.coef_, rtol=0, atol=1e-10)
+    assert abs(model.intercept_ - expected.intercept_) < 1e-10
+
+
+@pytest.mark.parametrize("change, reason", [
+    ({"gender": "other"}, "new categories ['other'] in gender"),
+    ({"gender": "male", "lunch": "standard"}, "gender drifted (PSI"),
+])
+def test_full_retrain_is_requested(tmp_path, change, reason):
+    from sklearn.linear_model import Ridge
+
+    trainer = trained(tmp_path, Ridge())
+    model = (tmp_path / "model").resolve()
+    report = trainer.update(raw_data(120, 1).assign(**change))
+    assert report["mode"] == "full"
+    assert report["reason"].startswith(reason)
+    assert (tmp_path / "model").resolve() == model
+    assert len(pd.read_csv(trainer.config.data_path)) == 420
@@ -0,0 +1,19 @@
+from src.instrumentation import registry, span, timed
+
+import pytest
+
+
+def test_span_records_its_labels():
+    with span("test.labelled", stage="fit"):
+        pass
+    _, histograms = registry.snapshot()
+    assert ("span_seconds", (("span", "test.labelled"), ("stage", "fit"))) in histograms
+
+
+@pytest.mark.parametrize("label", ["span", "le"])
+def test_reserved_labels_are_rejected(label):
+    with pytest.raises(ValueError, match="reserved"):
+        with span("test.reserved", **{label: "x"}):
+            pass
+    with pytest.raises(ValueError, match="reserved"):
+        timed("test.reserved", **{label: "x"})
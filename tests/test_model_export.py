@@ -0,0 +1,26 @@
+from sklearn.linear_model import LinearRegression
+from src.components.data_transform import DataTransformation, DataTransformationConfig
+from src.components.model_export import ModelExportConfig, ModelExporter
+from src.pipeline.lookup_table import LookupTable
+from tests.test_compiled_preprocessor import training_data
+
+import os
+
+
+def test_export_records_the_model_version_and_swaps_the_table(tmp_path):
+    data = training_data()
+    preprocessor = DataTransformation(DataTransformationConfig()).get_preprocessor().fit(data)
+    model = LinearRegression().fit(preprocessor.transform(data), data["reading_score"])
+    path = str(tmp_path / "lookup_table")
+    exporter = ModelExporter(ModelExportConfig(table_path=path, score_range=(20, 30), n_verify=100))
+
+    exporter.export(model, preprocessor, model_version="v1")
+    first = os.path.realpath(path)
+    report = exporter.export(model, preprocessor, model_version="v2")
+
+    assert os.path.islink(path) and os.path.realpath(path) != first
+    table = LookupTable(path)
+    assert table.meta["model_version"] == "v2"
+    assert report["max_abs_error"] < 1e-9
+    # The previous table is kept for readers still mapping it.
+    assert LookupTable(first).meta["model_version"] == "v1"
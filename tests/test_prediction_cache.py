@@ -0,0 +1,15 @@
+from src.pipeline.prediction_cache import normalize_value
+
+import math
+
+
+def test_scores_share_an_entry():
+    assert normalize_value(70, True) == normalize_value(70.0, True) == normalize_value("70", True)
+    assert normalize_value(math.nan, True) == normalize_value("nan", True)
+
+
+def test_categoricals_keep_their_type():
+    assert normalize_value(1, False) != normalize_value("1", False)
+    assert normalize_value(True, False) != normalize_value("True", False)
+    assert normalize_value(None, False) != normalize_value(math.nan, False)
+    hash(normalize_value(1, False))
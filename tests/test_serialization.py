@@ -0,0 +1,51 @@
+from src.serialization import is_artifact, load_artifact, read_manifest, save_artifact
+
+import os
+import shutil
+import threading
+import numpy as np
+
+
+def test_replacing_an_artifact_never_removes_it(tmp_path):
+    path = str(tmp_path / "model")
+    save_artifact(path, {"weights": np.zeros(1000), "round": 0})
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        while not stop.is_set():
+            try:
+                assert is_artifact(path) and not os.path.exists(path + ".pkl")
+                assert read_manifest(path)["kind"] == "pickle"
+            except Exception as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for round in range(1, 30):
+            save_artifact(path, {"weights": np.full(1000, round), "round": round})
+    finally:
+        stop.set()
+        reader.join()
+
+    assert errors == []
+    assert load_artifact(path)["round"] == 29
+    # The current and the previous versions are kept.
+    assert len(os.listdir(tmp_path / ".model.versions")) == 2
+
+
+def test_plain_directory_artifact_is_replaced(tmp_path):
+    path = str(tmp_path / "model")
+    save_artifact(path, [1, 2, 3])
+    # An artifact saved as a plain directory, as before artifacts were symlinks.
+    legacy = str(tmp_path / "legacy")
+    shutil.copytree(path, legacy)
+    os.remove(path)
+    shutil.rmtree(tmp_path / ".model.versions")
+    os.rename(legacy, path)
+    assert read_manifest(path)["kind"] == "pickle"
+
+    save_artifact(path, [4, 5])
+    assert os.path.islink(path)
+    assert load_artifact(path) == [4, 5]
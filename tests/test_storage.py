@@ -0,0 +1,31 @@
+from src.storage import TableWriter, read_table
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "feather"])
+def test_nan_in_a_later_chunk(tmp_path, fmt):
+    path = str(tmp_path / f"table.{fmt}")
+    chunks = [
+        pd.DataFrame({"score": [70, 80], "note": [None, None], "group": ["a", "b"]}),
+        pd.DataFrame({"score": [np.nan, 90.0], "note": ["late", None], "group": ["b", None]}),
+        pd.DataFrame({"score": [60, 50], "note": [None, "last"], "group": ["a", "a"]}),
+    ]
+    with TableWriter(path, fmt) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+
+    table = read_table(path, fmt)
+    assert len(table) == 6
+    np.testing.assert_array_equal(table["score"].to_numpy(dtype=float), [70, 80, np.nan, 90, 60, 50])
+    assert list(table["note"].astype(object).where(table["note"].notna(), None)) == [None, None, "late", None, None, "last"]
+    assert list(table["group"].astype(object).where(table["group"].notna(), None)) == ["a", "b", "b", None, "a", "a"]
+
+
+def test_lossy_cast_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        with TableWriter(str(tmp_path / "table.parquet")) as writer:
+            writer.write(pd.DataFrame({"score": [70, 80]}))
+            writer.write(pd.DataFrame({"score": [70.5, np.nan]}))